@@ -0,0 +1,424 @@
+"""Offline ingest and query benchmark.
+
+Seeds a generated database, then drives the real connectors against stand-in
+upstreams (``app.fake_upstreams``, run as a subprocess on localhost) and the
+real API routes in-process, and prints one JSON document: mentions/sec and
+per-run latency per connector, p50/p99 and throughput per route, and peak
+RSS. Save it per commit and diff two runs with ``compare``.
+
+    python -m app.bench run --db bench.db --rows 2000000 --out before.json
+    python -m app.bench compare before.json after.json
+
+The database path is separate from DATABASE_URL on purpose; a seeded file is
+reused when it already holds ``--rows`` mentions.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+CONNECTORS = ("rss", "hn", "masto", "reddit", "twitter")
+ROUTES = ("feed", "feed_source", "feed_deep", "search", "collapse", "timeseries", "thread", "feed_cached")
+# Routes measured with the /mentions response cache on; every other route runs with it off,
+# so repeated identical queries time the database path and stay comparable across commits
+CACHED_ROUTES = ("feed_cached",)
+SOURCES = ("rss", "hackernews", "reddit", "mastodon", "twitter")
+MASTO_INSTANCE = "mastodon.bench.invalid"
+# Figures compared across runs, and whether bigger is better
+COMPARED = {"mentions_per_sec": True, "rps": True, "p50_ms": False, "p99_ms": False, "peak_rss_mb": False, "seconds": False}
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def latency_summary(latencies: list[float]) -> dict:
+    if len(latencies) < 2:
+        return {"count": len(latencies), "p50_ms": round(latencies[0], 2) if latencies else None, "p99_ms": None}
+    cuts = statistics.quantiles(latencies, n=100)
+    return {"count": len(latencies), "p50_ms": round(cuts[49], 2), "p99_ms": round(cuts[98], 2)}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_upstreams(args) -> tuple[subprocess.Popen, int]:
+    port = _free_port()
+    cmd = [
+        sys.executable, "-m", "app.fake_upstreams", "--port", str(port),
+        "--items", str(args.items), "--hn-hits", str(args.hn_hits),
+        "--thread-replies", str(args.thread_replies), "--reddit-comments", str(args.reddit_comments),
+        "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+        "--error-rate", str(args.error_rate), "--throttle-rate", str(args.throttle_rate),
+        "--seed", str(args.seed),
+    ]
+    proc = subprocess.Popen(cmd, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc, port
+        except OSError:
+            if proc.poll() is not None:
+                break
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("fake upstreams did not start")
+
+
+def local_transport(port: int):
+    import httpx
+
+    class LocalUpstream(httpx.AsyncBaseTransport):
+        """Sends every request to the local stand-in, tagged with the host it was meant for."""
+
+        def __init__(self, limits: httpx.Limits):
+            self._inner = httpx.AsyncHTTPTransport(limits=limits)
+
+        async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+            request.headers["X-Upstream-Host"] = request.url.host
+            request.url = request.url.copy_with(scheme="http", host="127.0.0.1", port=port)
+            return await self._inner.handle_async_request(request)
+
+        async def aclose(self) -> None:
+            await self._inner.aclose()
+
+    return lambda host, limits: LocalUpstream(limits)
+
+
+def seed(rows: int, chunk: int, rng: random.Random) -> dict:
+    """Fill the database up to ``rows`` mentions, bypassing the connectors."""
+    from sqlalchemy import func, insert
+    from .db import SessionLocal
+    from .fake_upstreams import WORDS
+    from .models import Mention
+    from .services.rollups import update_rollups
+
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        have = db.query(func.count(Mention.id)).scalar() or 0
+        inserted = 0
+        now = datetime.utcnow()
+        while have + inserted < rows:
+            n = min(chunk, rows - have - inserted)
+            values = []
+            for i in range(have + inserted, have + inserted + n):
+                thread = i - i % 10
+                published = now - timedelta(seconds=rng.randint(0, 90 * 86400))
+                values.append({
+                    "title": " ".join(rng.choices(WORDS, k=8)) if i == thread else None,
+                    "summary": " ".join(rng.choices(WORDS, k=30)),
+                    "url": f"https://seed.bench.invalid/{i}",
+                    "source": SOURCES[thread // 10 % len(SOURCES)],
+                    "author": f"user{rng.randint(0, 5000)}",
+                    "published_at": published,
+                    "fetched_at": published,
+                    "sentiment": round(rng.uniform(-1, 1), 3),
+                    "external_id": f"s{i}",
+                    "parent_external_id": None if i == thread else f"s{thread}",
+                    "thread_external_id": f"s{thread}",
+                    "reply_depth": 0 if i == thread else 1,
+                    "cluster_id": None,
+                })
+            db.execute(insert(Mention.__table__), values)
+            update_rollups(db, values)
+            db.commit()
+            inserted += n
+            print(f"seeded {have + inserted}", file=sys.stderr)
+        total = have + inserted
+    elapsed = time.perf_counter() - started
+    return {
+        "rows": total,
+        "inserted": inserted,
+        "seconds": round(elapsed, 3) if inserted else None,  # a reused database isn't compared
+        "rows_per_sec": round(inserted / elapsed, 1) if inserted and elapsed else None,
+    }
+
+
+def warm() -> dict:
+    from .services.clusters import warm_clusters
+    from .services.dedup import warm_index
+
+    out = {}
+    for name, fn in (("dedup", warm_index), ("clusters", warm_clusters)):
+        started = time.perf_counter()
+        fn()
+        out[f"{name}_seconds"] = round(time.perf_counter() - started, 3)
+    return out
+
+
+def _connector_calls(run_id: str):
+    from .services.hn import search_hn_and_store
+    from .services.masto import search_and_store_threads
+    from .services.reddit import ingest_reddit_search
+    from .services.rss import ingest_rss_feeds
+    from .services.twitter import ingest_tweet_by_id
+
+    return {
+        "rss": lambda db, i, a: ingest_rss_feeds(db, [f"https://feeds{k}.bench.invalid/feed.xml" for k in range(a.feeds)]),
+        "hn": lambda db, i, a: search_hn_and_store(db, f"bench {run_id} {i}", hits_per_page=200),
+        "masto": lambda db, i, a: search_and_store_threads(db, MASTO_INSTANCE, "acme", limit=40),
+        "reddit": lambda db, i, a: ingest_reddit_search(db, "acme", None, limit=25),
+        "twitter": lambda db, i, a: ingest_tweet_by_id(db, "bench-token", f"{run_id}{i:05d}", include_replies=True),
+    }
+
+
+def _upstream_requests(pool) -> tuple[int, int]:
+    stats = pool.stats().values()
+    return sum(s["requests"] for s in stats), sum(s["retried"] for s in stats)
+
+
+async def bench_ingest(args, port: int) -> dict:
+    from .db import SessionLocal
+    from .services.fetch import pool
+
+    pool.transport_factory = local_transport(port)
+    if not args.rate_limits:
+        hosts = ["hn.algolia.com", "www.reddit.com", "api.x.com", MASTO_INSTANCE]
+        hosts += [f"feeds{k}.bench.invalid" for k in range(args.feeds)]
+        for host in hosts:
+            pool.host_rates[host] = (1e6, 10**6)
+    run_id = f"{int(time.time()) % 10**6}"
+    calls = _connector_calls(run_id)
+    results = {}
+    for name in args.connectors:
+        latencies: list[float] = []
+        totals = {"added": 0, "skipped": 0, "errors": 0}
+        requests_before, retried_before = _upstream_requests(pool)
+        runs = iter(range(args.runs))
+
+        async def worker():
+            for i in runs:
+                started = time.perf_counter()
+                with SessionLocal() as db:
+                    try:
+                        stats = await calls[name](db, i, args)
+                        totals["added"] += stats.get("added", 0)
+                        totals["skipped"] += stats.get("skipped", 0)
+                    except Exception as exc:
+                        totals["errors"] += 1
+                        print(f"{name} run {i} failed: {type(exc).__name__}: {exc}", file=sys.stderr)
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        requests_after, retried_after = _upstream_requests(pool)
+        results[name] = {
+            "runs": args.runs,
+            **totals,
+            "seconds": round(elapsed, 3),
+            "mentions_per_sec": round(totals["added"] / elapsed, 1) if elapsed else None,
+            "upstream_requests": requests_after - requests_before,
+            "upstream_retries": retried_after - retried_before,
+            "run_latency": latency_summary(latencies),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        print(f"{name}: {results[name]}", file=sys.stderr)
+    await pool.aclose()
+    return results
+
+
+def _route_urls(rng: random.Random, max_id: int):
+    from .fake_upstreams import WORDS
+
+    def deep(state: dict) -> str:
+        # Walks the feed with keyset cursors, starting over every 50 pages
+        cursor = state.get("cursor")
+        if cursor is None or state.get("pages", 0) >= 50:
+            state["pages"] = 0
+            return "/mentions?limit=50"
+        return f"/mentions?limit=50&cursor={cursor}"
+
+    return {
+        "feed": lambda state: "/mentions?limit=50",
+        "feed_cached": lambda state: "/mentions?limit=50",
+        "feed_source": lambda state: f"/mentions?limit=50&source={rng.choice(SOURCES)}",
+        "feed_deep": deep,
+        "search": lambda state: f"/mentions?limit=20&query={rng.choice(WORDS)}+{rng.choice(WORDS)}",
+        "collapse": lambda state: "/mentions?limit=50&collapse=cluster",
+        "timeseries": lambda state: f"/stats/timeseries?granularity={rng.choice(('hour', 'day'))}",
+        "thread": lambda state: f"/mentions/{rng.randint(1, max_id)}/thread",
+    }
+
+
+async def bench_queries(args, rng: random.Random) -> dict:
+    import httpx
+    from sqlalchemy import func
+    from .cache import mentions_cache
+    from .db import ReadSessionLocal
+    from .main import app
+    from .models import Mention
+
+    with ReadSessionLocal() as db:
+        max_id = db.query(func.max(Mention.id)).scalar() or 1
+    urls = _route_urls(rng, max_id)
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    cache_size = mentions_cache.maxsize
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name in args.routes:
+            mentions_cache.clear()
+            mentions_cache.maxsize = cache_size if name in CACHED_ROUTES else 0
+            hits_before = mentions_cache.hits
+            latencies: list[float] = []
+            errors = 0
+            deadline = time.perf_counter() + args.query_seconds
+
+            async def worker():
+                nonlocal errors
+                state: dict = {}
+                while time.perf_counter() < deadline:
+                    url = urls[name](state)
+                    started = time.perf_counter()
+                    resp = await client.get(url)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    if resp.status_code >= 400 and resp.status_code != 404:
+                        errors += 1
+                    if name == "feed_deep":
+                        state["cursor"] = resp.headers.get("X-Next-Cursor")
+                        state["pages"] = state.get("pages", 0) + 1
+
+            started = time.perf_counter()
+            try:
+                await asyncio.gather(*(worker() for _ in range(args.clients)))
+            finally:
+                mentions_cache.maxsize = cache_size
+            elapsed = time.perf_counter() - started
+            results[name] = {
+                **latency_summary(latencies),
+                "errors": errors,
+                "rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+                "cache_hits": mentions_cache.hits - hits_before,
+                "peak_rss_mb": peak_rss_mb(),
+            }
+            print(f"{name}: {results[name]}", file=sys.stderr)
+    return results
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run(args) -> dict:
+    # Must be set before anything imports app.db
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.db)}"
+    from .db import init_db
+
+    rng = random.Random(args.seed)
+    init_db()
+    result = {
+        "commit": _git_commit(),
+        "started_at": datetime.utcnow().isoformat(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("func", "out")},
+        "seed": seed(args.rows, args.seed_chunk, rng),
+        "warm": warm(),
+    }
+    if args.connectors:
+        proc, port = start_upstreams(args)
+        try:
+            result["ingest"] = asyncio.run(bench_ingest(args, port))
+            try:
+                import httpx
+                result["upstreams"] = httpx.get(f"http://127.0.0.1:{port}/_stats", timeout=5).json()
+            except Exception:
+                pass
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+    if args.routes:
+        result["query"] = asyncio.run(bench_queries(args, rng))
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def _leaves(obj, path=()):
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            yield from _leaves(v, path + (k,))
+    elif isinstance(obj, (int, float)) and not isinstance(obj, bool):
+        yield path, obj
+
+
+def compare(args) -> dict:
+    """Relative change of every throughput, latency and memory figure between two runs."""
+    with open(args.before) as f:
+        before = dict(_leaves(json.load(f)))
+    with open(args.after) as f:
+        after = dict(_leaves(json.load(f)))
+    out = {}
+    for path, old in before.items():
+        if path[0] == "params" or path[-1] not in COMPARED or path not in after:
+            continue
+        new = after[path]
+        change = round((new - old) / old * 100, 1) if old else None
+        better = None if change is None or change == 0 else (change > 0) == COMPARED[path[-1]]
+        out[".".join(path)] = {"before": old, "after": new, "change_pct": change, "better": better}
+    return out
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.bench")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="seed, ingest through fake upstreams, load the API; print JSON")
+    p.add_argument("--db", default="bench.db", help="SQLite file for the benchmark (never DATABASE_URL)")
+    p.add_argument("--rows", type=int, default=2_000_000, help="mentions to seed before measuring")
+    p.add_argument("--seed-chunk", type=int, default=20000)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--connectors", nargs="*", default=list(CONNECTORS), choices=CONNECTORS)
+    p.add_argument("--runs", type=int, default=20, help="ingest calls per connector")
+    p.add_argument("--concurrency", type=int, default=4, help="ingest calls in flight per connector")
+    p.add_argument("--feeds", type=int, default=10, help="feeds per RSS ingest call")
+    p.add_argument("--rate-limits", action="store_true", help="keep the real per-host rate limits")
+    p.add_argument("--items", type=int, default=50, help="upstream: items per feed/search page")
+    p.add_argument("--hn-hits", type=int, default=2000, help="upstream: Algolia hits per query")
+    p.add_argument("--thread-replies", type=int, default=20, help="upstream: replies per conversation")
+    p.add_argument("--reddit-comments", type=int, default=150, help="upstream: comments per Reddit thread")
+    p.add_argument("--latency-ms", type=float, default=20.0, help="upstream: added response latency")
+    p.add_argument("--jitter-ms", type=float, default=10.0)
+    p.add_argument("--error-rate", type=float, default=0.0, help="upstream: fraction of 503 responses")
+    p.add_argument("--throttle-rate", type=float, default=0.0, help="upstream: fraction of 429 responses")
+    p.add_argument("--routes", nargs="*", default=list(ROUTES), choices=ROUTES)
+    p.add_argument("--clients", type=int, default=8, help="concurrent API clients per route")
+    p.add_argument("--query-seconds", type=float, default=10.0, help="load duration per route")
+    p.add_argument("--out", help="also write the JSON here")
+    p.set_defaults(func=run)
+
+    p = sub.add_parser("compare", help="relative change between two result files")
+    p.add_argument("before")
+    p.add_argument("after")
+    p.add_argument("--out")
+    p.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    result = args.func(args)
+    text = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
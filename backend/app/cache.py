@@ -0,0 +1,159 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Serialized /mentions responses kept in memory, by count and total bytes
+MENTIONS_CACHE_SIZE = int(os.getenv("MENTIONS_CACHE_SIZE", "1024"))
+MENTIONS_CACHE_MAX_BYTES = int(os.getenv("MENTIONS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Writes in this process invalidate entries at once; the TTL bounds how long
+# writes from elsewhere (CLI imports, other workers) can go unseen
+MENTIONS_CACHE_TTL = float(os.getenv("MENTIONS_CACHE_TTL", "30"))
+
+
+class Generations:
+    """Data generation counters the ingest write path bumps on every commit.
+
+    ``all`` moves on any insert; each source also has its own counter, so a
+    response filtered to one source survives writes to the others.
+    """
+
+    def __init__(self):
+        self.all = 0
+        self._by_source: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def bump(self, sources) -> None:
+        with self._lock:
+            self.all += 1
+            for source in sources:
+                self._by_source[source] = self._by_source.get(source, 0) + 1
+
+    def current(self, source: str | None = None) -> int:
+        return self.all if source is None else self._by_source.get(source, 0)
+
+
+generations = Generations()
+
+
+def etag_for(body: bytes) -> str:
+    # Strong validator: changes whenever a single byte of the body does
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match compares weakly: W/"x" matches "x"
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class CachedResponse:
+    __slots__ = ("body", "etag", "headers", "scope", "generation", "expires")
+
+    def __init__(self, body: bytes, headers: dict, scope: str | None, generation: int, expires: float):
+        self.body = body
+        self.etag = etag_for(body)
+        self.headers = headers
+        self.scope = scope
+        self.generation = generation
+        self.expires = expires
+
+
+class ResponseCache:
+    """LRU of serialized responses, tagged with the data generation they were built from.
+
+    An entry is served only while its scope's generation (one source, or all
+    of them) is unchanged and its TTL hasn't run out. Callers read the
+    generation *before* querying, so a write that lands mid-query leaves the
+    new entry already stale rather than serving pre-write data as current.
+    """
+
+    def __init__(self, generations: Generations, maxsize: int = MENTIONS_CACHE_SIZE, max_bytes: int = MENTIONS_CACHE_MAX_BYTES, ttl: float = MENTIONS_CACHE_TTL):
+        self.generations = generations
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple, CachedResponse] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self.expired = 0
+        self.evictions = 0
+        self.not_modified = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.max_bytes > 0
+
+    def _drop(self, key) -> None:
+        self._bytes -= len(self._entries.pop(key).body)
+
+    def get(self, key: tuple) -> CachedResponse | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.generation != self.generations.current(entry.scope):
+                    self.invalidated += 1
+                    self._drop(key)
+                    entry = None
+                elif entry.expires < time.monotonic():
+                    self.expired += 1
+                    self._drop(key)
+                    entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: tuple, body: bytes, headers: dict, scope: str | None, generation: int) -> CachedResponse:
+        entry = CachedResponse(body, headers, scope, generation, time.monotonic() + self.ttl)
+        if not self.enabled or len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self._bytes += len(body)
+            while len(self._entries) > self.maxsize or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+        return entry
+
+    def count_not_modified(self) -> None:
+        with self._lock:
+            self.not_modified += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.maxsize,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "invalidated": self.invalidated,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "not_modified": self.not_modified,
+                "generation": self.generations.all,
+            }
+
+
+mentions_cache = ResponseCache(generations)
@@ -0,0 +1,315 @@
+"""Maintenance commands: ``python -m app.cli <command> --help``."""
+import argparse
+import gzip
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List
+from pydantic import TypeAdapter
+from sqlalchemy import delete, select, update
+from .cache import generations
+from .db import ReadSessionLocal, SessionLocal, init_db
+from .models import Mention, MentionMatch, MentionRollup
+from .pagination import keyset_page
+from .schemas import MentionOut
+from .serialize import MENTION_COLUMNS, mentions_json, orjson
+from .services.alerts import backfill_matches
+from .services.bulk import BULK_BATCH_SIZE, BulkImport
+from .services.clusters import rebuild_clusters
+from .services.rollups import rebuild_rollups, rescore_rollups
+from .services.sentiment import get_backend, mention_text
+from .services.writer import MentionWriter
+
+
+def sentiment_backfill(args) -> dict:
+    """Rescore mentions in id order, one chunk per transaction.
+
+    Each chunk moves the rollup buckets' sentiment sums by the change in score,
+    in the same transaction, so /stats/timeseries means stay exact.
+    """
+    backend = get_backend()
+    scored = 0
+    last_id = 0
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        while True:
+            cols = (Mention.id, Mention.title, Mention.summary, Mention.source, Mention.published_at, Mention.fetched_at, Mention.sentiment)
+            q = db.query(*cols).filter(Mention.id > last_id)
+            if not args.all:
+                q = q.filter(Mention.sentiment.is_(None))
+            rows = [dict(r._mapping) for r in q.order_by(Mention.id).limit(args.chunk)]
+            if not rows:
+                break
+            old = [r["sentiment"] for r in rows]
+            scores = backend.score_batch([mention_text(r["title"], r["summary"]) for r in rows])
+            for r, s in zip(rows, scores):
+                r["sentiment"] = s
+            db.execute(update(Mention), [{"id": r["id"], "sentiment": r["sentiment"]} for r in rows])
+            rescore_rollups(db, rows, old)
+            db.commit()
+            generations.bump({r["source"] for r in rows})
+            scored += len(rows)
+            last_id = rows[-1]["id"]
+            print(f"scored {scored} (last id {last_id})", file=sys.stderr)
+    elapsed = time.perf_counter() - started
+    return {"backend": backend.name, "scored": scored, "seconds": round(elapsed, 3)}
+
+
+def rollups_rebuild(args) -> dict:
+    """Regenerate the time-series buckets from raw mentions."""
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        done = rebuild_rollups(db, chunk=args.chunk, progress=lambda n: print(f"rolled up {n}", file=sys.stderr))
+    return {"mentions": done, "seconds": round(time.perf_counter() - started, 3)}
+
+
+def clusters_rebuild(args) -> dict:
+    """Recompute near-duplicate clusters for every stored mention."""
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        stats = rebuild_clusters(db, chunk=args.chunk, progress=lambda n: print(f"clustered {n}", file=sys.stderr))
+    return {**stats, "seconds": round(time.perf_counter() - started, 3)}
+
+
+def alerts_backfill(args) -> dict:
+    """Run the alert rules over mentions stored before the rules existed."""
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        stats = backfill_matches(db, rule_id=args.rule, chunk=args.chunk, progress=lambda n: print(f"scanned {n}", file=sys.stderr))
+    return {**stats, "seconds": round(time.perf_counter() - started, 3)}
+
+
+def bulk_import(args) -> dict:
+    """Load an NDJSON dump (plain or .gz, ``-`` for stdin) in large batches."""
+    if args.path == "-":
+        f = sys.stdin.buffer
+    elif args.path.endswith(".gz"):
+        f = gzip.open(args.path, "rb")
+    else:
+        f = open(args.path, "rb")
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        importer = BulkImport(db, default_source=args.source, batch_size=args.batch)
+
+        def report(stats):
+            elapsed = time.perf_counter() - started
+            print(f"{stats} {stats['lines'] / elapsed:.0f} lines/s", file=sys.stderr)
+
+        with f:
+            while chunk := f.read(1 << 20):
+                importer.feed(chunk)
+                if importer.ready():
+                    report(importer.write())
+        importer.close()
+        importer.write()
+    return {**importer.result(), "seconds": round(time.perf_counter() - started, 3)}
+
+
+_BENCH_WORDS = (
+    "the product is not good at all but support was great and fast "
+    "i hate the new update it crashes and the ui is broken never again "
+    "love it works well recommend to everyone no problems so far "
+    "shipping was slow price expensive quality solid"
+).split()
+
+
+def sentiment_bench(args) -> dict:
+    """Score synthetic mentions and report throughput."""
+    rng = random.Random(args.seed)
+    texts = [" ".join(rng.choices(_BENCH_WORDS, k=args.words)) + "." for _ in range(args.n)]
+    backend = get_backend()
+    started = time.perf_counter()
+    for i in range(0, len(texts), args.chunk):
+        backend.score_batch(texts[i:i + args.chunk])
+    elapsed = time.perf_counter() - started
+    return {
+        "backend": backend.name,
+        "mentions": args.n,
+        "words_per_mention": args.words,
+        "seconds": round(elapsed, 3),
+        "mentions_per_sec": round(args.n / elapsed, 1) if elapsed else None,
+    }
+
+
+def _read_latencies(readers: int, seconds: float, limit: int) -> list[float]:
+    """Run feed-page queries from ``readers`` threads; return latencies in ms."""
+    latencies: list[float] = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def read_loop():
+        mine = []
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            with ReadSessionLocal() as db:
+                keyset_page(db.query(Mention), None, limit)
+            mine.append((time.perf_counter() - started) * 1000)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=read_loop) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies
+
+
+def _latency_summary(latencies: list[float]) -> dict:
+    if len(latencies) < 2:
+        return {"reads": len(latencies)}
+    cuts = statistics.quantiles(latencies, n=100)
+    return {"reads": len(latencies), "p50_ms": round(cuts[49], 2), "p99_ms": round(cuts[98], 2)}
+
+
+def _drop_source_rows(source: str) -> int:
+    """Delete every mention of ``source`` and what the write hooks derived from them, in one transaction."""
+    with SessionLocal() as db:
+        ids = select(Mention.id).where(Mention.source == source).scalar_subquery()
+        db.execute(delete(MentionMatch).where(MentionMatch.mention_id.in_(ids)))
+        # Mentions written meanwhile may have joined a cluster started by one of these
+        db.execute(update(Mention).where(Mention.cluster_id.in_(ids), Mention.source != source).values(cluster_id=None))
+        db.execute(delete(MentionRollup).where(MentionRollup.source == source))
+        deleted = db.execute(delete(Mention).where(Mention.source == source)).rowcount
+        db.commit()
+    return deleted
+
+
+def db_loadtest(args) -> dict:
+    """Measure read latency on the feed query, idle and while a writer ingests.
+
+    The rows written get a source of their own and are deleted again at the end.
+    """
+    idle = _read_latencies(args.readers, args.seconds, args.limit)
+
+    written = 0
+    stop = threading.Event()
+    run_id = f"{time.time_ns():x}"
+    source = f"loadtest-{run_id}"
+
+    def write_loop():
+        nonlocal written
+        now = datetime.utcnow()
+        with SessionLocal() as db:
+            while not stop.is_set():
+                rows = [
+                    {
+                        "source": source,
+                        "title": f"loadtest mention {written + i}",
+                        "url": f"https://loadtest.invalid/{run_id}/{written + i}",
+                        "published_at": now - timedelta(seconds=written + i),
+                    }
+                    for i in range(args.batch)
+                ]
+                MentionWriter(db, batch_size=args.batch).write(rows)
+                written += len(rows)
+
+    writer = threading.Thread(target=write_loop)
+    writer.start()
+    try:
+        busy = _read_latencies(args.readers, args.seconds, args.limit)
+    finally:
+        stop.set()
+        writer.join()
+        removed = _drop_source_rows(source)
+        print(f"removed {removed} {source} rows", file=sys.stderr)
+    return {
+        "readers": args.readers,
+        "seconds": args.seconds,
+        "idle": _latency_summary(idle),
+        "during_ingest": {**_latency_summary(busy), "rows_written": written},
+    }
+
+
+def read_bench(args) -> dict:
+    """Feed pages per second: ORM entities through pydantic vs projected rows through the fast encoder."""
+    adapter = TypeAdapter(List[MentionOut])
+
+    def orm_page(db):
+        rows, _ = keyset_page(db.query(Mention), None, args.limit)
+        return adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+
+    def lean_page(db):
+        rows, _ = keyset_page(db.query(*MENTION_COLUMNS), None, args.limit)
+        return mentions_json(rows)
+
+    out = {"limit": args.limit, "iterations": args.iterations, "encoder": "orjson" if orjson is not None else "json"}
+    bodies = {}
+    for name, page in (("orm_pydantic", orm_page), ("lean", lean_page)):
+        with ReadSessionLocal() as db:
+            bodies[name] = page(db)  # warm the page cache and statement cache
+        started = time.perf_counter()
+        for _ in range(args.iterations):
+            # A session per page, like a request; no identity map carried over
+            with ReadSessionLocal() as db:
+                page(db)
+        elapsed = time.perf_counter() - started
+        out[name] = {
+            "seconds": round(elapsed, 3),
+            "pages_per_sec": round(args.iterations / elapsed, 1),
+            "rows_per_sec": round(args.iterations * args.limit / elapsed, 1),
+        }
+    out["identical_output"] = bodies["orm_pydantic"] == bodies["lean"]
+    out["speedup"] = round(out["lean"]["rows_per_sec"] / out["orm_pydantic"]["rows_per_sec"], 2)
+    return out
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("sentiment-backfill", help="score mentions with the configured sentiment backend")
+    p.add_argument("--all", action="store_true", help="rescore every row, not just rows without a score")
+    p.add_argument("--chunk", type=int, default=5000)
+    p.set_defaults(func=sentiment_backfill, needs_db=True)
+
+    p = sub.add_parser("sentiment-bench", help="measure sentiment scoring throughput")
+    p.add_argument("--n", type=int, default=100000)
+    p.add_argument("--words", type=int, default=40)
+    p.add_argument("--chunk", type=int, default=500)
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=sentiment_bench, needs_db=False)
+
+    p = sub.add_parser("rollups-rebuild", help="regenerate time-series rollups from raw mentions")
+    p.add_argument("--chunk", type=int, default=10000)
+    p.set_defaults(func=rollups_rebuild, needs_db=True)
+
+    p = sub.add_parser("clusters-rebuild", help="recompute near-duplicate story clusters")
+    p.add_argument("--chunk", type=int, default=5000)
+    p.set_defaults(func=clusters_rebuild, needs_db=True)
+
+    p = sub.add_parser("alerts-backfill", help="match stored mentions against the alert rules")
+    p.add_argument("--rule", type=int, help="only record matches of this rule id")
+    p.add_argument("--chunk", type=int, default=5000)
+    p.set_defaults(func=alerts_backfill, needs_db=True)
+
+    p = sub.add_parser("bulk-import", help="load mentions from an NDJSON file")
+    p.add_argument("path", help="NDJSON file, .gz for gzip, - for stdin")
+    p.add_argument("--source", help="source for records that don't carry one")
+    p.add_argument("--batch", type=int, default=BULK_BATCH_SIZE, help="rows per transaction")
+    p.set_defaults(func=bulk_import, needs_db=True)
+
+    p = sub.add_parser("db-loadtest", help="compare read latency idle vs during a bulk ingest")
+    p.add_argument("--seconds", type=float, default=10.0, help="duration of each phase")
+    p.add_argument("--readers", type=int, default=4)
+    p.add_argument("--limit", type=int, default=50, help="page size of the feed query")
+    p.add_argument("--batch", type=int, default=500, help="rows per write transaction")
+    p.set_defaults(func=db_loadtest, needs_db=True)
+
+    p = sub.add_parser("read-bench", help="compare /mentions page serialization paths in rows/sec")
+    p.add_argument("--limit", type=int, default=100, help="rows per page")
+    p.add_argument("--iterations", type=int, default=500)
+    p.set_defaults(func=read_bench, needs_db=True)
+
+    args = parser.parse_args(argv)
+    if args.needs_db:
+        init_db()
+    print(json.dumps(args.func(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,166 @@
-from sqlalchemy import create_engine, text
+import os
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool
+from .metrics import instrument_engine
 
-DATABASE_URL = "sqlite:///./social_listening.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./social_listening.db")
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# SQLite engine profile. Every connection gets these pragmas; the writer also
+# switches the database to WAL so readers never wait on an ingest commit.
+SQLITE_PRAGMAS = {
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # negative = KiB, so 64 MiB
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "8"))
+# How long a writer waits for the single write connection before giving up
+SQLITE_WRITE_TIMEOUT = float(os.getenv("SQLITE_WRITE_TIMEOUT", "60"))
+
+
+def _sqlite_file(url: str) -> str | None:
+    u = make_url(url)
+    if u.get_backend_name() != "sqlite" or not u.database or u.database == ":memory:":
+        return None
+    return u.database
+
+
+def _set_pragmas(engine, pragmas: dict) -> None:
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        for name, value in pragmas.items():
+            cur.execute(f"PRAGMA {name}={value}")
+        cur.close()
+
+
+def _make_engines(url: str):
+    path = _sqlite_file(url)
+    if path is None:
+        engine = create_engine(url, connect_args={"check_same_thread": False} if url.startswith("sqlite") else {})
+        return engine, engine
+    # One serialized write connection: SQLite allows a single writer anyway, and
+    # queueing in the pool is cheaper than retrying on SQLITE_BUSY.
+    writer = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        poolclass=QueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=SQLITE_WRITE_TIMEOUT,
+    )
+    _set_pragmas(writer, {"journal_mode": "WAL", **SQLITE_PRAGMAS})
+    reader = create_engine(
+        f"sqlite:///file:{path}?mode=ro&uri=true",
+        connect_args={"check_same_thread": False},
+        poolclass=QueuePool,
+        pool_size=SQLITE_READ_POOL_SIZE,
+        max_overflow=SQLITE_READ_POOL_SIZE,
+    )
+    _set_pragmas(reader, {"query_only": "ON", **SQLITE_PRAGMAS})
+    return writer, reader
+
+
+engine, read_engine = _make_engines(DATABASE_URL)
+instrument_engine(engine, "write")
+if read_engine is not engine:
+    instrument_engine(read_engine, "read")
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+ReadSessionLocal = sessionmaker(bind=read_engine, autocommit=False, autoflush=False)
 Base = declarative_base()
 
+# Columns added after the first release; CREATE TABLE won't add them to old databases
+_ADDED_COLUMNS = {
+    "mentions": {
+        "external_id": "VARCHAR(200)",
+        "parent_external_id": "VARCHAR(200)",
+        "thread_external_id": "VARCHAR(200)",
+        "reply_depth": "INTEGER",
+        "cluster_id": "INTEGER",
+    },
+    "sources": {
+        "params": "TEXT",
+        "interval_seconds": "INTEGER",
+        "enabled": "BOOLEAN NOT NULL DEFAULT 1",
+        "next_run_at": "DATETIME",
+        "last_run_at": "DATETIME",
+        "etag": "VARCHAR(500)",
+        "last_modified": "VARCHAR(100)",
+        "high_water_at": "DATETIME",
+        "seen_entry_ids": "TEXT",
+    },
+}
+
+
 def _ensure_sqlite_columns():
     if engine.dialect.name != "sqlite":
         return
     with engine.connect() as conn:
-        # Check mentions table columns
-        cols = set()
-        res = conn.exec_driver_sql("PRAGMA table_info('mentions')")
-        for row in res:
-            # row: (cid, name, type, notnull, dflt_value, pk)
-            cols.add(row[1])
-        to_add = []
-        if "external_id" not in cols:
-            to_add.append("external_id VARCHAR(200)")
-        if "parent_external_id" not in cols:
-            to_add.append("parent_external_id VARCHAR(200)")
-        if "thread_external_id" not in cols:
-            to_add.append("thread_external_id VARCHAR(200)")
-        if "reply_depth" not in cols:
-            to_add.append("reply_depth INTEGER")
-        for coldef in to_add:
-            conn.exec_driver_sql(f"ALTER TABLE mentions ADD COLUMN {coldef}")
+        for table, wanted in _ADDED_COLUMNS.items():
+            cols = set()
+            res = conn.exec_driver_sql(f"PRAGMA table_info('{table}')")
+            for row in res:
+                # row: (cid, name, type, notnull, dflt_value, pk)
+                cols.add(row[1])
+            for name, coldef in wanted.items():
+                if name not in cols:
+                    conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {name} {coldef}")
+        conn.commit()
+
+
+FTS_TABLE = "mentions_fts"
+
+_FTS_TRIGGERS = {
+    "mentions_fts_ai": """
+        CREATE TRIGGER mentions_fts_ai AFTER INSERT ON mentions BEGIN
+            INSERT INTO mentions_fts(rowid, title, summary) VALUES (new.id, new.title, new.summary);
+        END
+    """,
+    "mentions_fts_ad": """
+        CREATE TRIGGER mentions_fts_ad AFTER DELETE ON mentions BEGIN
+            INSERT INTO mentions_fts(mentions_fts, rowid, title, summary) VALUES ('delete', old.id, old.title, old.summary);
+        END
+    """,
+    "mentions_fts_au": """
+        CREATE TRIGGER mentions_fts_au AFTER UPDATE OF title, summary ON mentions BEGIN
+            INSERT INTO mentions_fts(mentions_fts, rowid, title, summary) VALUES ('delete', old.id, old.title, old.summary);
+            INSERT INTO mentions_fts(rowid, title, summary) VALUES (new.id, new.title, new.summary);
+        END
+    """,
+}
+
+
+def _ensure_sqlite_fts():
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        existing = {
+            row[0]
+            for row in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+        }
+        if FTS_TABLE not in existing:
+            # External-content index over mentions(title, summary); rowid == mentions.id
+            conn.exec_driver_sql(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                "title, summary, content='mentions', content_rowid='id', "
+                "tokenize='unicode61 remove_diacritics 2')"
+            )
+            # Backfill rows that were ingested before the index existed
+            conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        for name, ddl in _FTS_TRIGGERS.items():
+            if name not in existing:
+                conn.exec_driver_sql(ddl)
+
+
+def _ensure_indexes():
+    # create_all skips tables that already exist, so indexes added later need this
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
 
 def init_db():
     from . import models  # noqa: F401
@@ -37,6 +170,15 @@ def init_db():
     except Exception:
         # Best-effort; in dev you can delete social_listening.db to rebuild
         pass
+    try:
+        _ensure_indexes()
+    except Exception:
+        pass
+    try:
+        _ensure_sqlite_fts()
+    except Exception:
+        # SQLite builds without FTS5 fall back to ILIKE search
+        pass
 
 
 def get_db():
@@ -45,3 +187,12 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_read_db():
+    # Read-only pooled connections; use for GET routes so they never queue behind ingest
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,84 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Iterable, Iterator
+from sqlalchemy import select
+from .db import ReadSessionLocal
+from .models import Mention
+from .search import fts_filter
+
+EXPORT_CHUNK = 5000  # rows fetched per cursor round trip and serialized per yield
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Same fields as MentionOut, minus the search-only snippet
+EXPORT_COLUMNS = (
+    Mention.id,
+    Mention.title,
+    Mention.summary,
+    Mention.url,
+    Mention.source,
+    Mention.author,
+    Mention.published_at,
+    Mention.fetched_at,
+    Mention.sentiment,
+    Mention.cluster_id,
+)
+FIELDS = tuple(c.key for c in EXPORT_COLUMNS)
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _ndjson(chunk) -> str:
+    dumps = json.dumps
+    return "".join(
+        dumps(dict(zip(FIELDS, map(_plain, row))), ensure_ascii=False, separators=(",", ":")) + "\n"
+        for row in chunk
+    )
+
+
+def _csv(chunk, header: bool) -> str:
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    if header:
+        w.writerow(FIELDS)
+    w.writerows(["" if v is None else _plain(v) for v in row] for row in chunk)
+    return buf.getvalue()
+
+
+def export_rows(stmt, fmt: str, chunk: int = EXPORT_CHUNK) -> Iterator[bytes]:
+    """Serialize ``stmt`` (a select over EXPORT_COLUMNS) chunk by chunk.
+
+    Opens its own read session: the response body is produced after the
+    request's dependencies have been closed.
+    """
+    with ReadSessionLocal() as db:
+        result = db.execute(stmt.execution_options(yield_per=chunk))
+        if fmt == "csv":
+            # Header even when nothing matches
+            yield _csv([], header=True).encode()
+        for part in result.partitions():
+            yield (_csv(part, header=False) if fmt == "csv" else _ndjson(part)).encode()
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    z = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    for data in chunks:
+        out = z.compress(data)
+        if out:
+            yield out
+    yield z.flush()
+
+
+def export_statement(filters: list, limit: int | None = None, match: str | None = None):
+    """Id-ordered select for an export; id order streams off the primary key without a sort."""
+    stmt = select(*EXPORT_COLUMNS)
+    if match is not None:
+        stmt = fts_filter(stmt, match)
+    stmt = stmt.where(*filters).order_by(Mention.id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
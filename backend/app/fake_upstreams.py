@@ -0,0 +1,349 @@
+"""Stand-in upstream APIs for offline benchmarks.
+
+One ASGI app answers for every host the connectors talk to; the benchmark's
+transport rewrites each request to this server and passes the original host
+in ``X-Upstream-Host``. Responses are generated, shaped like the real APIs
+closely enough for the real connectors to parse. Latency, 5xx errors and 429
+throttling can be injected.
+
+    python -m app.fake_upstreams --port 8900 --latency-ms 50 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from xml.sax.saxutils import escape
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+WORDS = (
+    "acme launch rocket orbit update release outage pricing support battery phone app privacy "
+    "security bug fix crash slow fast great terrible love hate review feature roadmap team ceo "
+    "quarter earnings market users growth churn api docs open source community developer cloud "
+    "server latency database migration index query cache memory cpu network region incident"
+).split()
+
+
+class Config:
+    def __init__(
+        self,
+        items: int = 50,
+        hn_hits: int = 2000,
+        thread_replies: int = 20,
+        reddit_comments: int = 150,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.items = items  # entries per RSS feed, statuses per Mastodon search, posts per Reddit search
+        self.hn_hits = hn_hits  # Algolia hits per query, spread over the crawl window
+        self.thread_replies = thread_replies  # replies per Mastodon conversation and per tweet
+        self.reddit_comments = reddit_comments  # comments per Reddit thread; past 100, the rest come via morechildren
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.seed = seed
+
+
+class Upstreams:
+    def __init__(self, config: Config):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.ids = itertools.count(1)
+        self.started = int(time.time())
+        self.requests = 0
+        self.injected_errors = 0
+        self.injected_throttles = 0
+
+    def text(self, n: int) -> str:
+        return " ".join(self.rng.choices(WORDS, k=n))
+
+    async def gate(self, request: Request) -> Response | None:
+        """Injected latency and failures; None means serve the request."""
+        self.requests += 1
+        c = self.config
+        delay = c.latency_ms + (self.rng.uniform(0, c.jitter_ms) if c.jitter_ms else 0)
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        roll = self.rng.random()
+        if roll < c.throttle_rate:
+            self.injected_throttles += 1
+            return JSONResponse({"error": "rate limited"}, status_code=429, headers={"Retry-After": "1"})
+        if roll < c.throttle_rate + c.error_rate:
+            self.injected_errors += 1
+            return JSONResponse({"error": "unavailable"}, status_code=503)
+        return None
+
+    # RSS: any path not claimed below is a feed of fresh entries
+
+    def rss(self, request: Request) -> Response:
+        host = request.headers.get("x-upstream-host", "feeds.example")
+        now = datetime.now(timezone.utc)
+        items = []
+        for _ in range(self.config.items):
+            n = next(self.ids)
+            items.append(
+                f"<item><title>{escape(self.text(8))}</title>"
+                f"<link>https://{host}{request.url.path}/{n}</link><guid>{host}-{n}</guid>"
+                f"<description>{escape(self.text(40))}</description>"
+                f"<pubDate>{format_datetime(now)}</pubDate></item>"
+            )
+        body = f'<?xml version="1.0"?><rss version="2.0"><channel><title>{host}</title>{"".join(items)}</channel></rss>'
+        return Response(body, media_type="application/rss+xml")
+
+    # Hacker News Algolia search_by_date
+
+    def hn_search(self, request: Request) -> Response:
+        q = request.query_params
+        lower, upper = 0, self.started
+        for cond in q.get("numericFilters", "").split(","):
+            if cond.startswith("created_at_i>") and not cond.startswith("created_at_i>="):
+                lower = int(cond.split(">")[1])
+            elif cond.startswith("created_at_i<="):
+                upper = int(cond.split("<=")[1])
+        size = int(q.get("hitsPerPage", 20))
+        page = int(q.get("page", 0))
+        # Hits for a query sit at fixed times, one every ~20 minutes back from server start
+        query_id = abs(hash(q.get("query", ""))) % 10**6
+        step = 1200
+        newest = min(upper, self.started)
+        first = max(0, -(-(self.started - newest) // step))
+        last = min(self.config.hn_hits, (self.started - lower) // step + 1)
+        matching = [i for i in range(first, last) if lower < self.started - i * step <= upper]
+        window = matching[:1000]  # Algolia's pagination limit
+        hits = []
+        for i in window[page * size:(page + 1) * size]:
+            story = i - i % 10
+            object_id = str(query_id * 10**5 + i)
+            is_story = i == story
+            hits.append({
+                "objectID": object_id,
+                "created_at_i": self.started - i * step,
+                "author": f"user{i % 97}",
+                "title": self.text(8) if is_story else None,
+                "url": None,
+                "story_id": None if is_story else query_id * 10**5 + story,
+                "parent_id": None if is_story else query_id * 10**5 + (story if i % 10 < 4 else i - 1),
+                "comment_text": None if is_story else self.text(30),
+                "story_text": self.text(20) if is_story else None,
+            })
+        return JSONResponse({
+            "hits": hits,
+            "nbHits": len(matching),
+            "nbPages": -(-len(window) // size) if size else 0,
+            "page": page,
+            "hitsPerPage": size,
+        })
+
+    # Mastodon: a conversation is 1000 * n (root) plus replies 1000 * n + j
+
+    def _status(self, host: str, sid: int) -> dict:
+        root, j = divmod(sid, 1000)
+        return {
+            "id": str(sid),
+            "url": f"https://{host}/@user{root % 89}/{sid}",
+            "content": f"<p>{escape(self.text(25))}</p>",
+            "created_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+            "account": {"acct": f"user{(root + j) % 89}"},
+            "in_reply_to_id": None if j == 0 else str(root * 1000 + (j - 1) // 2),
+        }
+
+    def masto_search(self, request: Request) -> Response:
+        host = request.headers.get("x-upstream-host", "mastodon.example")
+        limit = min(int(request.query_params.get("limit", 20)), self.config.items)
+        statuses = []
+        for k in range(limit):
+            root = next(self.ids)
+            # Every third match is a reply, so both root lookups and context fetches happen
+            statuses.append(self._status(host, root * 1000 + (k % 3 == 2) * (1 + k % self.config.thread_replies)))
+        return JSONResponse({"accounts": [], "hashtags": [], "statuses": statuses})
+
+    def masto_status(self, request: Request) -> Response:
+        host = request.headers.get("x-upstream-host", "mastodon.example")
+        return JSONResponse(self._status(host, int(request.path_params["status_id"])))
+
+    def masto_context(self, request: Request) -> Response:
+        host = request.headers.get("x-upstream-host", "mastodon.example")
+        sid = int(request.path_params["status_id"])
+        root, j = divmod(sid, 1000)
+        ancestors = []
+        p = j
+        while p:
+            p = (p - 1) // 2
+            ancestors.append(self._status(host, root * 1000 + p))
+        ancestors.reverse()
+        below = {j}
+        descendants = []
+        for r in range(j + 1, self.config.thread_replies + 1):
+            if (r - 1) // 2 in below:
+                below.add(r)
+                descendants.append(self._status(host, root * 1000 + r))
+        return JSONResponse({"ancestors": ancestors, "descendants": descendants})
+
+    def masto_timeline(self, request: Request) -> Response:
+        host = request.headers.get("x-upstream-host", "mastodon.example")
+        limit = min(int(request.query_params.get("limit", 20)), self.config.items)
+        return JSONResponse([self._status(host, next(self.ids) * 1000) for _ in range(limit)])
+
+    # Reddit
+
+    def _reddit_comment(self, post: str, n: int, parent: str, depth: int, replies=None) -> dict:
+        cid = f"{post}c{n}"
+        return {"kind": "t1", "data": {
+            "id": cid,
+            "body": self.text(20),
+            "author": f"redditor{n % 53}",
+            "created_utc": time.time(),
+            "permalink": f"/r/bench/comments/{post}/_/{cid}/",
+            "parent_id": parent,
+            "depth": depth,
+            "replies": replies if replies is not None else "",
+        }}
+
+    def reddit_search(self, request: Request) -> Response:
+        limit = min(int(request.query_params.get("limit", 25)), self.config.items)
+        children = []
+        for _ in range(limit):
+            pid = f"p{next(self.ids)}"
+            children.append({"kind": "t3", "data": {
+                "id": pid,
+                "title": self.text(10),
+                "selftext": self.text(40),
+                "author": f"redditor{len(children)}",
+                "created_utc": time.time(),
+                "permalink": f"/r/bench/comments/{pid}/_/",
+            }})
+        return JSONResponse({"kind": "Listing", "data": {"children": children}})
+
+    def reddit_comments(self, request: Request) -> Response:
+        post = request.path_params["post_id"]
+        total = self.config.reddit_comments
+        shown = min(total, 100)
+        # Chains of three: a top-level comment, a reply, and a reply to that
+        nodes = []
+        n = 0
+        while n < shown:
+            chain = [n + k for k in range(min(3, shown - n))]
+            node = None
+            for depth, m in reversed(list(enumerate(chain))):
+                parent = f"t1_{post}c{chain[depth - 1]}" if depth else f"t3_{post}"
+                replies = {"kind": "Listing", "data": {"children": [node]}} if node else None
+                node = self._reddit_comment(post, m, parent, depth, replies)
+            nodes.append(node)
+            n += len(chain)
+        if total > shown:
+            nodes.append({"kind": "more", "data": {
+                "count": total - shown,
+                "parent_id": f"t3_{post}",
+                "children": [f"{post}c{m}" for m in range(shown, total)],
+            }})
+        listing = {"kind": "Listing", "data": {"children": nodes}}
+        return JSONResponse([{"kind": "Listing", "data": {"children": []}}, listing])
+
+    def reddit_morechildren(self, request: Request) -> Response:
+        link = request.query_params.get("link_id", "t3_p0")[3:]
+        things = []
+        for cid in request.query_params.get("children", "").split(","):
+            if cid:
+                n = int(cid.rsplit("c", 1)[1])
+                things.append(self._reddit_comment(link, n, f"t3_{link}", 0))
+        return JSONResponse({"json": {"errors": [], "data": {"things": things}}})
+
+    # X
+
+    def _tweet(self, tid: str, conversation: str) -> dict:
+        return {
+            "id": tid,
+            "text": self.text(25),
+            "author_id": str(abs(hash(tid)) % 10**6),
+            "conversation_id": conversation,
+            "created_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+        }
+
+    def x_tweet(self, request: Request) -> Response:
+        tid = request.path_params["tweet_id"]
+        return JSONResponse({"data": self._tweet(tid, tid)})
+
+    def x_search(self, request: Request) -> Response:
+        conv = request.query_params.get("query", "conversation_id:0").split(":", 1)[1]
+        n = min(int(request.query_params.get("max_results", 10)), self.config.thread_replies)
+        return JSONResponse({"data": [self._tweet(f"{conv}{k:04d}", conv) for k in range(1, n + 1)]})
+
+    def stats(self, request: Request) -> Response:
+        return JSONResponse({
+            "requests": self.requests,
+            "injected_errors": self.injected_errors,
+            "injected_throttles": self.injected_throttles,
+        })
+
+
+def create_app(config: Config) -> Starlette:
+    up = Upstreams(config)
+
+    def gated(handler):
+        async def endpoint(request: Request) -> Response:
+            if request.url.path != "/_stats":
+                failure = await up.gate(request)
+                if failure is not None:
+                    return failure
+            return handler(request)
+        return endpoint
+
+    routes = [
+        Route("/_stats", up.stats),
+        Route("/api/v1/search_by_date", gated(up.hn_search)),
+        Route("/api/v2/search", gated(up.masto_search)),
+        Route("/api/v1/statuses/{status_id}", gated(up.masto_status)),
+        Route("/api/v1/statuses/{status_id}/context", gated(up.masto_context)),
+        Route("/api/v1/timelines/{rest:path}", gated(up.masto_timeline)),
+        Route("/search.json", gated(up.reddit_search)),
+        Route("/r/{sub}/search.json", gated(up.reddit_search)),
+        Route("/comments/{post_id}.json", gated(up.reddit_comments)),
+        Route("/api/morechildren.json", gated(up.reddit_morechildren)),
+        Route("/2/tweets/search/recent", gated(up.x_search)),
+        Route("/2/tweets/{tweet_id}", gated(up.x_tweet)),
+        Route("/{rest:path}", gated(up.rss)),
+    ]
+    return Starlette(routes=routes)
+
+
+def main(argv=None) -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(prog="python -m app.fake_upstreams")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--items", type=int, default=50)
+    parser.add_argument("--hn-hits", type=int, default=2000)
+    parser.add_argument("--thread-replies", type=int, default=20)
+    parser.add_argument("--reddit-comments", type=int, default=150)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of requests answered 429")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    config = Config(
+        items=args.items,
+        hn_hits=args.hn_hits,
+        thread_replies=args.thread_replies,
+        reddit_comments=args.reddit_comments,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+import asyncio
+import json
+import logging
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from .db import SessionLocal
+from .metrics import REDACTED_KEYS
+from .models import Job, Source
+from .services.writer import ingest_progress
+from .services.rss import ingest_rss, ingest_rss_sweep
+from .services.hn import search_hn_and_store
+from .services.masto import search_and_store_threads
+from .services.twitter import ingest_tweet_by_id
+from .services.reddit import ingest_reddit_search
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENT_JOBS = 4
+POLL_INTERVAL = 2.0  # seconds between checks for due jobs and sources
+MAX_ATTEMPTS = 3
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+
+# Job kinds match the /ingest routes and Source.type
+HANDLERS = {
+    "rss": lambda db, p: ingest_rss(db, p["url"], p.get("source_name") or "rss"),
+    # {"urls": [...]} or {"all": true} for every enabled rss source
+    "rss-batch": lambda db, p: ingest_rss_sweep(db, None if p.get("all") else p.get("urls") or []),
+    "hn-search": lambda db, p: search_hn_and_store(db, p["query"], p.get("hits_per_page") or 50),
+    "masto-search": lambda db, p: search_and_store_threads(db, p["instance"], p["query"], p.get("limit") or 40),
+    "twitter-tweet": lambda db, p: ingest_tweet_by_id(db, p["bearer_token"], p["tweet_id"], p.get("include_replies") or False),
+    "reddit-search": lambda db, p: ingest_reddit_search(db, p["query"], p.get("subreddit"), p.get("limit") or 25),
+}
+
+# Credentials each job kind needs; never written to the jobs table, logged or returned by the API
+JOB_SECRETS = {"twitter-tweet": ("bearer_token",)}
+SECRET_PARAMS = tuple({k for keys in JOB_SECRETS.values() for k in keys})
+REDACTED_KEYS.update(SECRET_PARAMS)
+
+# Secret params of queued and retrying jobs by job id, held in this process only
+_secrets: dict[int, dict] = {}
+
+
+class MissingSecret(Exception):
+    """The job's credentials were held by a process that has since exited."""
+
+    permanent = True  # retrying can't bring them back
+
+
+def _split_secrets(params: dict) -> tuple[dict, dict]:
+    public = {k: v for k, v in params.items() if k not in SECRET_PARAMS}
+    return public, {k: params[k] for k in SECRET_PARAMS if k in params}
+
+
+def retry_delay(attempts: int) -> float:
+    """Jittered exponential backoff before retry number ``attempts``."""
+    delay = min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def source_params(src: Source) -> dict:
+    params = json.loads(src.params) if src.params else {}
+    if src.url and "url" not in params:
+        params["url"] = src.url
+    return params
+
+
+def enqueue(db: Session, kind: str, params: dict, source_id: int | None = None, max_attempts: int = MAX_ATTEMPTS) -> Job:
+    if kind not in HANDLERS:
+        raise ValueError(f"unknown job kind: {kind}")
+    params, secrets = _split_secrets(params)
+    job = Job(kind=kind, params=json.dumps(params), source_id=source_id, max_attempts=max_attempts)
+    db.add(job)
+    db.flush()  # assigns the id; the secrets are in place before the job can be claimed
+    if secrets:
+        _secrets[job.id] = secrets
+    try:
+        db.commit()
+    except Exception:
+        _secrets.pop(job.id, None)
+        raise
+    db.refresh(job)
+    runner.wake()
+    return job
+
+
+def _requeue_stale() -> None:
+    # Jobs left 'running' by a previous process never finished; run them again
+    with SessionLocal() as db:
+        db.query(Job).filter(Job.status == "running").update({"status": "queued"})
+        db.commit()
+
+
+def _schedule_sources() -> None:
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        due = (
+            db.query(Source)
+            .filter(
+                Source.enabled.is_(True),
+                Source.interval_seconds.isnot(None),
+                or_(Source.next_run_at.is_(None), Source.next_run_at <= now),
+            )
+            .all()
+        )
+        for src in due:
+            pending = (
+                db.query(Job.id)
+                .filter(Job.source_id == src.id, Job.status.in_(("queued", "running")))
+                .first()
+            )
+            if pending is None and src.type in HANDLERS:
+                # The source's own credentials are read back from it when the job runs
+                params, _ = _split_secrets(source_params(src))
+                db.add(Job(kind=src.type, params=json.dumps(params), source_id=src.id, max_attempts=MAX_ATTEMPTS))
+            src.next_run_at = now + timedelta(seconds=src.interval_seconds)
+        db.commit()
+
+
+def _claim_due(n: int) -> list[int]:
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        jobs = (
+            db.query(Job)
+            .filter(Job.status == "queued", Job.run_after <= now)
+            .order_by(Job.run_after, Job.id)
+            .limit(n)
+            .all()
+        )
+        for job in jobs:
+            job.status = "running"
+            job.attempts += 1
+            job.started_at = now
+            job.error = None
+        db.commit()
+        return [job.id for job in jobs]
+
+
+def _load_job(job_id: int) -> tuple[str, dict]:
+    with SessionLocal() as db:
+        job = db.get(Job, job_id)
+        params = json.loads(job.params)
+        secrets = _secrets.get(job_id)
+        if secrets is None and job.source_id is not None:
+            src = db.get(Source, job.source_id)
+            secrets = _split_secrets(source_params(src))[1] if src is not None else None
+        params.update(secrets or {})
+        missing = [k for k in JOB_SECRETS.get(job.kind, ()) if k not in params]
+        if missing:
+            raise MissingSecret(f"{', '.join(missing)} lost on restart; enqueue the job again")
+        return job.kind, params
+
+
+def _scrub(job: Job) -> None:
+    _secrets.pop(job.id, None)
+    # Jobs queued before secrets were kept out of the table may still carry them
+    params = json.loads(job.params)
+    if any(k in params for k in SECRET_PARAMS):
+        job.params = json.dumps({k: v for k, v in params.items() if k not in SECRET_PARAMS})
+
+
+def _save_progress(job_id: int, stats: dict) -> None:
+    with SessionLocal() as db:
+        db.query(Job).filter(Job.id == job_id).update({"progress": json.dumps(stats)})
+        db.commit()
+
+
+def _finish(job_id: int, stats: dict) -> None:
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        job = db.get(Job, job_id)
+        job.status = "succeeded"
+        job.result = json.dumps(stats)
+        job.progress = json.dumps(stats)
+        job.finished_at = now
+        _scrub(job)
+        if job.source_id is not None:
+            db.query(Source).filter(Source.id == job.source_id).update({"last_run_at": now})
+        db.commit()
+
+
+def _fail(job_id: int, exc: Exception) -> None:
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        job = db.get(Job, job_id)
+        job.error = f"{type(exc).__name__}: {exc}"
+        if job.attempts < job.max_attempts and not getattr(exc, "permanent", False):
+            job.status = "queued"
+            # Don't come back before a throttling upstream said we could
+            delay = max(retry_delay(job.attempts), getattr(exc, "retry_after", None) or 0)
+            job.run_after = now + timedelta(seconds=delay)
+        else:
+            job.status = "failed"
+            job.finished_at = now
+            _scrub(job)
+        db.commit()
+
+
+class JobRunner:
+    """Runs queued ingest jobs in the app's event loop.
+
+    Jobs live in the ``jobs`` table, so queued work and retry schedules survive
+    restarts. At most ``max_concurrent`` jobs run at once; the loop also turns
+    due ``Source`` schedules into jobs.
+    """
+
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_JOBS, poll_interval: float = POLL_INTERVAL):
+        self.max_concurrent = max_concurrent
+        self.poll_interval = poll_interval
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wake: asyncio.Event | None = None
+        self._main: asyncio.Task | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        await asyncio.to_thread(_requeue_stale)
+        self._main = asyncio.create_task(self._run_forever())
+
+    async def stop(self) -> None:
+        tasks = [t for t in (self._main, *self._tasks) if t is not None]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._main = None
+        self._loop = None
+
+    def wake(self) -> None:
+        # Safe from any thread; a no-op when the runner isn't started
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _run_forever(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(_schedule_sources)
+                free = self.max_concurrent - len(self._tasks)
+                if free > 0:
+                    for job_id in await asyncio.to_thread(_claim_due, free):
+                        task = asyncio.create_task(self._run(job_id))
+                        self._tasks.add(task)
+                        task.add_done_callback(self._tasks.discard)
+            except Exception:
+                logger.exception("job scheduler iteration failed")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _run(self, job_id: int) -> None:
+        db = SessionLocal()
+        try:
+            # Loaded in a separate session: the handler's session must not hold
+            # the single write connection while it waits on the network
+            kind, params = await asyncio.to_thread(_load_job, job_id)
+            handler = HANDLERS[kind]
+            ingest_progress.set(lambda stats: _save_progress(job_id, stats))
+            stats = await handler(db, params)
+            await asyncio.to_thread(_finish, job_id, stats)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            db.rollback()
+            await asyncio.to_thread(_fail, job_id, exc)
+        finally:
+            db.close()
+            self.wake()
+
+
+runner = JobRunner()
@@ -1,7 +1,14 @@
+import threading
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .db import init_db
-from .routers import mentions, ingest
+from .jobs import runner
+from .metrics import MetricsMiddleware
+from .routers import alerts, mentions, ingest, jobs, metrics, sources, stats, threads
+from .services.clusters import warm_clusters
+from .services.dedup import warm_index
+from .services.fetch import pool
+from .services.rss import shutdown_parse_pool
 
 
 app = FastAPI(title="Social Listening API")
@@ -14,13 +21,37 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
+app.add_middleware(MetricsMiddleware)
 
 
 @app.on_event("startup")
 def on_startup():
     init_db()
+    # Warm the dedup index in the background; until it finishes, duplicates just fall through to the DB
+    threading.Thread(target=warm_index, name="dedup-warm", daemon=True).start()
+    # Same for the near-duplicate index: mentions arriving first just start new clusters
+    threading.Thread(target=warm_clusters, name="clusters-warm", daemon=True).start()
+
+
+@app.on_event("startup")
+async def start_jobs():
+    await runner.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await runner.stop()
+    await pool.aclose()
+    shutdown_parse_pool()
 
 
 app.include_router(mentions.router, prefix="", tags=["mentions"])
+app.include_router(threads.router, prefix="", tags=["threads"])
 app.include_router(ingest.router, prefix="/ingest", tags=["ingest"])
+app.include_router(jobs.router, prefix="/jobs", tags=["jobs"])
+app.include_router(sources.router, prefix="/sources", tags=["sources"])
+app.include_router(stats.router, prefix="/stats", tags=["stats"])
+app.include_router(alerts.router, prefix="/alerts", tags=["alerts"])
+app.include_router(metrics.router, prefix="", tags=["metrics"])
@@ -0,0 +1,341 @@
+"""Process-wide counters and histograms, rendered in the Prometheus text format.
+
+Cheap enough to leave on: recording is a dict lookup, a bisect and an add
+under a lock, with no I/O. ``GET /metrics`` renders the registry.
+"""
+import functools
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Statements slower than this are logged with their query plan
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "250"))
+# Keys whose values never reach the slow-query log, bare or inside JSON text (e.g. job params)
+REDACTED_KEYS: set[str] = set()
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+RUN_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._children: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """The child for these label values; cache it on hot paths."""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._child())
+        return child
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in children:
+            lines.extend(self._sample_lines(values, child))
+        return lines
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self, lock):
+        self.value = 0.0
+        self._lock = lock
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _child(self):
+        return _Value(self._lock)
+
+    def _sample_lines(self, values, child):
+        return [f"{self.name}{_labels(self.label_names, values)} {_num(child.value)}"]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+
+class _Buckets:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: tuple, lock):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = lock
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def _child(self):
+        return _Buckets(self.buckets, self._lock)
+
+    def _sample_lines(self, values, child):
+        with self._lock:
+            counts, total = list(child.counts), child.sum
+        lines = []
+        cumulative = 0
+        for bound, n in zip((*self.buckets, "+Inf"), counts):
+            cumulative += n
+            le = 'le="%s"' % (bound if bound == "+Inf" else _num(bound))
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, values, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.label_names, values)} {_num(total)}")
+        lines.append(f"{self.name}_count{_labels(self.label_names, values)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+        self._collectors: list[Callable[[], None]] = []
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: tuple = ()) -> Gauge:
+        return self._add(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def on_collect(self, fn: Callable[[], None]) -> None:
+        """Run ``fn`` before every render, e.g. to copy a component's stats into gauges."""
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        for fn in self._collectors:
+            try:
+                fn()
+            except Exception:
+                logger.exception("metrics collector failed")
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.counter("http_requests_total", "API requests by route template and status", ("method", "route", "status"))
+HTTP_LATENCY = registry.histogram("http_request_duration_seconds", "API request latency, streaming responses excluded", ("method", "route"))
+
+INGEST_RUNS = registry.counter("ingest_runs_total", "Connector runs by outcome", ("connector", "outcome"))
+INGEST_RUN_SECONDS = registry.histogram("ingest_run_duration_seconds", "Wall time of a connector run", ("connector",), RUN_BUCKETS)
+INGEST_STAGE_SECONDS = registry.histogram("ingest_stage_duration_seconds", "Time spent per ingest stage (fetch, parse, normalize, write)", ("connector", "stage"))
+INGEST_FETCHED = registry.counter("ingest_fetched_total", "Items a connector fetched and handed on for storage", ("connector",))
+INGEST_INSERTED = registry.counter("ingest_inserted_total", "New mentions stored", ("connector",))
+INGEST_DUPLICATES = registry.counter("ingest_duplicates_total", "Fetched items dropped as already stored", ("connector",))
+INGEST_FAILED = registry.counter("ingest_failed_total", "Failed upstream requests and failed runs", ("connector", "kind"))
+INGEST_THROTTLED = registry.counter("ingest_throttled_total", "HTTP 429 responses received", ("connector",))
+
+UPSTREAM_REQUESTS = registry.counter("upstream_requests_total", "Upstream HTTP requests by host and status (or error)", ("host", "status"))
+UPSTREAM_LATENCY = registry.histogram("upstream_request_duration_seconds", "Upstream HTTP latency per host, excluding rate-limit waits", ("host",))
+
+DB_QUERY_SECONDS = registry.histogram("db_query_duration_seconds", "SQL statement time until the first row", ("engine", "statement"), QUERY_BUCKETS)
+DB_SLOW_QUERIES = registry.counter("db_slow_queries_total", "Statements slower than SLOW_QUERY_MS", ("engine",))
+
+# Connector of the ingest run in progress; asyncio tasks and to_thread inherit it
+current_connector: ContextVar[str] = ContextVar("current_connector", default="other")
+
+
+@contextmanager
+def stage(name: str, connector: str | None = None):
+    """Time a block as one ingest stage of ``connector`` (default: the current one)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        INGEST_STAGE_SECONDS.labels(connector or current_connector.get(), name).observe(time.perf_counter() - started)
+
+
+def instrumented(connector: str):
+    """Decorator for async connector entry points: labels everything the run does."""
+
+    def wrap(fn):
+        @functools.wraps(fn)
+        async def run(*args, **kwargs):
+            token = current_connector.set(connector)
+            started = time.perf_counter()
+            outcome = "failed"
+            try:
+                result = await fn(*args, **kwargs)
+                outcome = "ok"
+                return result
+            except Exception as exc:
+                # RateLimited carries retry_after; counted apart so throttling isn't read as breakage
+                outcome = "throttled" if hasattr(exc, "retry_after") else "failed"
+                if outcome == "failed":
+                    INGEST_FAILED.labels(connector, "run").inc()
+                raise
+            finally:
+                INGEST_RUNS.labels(connector, outcome).inc()
+                INGEST_RUN_SECONDS.labels(connector).observe(time.perf_counter() - started)
+                current_connector.reset(token)
+
+        return run
+
+    return wrap
+
+
+def record_writes(connector: str, fetched: int, inserted: int, duplicates: int) -> None:
+    INGEST_FETCHED.labels(connector).inc(fetched)
+    INGEST_INSERTED.labels(connector).inc(inserted)
+    INGEST_DUPLICATES.labels(connector).inc(duplicates)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request count and latency per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        state = {"status": 500, "streaming": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                for key, value in message.get("headers", ()):
+                    if key == b"content-type" and value.startswith(b"text/event-stream"):
+                        state["streaming"] = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router leaves the matched route in the scope; raw paths would explode cardinality
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_REQUESTS.labels(method, path, str(state["status"])).inc()
+            if not state["streaming"]:
+                HTTP_LATENCY.labels(method, path).observe(time.perf_counter() - started)
+
+
+def _redact(parameters):
+    if not REDACTED_KEYS:
+        return parameters
+    keys = "|".join(re.escape(k) for k in sorted(REDACTED_KEYS))
+    in_json = re.compile(rf'("(?:{keys})"\s*:\s*)"(?:[^"\\]|\\.)*"')
+
+    def scrub(value):
+        if isinstance(value, str):
+            return in_json.sub(r'\1"***"', value)
+        if isinstance(value, dict):
+            return {k: "***" if k in REDACTED_KEYS else scrub(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return type(value)(scrub(v) for v in value)
+        return value
+
+    return scrub(parameters)
+
+
+def _explain(conn, statement: str, parameters) -> str:
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    # A fresh DBAPI cursor, so the explain doesn't re-enter these hooks
+    cur = conn.connection.dbapi_connection.cursor()
+    try:
+        cur.execute(prefix + statement, parameters)
+        return "\n".join(" | ".join(str(c) for c in row) for row in cur.fetchall())
+    finally:
+        cur.close()
+
+
+def instrument_engine(engine, name: str) -> None:
+    """Time every statement on ``engine`` and log slow ones with their plan.
+
+    SQLite cursors step to the first row inside ``execute``, so the time
+    covers planning, sorting and the first page of a scan, not the fetch.
+    """
+    threshold = SLOW_QUERY_MS / 1000
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+        DB_QUERY_SECONDS.labels(name, verb if verb in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH") else "OTHER").observe(elapsed)
+        if elapsed < threshold:
+            return
+        DB_SLOW_QUERIES.labels(name).inc()
+        plan = ""
+        if not executemany and verb in ("SELECT", "UPDATE", "DELETE", "WITH"):
+            try:
+                plan = _explain(conn, statement, parameters)
+            except Exception as exc:
+                plan = f"(no plan: {exc})"
+        logger.warning(
+            "slow query on %s engine: %.1f ms\n%s\nparams: %.500r%s",
+            name, elapsed * 1000, statement[:4000], _redact(parameters), f"\nplan:\n{plan}" if plan else "",
+        )
+
+    @event.listens_for(engine, "handle_error")
+    def _failed(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, UniqueConstraint
+from sqlalchemy import Boolean, Column, Integer, String, Text, DateTime, Float, ForeignKey, Index, UniqueConstraint
 from .db import Base
 from datetime import datetime
 
@@ -12,6 +12,19 @@ class Source(Base):
     url = Column(String(500), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # Recurring polling (nullable for backward compatibility)
+    params = Column(Text, nullable=True)  # JSON ingest arguments, e.g. {"query": "..."}
+    interval_seconds = Column(Integer, nullable=True)  # None = never polled automatically
+    enabled = Column(Boolean, default=True, nullable=False)
+    next_run_at = Column(DateTime, nullable=True)
+    last_run_at = Column(DateTime, nullable=True)
+
+    # Incremental feed polling state (RSS)
+    etag = Column(String(500), nullable=True)
+    last_modified = Column(String(100), nullable=True)
+    high_water_at = Column(DateTime, nullable=True)  # newest entry published_at seen so far
+    seen_entry_ids = Column(Text, nullable=True)  # JSON list of entry ids from the last fetch
+
 
 class Mention(Base):
     __tablename__ = "mentions"
@@ -32,6 +45,92 @@ class Mention(Base):
     thread_external_id = Column(String(200), nullable=True)  # root id of thread
     reply_depth = Column(Integer, nullable=True)
 
+    # Near-duplicate story clustering: id of the cluster's first mention; None = first or unique
+    cluster_id = Column(Integer, nullable=True)
+
     __table_args__ = (
         UniqueConstraint("url", name="uq_mentions_url"),
+        # Keyset pagination over the feed order, with and without a source filter
+        Index("ix_mentions_feed", published_at.desc(), fetched_at.desc(), id.desc()),
+        Index("ix_mentions_source_feed", source, published_at.desc(), fetched_at.desc(), id.desc()),
+        # Thread reconstruction: whole-thread range scans and parent -> child hops
+        Index("ix_mentions_thread", thread_external_id, reply_depth),
+        Index("ix_mentions_external", external_id),
+        Index("ix_mentions_parent", source, parent_external_id),
+        # The same lookups within one source; without these a source filter picks ix_mentions_source_feed
+        Index("ix_mentions_source_thread", source, thread_external_id),
+        Index("ix_mentions_source_external", source, external_id),
+        Index("ix_mentions_cluster", cluster_id),
+    )
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)  # same names as the /ingest routes, e.g. 'rss', 'hn-search'
+    params = Column(Text, nullable=False)  # JSON
+    status = Column(String(20), nullable=False, default="queued")  # queued | running | succeeded | failed
+    source_id = Column(Integer, ForeignKey("sources.id", ondelete="SET NULL"), nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    progress = Column(Text, nullable=True)  # JSON, e.g. {"added": 120, "skipped": 4}
+    result = Column(Text, nullable=True)  # JSON
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_jobs_status_run_after", status, run_after),
+        Index("ix_jobs_source_status", source_id, status),
+    )
+
+
+class MentionRollup(Base):
+    __tablename__ = "mention_rollups"
+
+    id = Column(Integer, primary_key=True)
+    granularity = Column(String(10), nullable=False)  # 'minute' | 'hour' | 'day'
+    keyword = Column(String(200), nullable=False, default="")  # '' = all mentions
+    source = Column(String(100), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    sentiment_sum = Column(Float, nullable=False, default=0.0)
+    sentiment_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # Upsert target and the /stats/timeseries range scan
+        UniqueConstraint("granularity", "keyword", "source", "bucket_start", name="uq_mention_rollups_bucket"),
+        Index("ix_mention_rollups_series", "granularity", "keyword", "bucket_start"),
+    )
+
+
+class AlertRule(Base):
+    __tablename__ = "alert_rules"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), nullable=False)
+    terms = Column(Text, nullable=False)  # JSON list of keywords/phrases; any one fires the rule
+    source = Column(String(100), nullable=True)  # only mentions from this source; None = all
+    enabled = Column(Boolean, default=True, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+class MentionMatch(Base):
+    __tablename__ = "mention_matches"
+
+    id = Column(Integer, primary_key=True)
+    mention_id = Column(Integer, ForeignKey("mentions.id", ondelete="CASCADE"), nullable=False)
+    rule_id = Column(Integer, ForeignKey("alert_rules.id", ondelete="CASCADE"), nullable=False)
+    term = Column(String(200), nullable=False)  # first of the rule's terms found in the mention
+    matched_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("rule_id", "mention_id", name="uq_mention_matches_rule_mention"),
+        # Newest matches of one rule, and every rule a mention fired
+        Index("ix_mention_matches_rule", rule_id, id.desc()),
+        Index("ix_mention_matches_mention", mention_id),
     )
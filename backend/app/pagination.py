@@ -0,0 +1,59 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+from .models import Mention
+
+# Feed order; matches ix_mentions_feed / ix_mentions_source_feed. In SQLite NULLs
+# sort lowest, so "published_at DESC" already puts them last and the index is used.
+FEED_ORDER = (Mention.published_at.desc().nullslast(), Mention.fetched_at.desc(), Mention.id.desc())
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(m) -> str:
+    key = [m.published_at.isoformat() if m.published_at else None, m.fetched_at.isoformat(), m.id]
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime | None, datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        published, fetched, id_ = json.loads(raw)
+        return (
+            datetime.fromisoformat(published) if published else None,
+            datetime.fromisoformat(fetched),
+            int(id_),
+        )
+    except Exception as exc:
+        raise InvalidCursor("invalid cursor") from exc
+
+
+def keyset_page(q: Query, cursor: str | None, limit: int) -> tuple[list, str | None]:
+    """Fetch one feed page strictly after ``cursor`` using index range scans.
+
+    Row-value comparisons skip NULLs, so rows without ``published_at`` (which
+    sort last) are read by a second range scan once the dated rows run out.
+    """
+    q = q.order_by(*FEED_ORDER)
+    if cursor is None:
+        rows = q.limit(limit).all()
+    else:
+        published, fetched, id_ = decode_cursor(cursor)
+        rows = []
+        if published is not None:
+            rows = (
+                q.filter(tuple_(Mention.published_at, Mention.fetched_at, Mention.id) < tuple_(published, fetched, id_))
+                .limit(limit)
+                .all()
+            )
+        if len(rows) < limit:
+            undated = q.filter(Mention.published_at.is_(None))
+            if published is None:
+                undated = undated.filter(tuple_(Mention.fetched_at, Mention.id) < tuple_(fetched, id_))
+            rows += undated.limit(limit - len(rows)).all()
+    next_cursor = encode_cursor(rows[-1]) if len(rows) == limit else None
+    return rows, next_cursor
@@ -0,0 +1,72 @@
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from ..db import get_db, get_read_db
+from ..models import AlertRule, Mention, MentionMatch
+from ..schemas import AlertMatchOut, AlertRuleCreate, AlertRuleOut
+from ..services.alerts import alert_engine
+
+
+router = APIRouter()
+
+
+@router.get("/rules", response_model=List[AlertRuleOut])
+def list_rules(db: Session = Depends(get_read_db)):
+    return db.query(AlertRule).order_by(AlertRule.id).all()
+
+
+@router.post("/rules", response_model=AlertRuleOut, status_code=201)
+def create_rule(payload: AlertRuleCreate, db: Session = Depends(get_db)):
+    rule = AlertRule(name=payload.name, terms=json.dumps(payload.terms), source=payload.source, enabled=payload.enabled)
+    db.add(rule)
+    db.commit()
+    db.refresh(rule)
+    return rule
+
+
+@router.put("/rules/{rule_id}", response_model=AlertRuleOut)
+def update_rule(rule_id: int, payload: AlertRuleCreate, db: Session = Depends(get_db)):
+    rule = db.get(AlertRule, rule_id)
+    if rule is None:
+        raise HTTPException(status_code=404, detail="alert rule not found")
+    rule.name = payload.name
+    rule.terms = json.dumps(payload.terms)
+    rule.source = payload.source
+    rule.enabled = payload.enabled
+    db.commit()
+    db.refresh(rule)
+    return rule
+
+
+@router.delete("/rules/{rule_id}", status_code=204)
+def delete_rule(rule_id: int, db: Session = Depends(get_db)):
+    rule = db.get(AlertRule, rule_id)
+    if rule is None:
+        raise HTTPException(status_code=404, detail="alert rule not found")
+    db.query(MentionMatch).filter(MentionMatch.rule_id == rule_id).delete()
+    db.delete(rule)
+    db.commit()
+
+
+@router.get("/matches", response_model=List[AlertMatchOut])
+def list_matches(
+    db: Session = Depends(get_read_db),
+    rule_id: Optional[int] = Query(default=None),
+    before_id: Optional[int] = Query(default=None, description="only matches older than this match id"),
+    limit: int = Query(default=50, ge=1, le=500),
+):
+    q = db.query(MentionMatch, Mention).join(Mention, Mention.id == MentionMatch.mention_id)
+    if rule_id is not None:
+        q = q.filter(MentionMatch.rule_id == rule_id)
+    if before_id is not None:
+        q = q.filter(MentionMatch.id < before_id)
+    return [
+        {"id": m.id, "rule_id": m.rule_id, "term": m.term, "matched_at": m.matched_at, "mention": mention}
+        for m, mention in q.order_by(MentionMatch.id.desc()).limit(limit)
+    ]
+
+
+@router.get("/engine")
+def engine_stats():
+    return alert_engine.stats()
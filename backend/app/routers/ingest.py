@@ -1,57 +1,155 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import json
+import logging
+import zlib
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
+from typing import Optional
 from ..db import get_db
-from ..schemas import RSSIngestRequest, HNSearchRequest, MastoSearchRequest, TwitterIngestRequest, RedditSearchRequest
-from ..services.rss import ingest_rss
-from ..services.hn import search_hn_and_store
-from ..services.masto import search_and_store_threads
-from ..services.twitter import ingest_tweet_by_id
-from ..services.reddit import ingest_reddit_search
+from ..jobs import enqueue
+from ..models import Source
+from ..services.bulk import BulkImport
+from ..services.dedup import index as dedup_index
+from ..services.fetch import pool
+from ..services.rss import parse_opml, register_feeds
+from ..schemas import RSSIngestRequest, RSSBatchRequest, RSSBatchQueued, HNSearchRequest, MastoSearchRequest, TwitterIngestRequest, RedditSearchRequest, JobQueued, BulkImportResult
 
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
+OPML_MAX_BYTES = 5 * 1024 * 1024
 
-@router.post("/rss")
-def ingest_rss_endpoint(payload: RSSIngestRequest, db: Session = Depends(get_db)):
+# Ingest work runs in the background job runner; poll GET /jobs/{job_id} for progress
+
+
+def _queue(db: Session, kind: str, params: dict) -> dict:
     try:
-        added = ingest_rss(db, payload.url)
-        return {"status": "ok", "added": added}
+        job = enqueue(db, kind, params)
+        return {"job_id": job.id}
     except Exception as exc:
         raise HTTPException(status_code=400, detail=str(exc))
 
 
-@router.post("/hn-search")
-def ingest_hn_search(payload: HNSearchRequest, db: Session = Depends(get_db)):
+@router.post("/rss", response_model=JobQueued, status_code=202)
+def ingest_rss_endpoint(payload: RSSIngestRequest, db: Session = Depends(get_db)):
+    return _queue(db, "rss", {"url": str(payload.url)})
+
+
+def _queue_feeds(db: Session, feeds: list, all_sources: bool, interval_seconds: Optional[int], name: str) -> dict:
+    """Register the feeds as rss sources and queue one rss-batch job over them.
+
+    With ``interval_seconds`` an rss-batch source keeps sweeping them on that schedule.
+    """
+    if not feeds and not all_sources:
+        raise HTTPException(status_code=400, detail="no feeds given")
+    urls, created = register_feeds(db, feeds)
+    params = {"all": True} if all_sources else {"urls": urls}
+    source_id = None
+    if interval_seconds:
+        src = Source(name=name[:100], type="rss-batch", params=json.dumps(params), interval_seconds=interval_seconds)
+        db.add(src)
+        db.commit()
+        source_id = src.id
     try:
-        added = search_hn_and_store(db, payload.query, payload.hits_per_page or 50)
-        return {"status": "ok", "added": added}
+        job = enqueue(db, "rss-batch", params, source_id=source_id)
     except Exception as exc:
         raise HTTPException(status_code=400, detail=str(exc))
+    return {"job_id": job.id, "feeds": 0 if all_sources else len(urls), "registered": created, "source_id": source_id}
 
 
-@router.post("/masto-search")
-def ingest_masto_search(payload: MastoSearchRequest, db: Session = Depends(get_db)):
+@router.post("/rss/batch", response_model=RSSBatchQueued, status_code=202)
+def ingest_rss_batch(payload: RSSBatchRequest, db: Session = Depends(get_db)):
+    """Pull many feeds in one job: concurrent downloads, parsing in worker processes.
+
+    The job result reports every feed's status (ok, not_modified,
+    rate_limited or error), entry count and added/skipped mentions.
+    """
+    feeds = [(str(url), None) for url in payload.urls]
+    name = "All RSS feeds" if payload.all_sources else f"RSS batch ({len(feeds)} feeds)"
+    return _queue_feeds(db, feeds, payload.all_sources, payload.interval_seconds, name)
+
+
+@router.post("/opml", response_model=RSSBatchQueued, status_code=202)
+async def ingest_opml(
+    request: Request,
+    interval_seconds: Optional[int] = Query(default=None, ge=60),
+    db: Session = Depends(get_db),
+):
+    """Import an OPML subscription list (the raw XML body) and ingest its feeds as one batch."""
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > OPML_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"OPML body over {OPML_MAX_BYTES} bytes")
     try:
-        added = search_and_store_threads(db, payload.instance, payload.query, payload.limit or 40)
-        return {"status": "ok", "added": added}
-    except Exception as exc:
+        feeds = parse_opml(bytes(body))
+    except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc))
+    if not feeds:
+        raise HTTPException(status_code=400, detail="no feed outlines (xmlUrl) in OPML")
+    return await asyncio.to_thread(_queue_feeds, db, feeds, False, interval_seconds, f"OPML import ({len(feeds)} feeds)")
 
 
-@router.post("/twitter/tweet")
+@router.post("/hn-search", response_model=JobQueued, status_code=202)
+def ingest_hn_search(payload: HNSearchRequest, db: Session = Depends(get_db)):
+    return _queue(db, "hn-search", {"query": payload.query, "hits_per_page": payload.hits_per_page or 50})
+
+
+@router.post("/masto-search", response_model=JobQueued, status_code=202)
+def ingest_masto_search(payload: MastoSearchRequest, db: Session = Depends(get_db)):
+    return _queue(db, "masto-search", {"instance": payload.instance, "query": payload.query, "limit": payload.limit or 40})
+
+
+@router.post("/twitter/tweet", response_model=JobQueued, status_code=202)
 def ingest_twitter_tweet(payload: TwitterIngestRequest, db: Session = Depends(get_db)):
-    try:
-        added = ingest_tweet_by_id(db, payload.bearer_token, payload.tweet_id, payload.include_replies or False)
-        return {"status": "ok", "added": added}
-    except Exception as exc:
-        raise HTTPException(status_code=400, detail=str(exc))
+    return _queue(db, "twitter-tweet", {
+        "bearer_token": payload.bearer_token,
+        "tweet_id": payload.tweet_id,
+        "include_replies": payload.include_replies or False,
+    })
 
 
-@router.post("/reddit/search")
+@router.post("/reddit/search", response_model=JobQueued, status_code=202)
 def ingest_reddit(payload: RedditSearchRequest, db: Session = Depends(get_db)):
+    return _queue(db, "reddit-search", {"query": payload.query, "subreddit": payload.subreddit, "limit": payload.limit or 25})
+
+
+def _bulk_step(importer: BulkImport, chunk: bytes) -> None:
+    importer.feed(chunk)
+    if importer.ready():
+        logger.info("bulk import progress: %s", importer.write())
+
+
+@router.post("/bulk", response_model=BulkImportResult)
+async def ingest_bulk(request: Request, source: Optional[str] = Query(default=None), db: Session = Depends(get_db)):
+    """Load a streamed NDJSON body of mention records (``Content-Encoding: gzip`` accepted).
+
+    Runs in the request rather than as a job: the body is the data. Parsing
+    and writes happen in a worker thread, one batch per transaction.
+    """
+    importer = BulkImport(db, default_source=source)
+    gzipped = request.headers.get("content-encoding", "").lower() == "gzip"
+    decoder = zlib.decompressobj(wbits=47) if gzipped else None
     try:
-        added = ingest_reddit_search(db, payload.query, payload.subreddit, payload.limit or 25)
-        return {"status": "ok", "added": added}
-    except Exception as exc:
-        raise HTTPException(status_code=400, detail=str(exc))
+        async for chunk in request.stream():
+            if decoder is not None:
+                chunk = decoder.decompress(chunk)
+            if chunk:
+                await asyncio.to_thread(_bulk_step, importer, chunk)
+    except zlib.error as exc:
+        raise HTTPException(status_code=400, detail=f"invalid gzip body: {exc}")
+    importer.close()
+    await asyncio.to_thread(importer.write)
+    return importer.result()
+
+
+@router.get("/dedup")
+def dedup_stats():
+    return dedup_index.stats()
+
+
+@router.get("/upstreams")
+def upstream_stats():
+    # Per-host request, throttle and retry counters plus the current pacing rate
+    return pool.stats()
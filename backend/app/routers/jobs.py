@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from ..db import get_read_db
+from ..models import Job
+from ..schemas import JobOut
+
+
+router = APIRouter()
+
+
+@router.get("", response_model=List[JobOut])
+def list_jobs(
+    db: Session = Depends(get_read_db),
+    status: Optional[str] = Query(default=None),
+    source_id: Optional[int] = Query(default=None),
+    limit: int = Query(default=50, ge=1, le=500),
+):
+    q = db.query(Job)
+    if status:
+        q = q.filter(Job.status == status)
+    if source_id is not None:
+        q = q.filter(Job.source_id == source_id)
+    return q.order_by(Job.id.desc()).limit(limit).all()
+
+
+@router.get("/{job_id}", response_model=JobOut)
+def get_job(job_id: int, db: Session = Depends(get_read_db)):
+    job = db.get(Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return job
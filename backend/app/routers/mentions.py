@@ -1,31 +1,183 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from ..db import get_db
+from ..cache import etag_matches, generations, mentions_cache
+from ..db import get_read_db
+from ..export import EXPORT_FORMATS, export_rows, export_statement, gzip_stream
 from ..models import Mention
+from ..pagination import FEED_ORDER, InvalidCursor, keyset_page
 from ..schemas import MentionOut
+from ..search import TextMatch, apply_fts, fts_enabled, fts_query, render_snippet
+from ..serialize import MENTION_COLUMNS, mentions_json
+from ..services.stream import stream
 
 
 router = APIRouter()
 
+STREAM_HEARTBEAT = 15.0  # seconds between keep-alive comments on an idle stream
+STREAM_RETRY_MS = 3000
+
+
+def _clean(value: Optional[str]) -> Optional[str]:
+    # tolerate bad client params
+    return None if value in ("undefined", "null", "") else value
+
+
+def _filters(db: Session, query: Optional[str], source: Optional[str]):
+    """FTS match expression (or None) plus the remaining WHERE clauses."""
+    match = fts_query(query) if query else None
+    if match is not None and not fts_enabled(db):
+        match = None
+    filters = []
+    if query and match is None:
+        like = f"%{query}%"
+        filters.append((Mention.title.ilike(like)) | (Mention.summary.ilike(like)))
+    if source:
+        filters.append(Mention.source == source)
+    return match, filters
+
+
+def _page(db: Session, query, source, limit, offset, cursor, highlight, collapse, cluster) -> tuple[list, Optional[str]]:
+    """One page of the feed or of search results as plain rows, plus the cursor of the next page.
+
+    Only the output columns are selected, so rows skip the ORM identity map.
+    """
+    q = db.query(*MENTION_COLUMNS)
+    match, filters = _filters(db, query, source)
+    if collapse == "cluster":
+        # The first mention of each story stands in for its near-duplicates
+        filters.append(Mention.cluster_id.is_(None))
+    if cluster is not None:
+        filters.append((Mention.id == cluster) | (Mention.cluster_id == cluster))
+    if match is not None:
+        q = apply_fts(q, match, highlight=highlight)
+    q = q.filter(*filters)
+    if match is not None:
+        # Relevance-ranked results have no stable key to resume from; page with offset
+        rows = q.order_by(*FEED_ORDER).offset(offset).limit(limit).all()
+        if highlight:
+            rows = [(*row[:-1], render_snippet(row[-1])) for row in rows]
+        return rows, None
+    if cursor is None and offset:
+        return q.order_by(*FEED_ORDER).offset(offset).limit(limit).all(), None
+    try:
+        return keyset_page(q, cursor, limit)
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
 
 @router.get("/mentions", response_model=List[MentionOut])
 def list_mentions(
-    db: Session = Depends(get_db),
+    request: Request,
+    db: Session = Depends(get_read_db),
     query: Optional[str] = Query(default=None),
     source: Optional[str] = Query(default=None),
     limit: int = Query(default=20, ge=1, le=100),
     offset: int = Query(default=0, ge=0),
+    cursor: Optional[str] = Query(default=None),
+    highlight: bool = Query(default=False),
+    collapse: Optional[str] = Query(default=None, pattern="^cluster$", description="cluster: one mention per near-duplicate story"),
+    cluster: Optional[int] = Query(default=None, description="only the mentions of this story cluster"),
 ):
-    if query in ("undefined", "null", ""):  # tolerate bad client params
-        query = None
-    if source in ("undefined", "null", ""):
-        source = None
-    q = db.query(Mention)
-    if query:
-        like = f"%{query}%"
-        q = q.filter((Mention.title.ilike(like)) | (Mention.summary.ilike(like)))
-    if source:
-        q = q.filter(Mention.source == source)
-    q = q.order_by(Mention.published_at.desc().nullslast(), Mention.fetched_at.desc())
-    return q.offset(offset).limit(limit).all()
+    """Served from the response cache while no write has touched the data it covers.
+
+    Every response carries a strong ``ETag``; a matching ``If-None-Match``
+    gets a bodiless 304, straight from the cache when the entry is there.
+    """
+    query, source, cursor = _clean(query), _clean(source), _clean(cursor)
+    key = (query, source, limit, offset, cursor, highlight, collapse, cluster)
+    entry = mentions_cache.get(key) if mentions_cache.enabled else None
+    status = "HIT" if entry is not None else "MISS"
+    if entry is None:
+        # Read before querying: a write that lands meanwhile makes this entry stale, not wrong
+        generation = generations.current(source)
+        rows, next_cursor = _page(db, query, source, limit, offset, cursor, highlight, collapse, cluster)
+        entry = mentions_cache.put(key, mentions_json(rows), {"X-Next-Cursor": next_cursor} if next_cursor else {}, source, generation)
+    headers = {**entry.headers, "ETag": entry.etag, "Cache-Control": "no-cache", "X-Cache": status}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        mentions_cache.count_not_modified()
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type="application/json", headers=headers)
+
+
+@router.get("/mentions/cache")
+def cache_stats():
+    # Hit/miss counts and ratio of the /mentions response cache
+    return mentions_cache.stats()
+
+
+@router.get("/mentions/export")
+def export_mentions(
+    db: Session = Depends(get_read_db),
+    query: Optional[str] = Query(default=None),
+    source: Optional[str] = Query(default=None),
+    format: str = Query(default="ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = Query(default=False),
+    limit: Optional[int] = Query(default=None, ge=1),
+):
+    """Stream every matching mention in id order, in constant memory."""
+    match, filters = _filters(db, _clean(query), _clean(source))
+    body = export_rows(export_statement(filters, limit, match), format)
+    filename = f"mentions.{format}"
+    media_type = EXPORT_FORMATS[format]
+    if gzip:
+        body = gzip_stream(body)
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/mentions/stream")
+async def stream_mentions(
+    request: Request,
+    query: Optional[str] = Query(default=None),
+    source: Optional[str] = Query(default=None),
+    last_event_id: Optional[str] = Query(default=None, description="resume point for clients that can't send the header"),
+    last_event_id_header: Optional[str] = Header(default=None, alias="Last-Event-ID"),
+):
+    """Newly stored mentions as Server-Sent Events, served from memory.
+
+    ``mention`` events carry a MentionOut object. A ``reset`` event means
+    mentions were missed (the client fell behind the buffer or resumed across
+    a restart); reload the feed from ``/mentions`` and keep listening.
+    """
+    query, source = _clean(query), _clean(source)
+    match = fts_query(query) if query else None
+    text_match = TextMatch(match) if match else None
+    cursor, stale = stream.resume_cursor(last_event_id_header or _clean(last_event_id))
+
+    async def events():
+        nonlocal cursor
+        stream.subscribers += 1
+        try:
+            yield f"retry: {STREAM_RETRY_MS}\n\n"
+            if stale:
+                yield f"id: {stream.event_id(cursor - 1)}\nevent: reset\ndata: {{}}\n\n" if cursor else "event: reset\ndata: {}\n\n"
+            while not await request.is_disconnected():
+                batch, cursor, missed = stream.read(cursor)
+                if missed:
+                    yield f"id: {stream.event_id(batch[0].seq - 1)}\nevent: reset\ndata: {{}}\n\n"
+                out = [
+                    f"id: {stream.event_id(ev.seq)}\nevent: mention\ndata: {ev.data}\n\n"
+                    for ev in batch
+                    if (source is None or ev.source == source) and (text_match is None or ev.matches(text_match))
+                ]
+                if out:
+                    yield "".join(out)
+                if not batch:
+                    await stream.wait(cursor, STREAM_HEARTBEAT)
+                    if cursor >= stream.head:
+                        yield ": keep-alive\n\n"
+        finally:
+            stream.subscribers -= 1
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
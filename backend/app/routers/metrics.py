@@ -0,0 +1,46 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from ..cache import mentions_cache
+from ..jobs import runner
+from ..metrics import registry
+from ..services.alerts import alert_engine
+from ..services.clusters import index as cluster_index
+from ..services.dedup import index as dedup_index
+from ..services.stream import stream
+
+
+router = APIRouter()
+
+STREAM_PUBLISHED = registry.gauge("stream_published", "Mentions published to the live stream since start")
+STREAM_SUBSCRIBERS = registry.gauge("stream_subscribers", "Connected live-stream clients")
+DEDUP_ITEMS = registry.gauge("dedup_index_items", "Keys in the dedup Bloom filter")
+CLUSTER_INDEXED = registry.gauge("cluster_index_mentions", "Mentions in the near-duplicate LSH window")
+ALERT_RULES = registry.gauge("alert_rules", "Enabled alert rules in the matcher")
+JOBS_RUNNING = registry.gauge("jobs_running", "Ingest jobs running in this process")
+CACHE_LOOKUPS = registry.counter("mentions_cache_lookups_total", "GET /mentions response cache lookups", ("result",))
+CACHE_NOT_MODIFIED = registry.counter("mentions_cache_not_modified_total", "GET /mentions requests answered 304")
+CACHE_BYTES = registry.gauge("mentions_cache_bytes", "Bytes of cached /mentions responses")
+
+
+def _collect() -> None:
+    # Point-in-time state, read at scrape time instead of tracked on every change
+    stream_stats = stream.stats()
+    STREAM_PUBLISHED.labels().set(stream_stats["published"])
+    STREAM_SUBSCRIBERS.labels().set(stream_stats["subscribers"])
+    DEDUP_ITEMS.labels().set(dedup_index.items)
+    CLUSTER_INDEXED.labels().set(cluster_index.stats()["indexed"])
+    ALERT_RULES.labels().set(alert_engine.stats()["rules"])
+    JOBS_RUNNING.labels().set(len(runner._tasks))
+    cache_stats = mentions_cache.stats()
+    CACHE_LOOKUPS.labels("hit").set(cache_stats["hits"])
+    CACHE_LOOKUPS.labels("miss").set(cache_stats["misses"])
+    CACHE_NOT_MODIFIED.labels().set(cache_stats["not_modified"])
+    CACHE_BYTES.labels().set(cache_stats["bytes"])
+
+
+registry.on_collect(_collect)
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,50 @@
+import json
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List
+from ..db import get_db, get_read_db
+from ..jobs import enqueue, source_params
+from ..models import Source
+from ..schemas import JobQueued, SourceCreate, SourceOut
+
+
+router = APIRouter()
+
+
+@router.get("", response_model=List[SourceOut])
+def list_sources(db: Session = Depends(get_read_db)):
+    return db.query(Source).order_by(Source.id).all()
+
+
+@router.post("", response_model=SourceOut, status_code=201)
+def create_source(payload: SourceCreate, db: Session = Depends(get_db)):
+    src = Source(
+        name=payload.name,
+        type=payload.type,
+        url=payload.url,
+        params=json.dumps(payload.params) if payload.params else None,
+        interval_seconds=payload.interval_seconds,
+        enabled=payload.enabled,
+    )
+    db.add(src)
+    db.commit()
+    db.refresh(src)
+    return src
+
+
+@router.delete("/{source_id}", status_code=204)
+def delete_source(source_id: int, db: Session = Depends(get_db)):
+    src = db.get(Source, source_id)
+    if src is None:
+        raise HTTPException(status_code=404, detail="source not found")
+    db.delete(src)
+    db.commit()
+
+
+@router.post("/{source_id}/run", response_model=JobQueued, status_code=202)
+def run_source(source_id: int, db: Session = Depends(get_db)):
+    src = db.get(Source, source_id)
+    if src is None:
+        raise HTTPException(status_code=404, detail="source not found")
+    job = enqueue(db, src.type, source_params(src), source_id=src.id)
+    return {"job_id": job.id}
@@ -0,0 +1,67 @@
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from typing import Literal, Optional
+from ..db import get_read_db
+from ..models import MentionRollup
+from ..schemas import TimeseriesOut
+from ..services.rollups import DEFAULT_WINDOW
+
+
+router = APIRouter()
+
+
+def _naive_utc(ts: Optional[datetime]) -> Optional[datetime]:
+    # Buckets are naive UTC; an offset in the query has to be applied, not dropped
+    if ts is not None and ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+@router.get("/timeseries", response_model=TimeseriesOut)
+def timeseries(
+    db: Session = Depends(get_read_db),
+    granularity: Literal["minute", "hour", "day"] = Query(default="hour"),
+    source: Optional[str] = Query(default=None),
+    keyword: Optional[str] = Query(default=None),
+    start: Optional[datetime] = Query(default=None),
+    end: Optional[datetime] = Query(default=None),
+    by_source: bool = Query(default=False),
+):
+    # Reads only the rollup table, so cost follows the number of buckets, not mentions
+    end = _naive_utc(end) or datetime.utcnow()
+    start = _naive_utc(start) or end - DEFAULT_WINDOW[granularity]
+    r = MentionRollup
+    cols = [
+        r.bucket_start,
+        func.sum(r.count).label("count"),
+        func.sum(r.sentiment_sum).label("sentiment_sum"),
+        func.sum(r.sentiment_count).label("sentiment_count"),
+    ]
+    group = [r.bucket_start]
+    if by_source:
+        cols.insert(1, r.source)
+        group.append(r.source)
+    q = (
+        db.query(*cols)
+        .filter(
+            r.granularity == granularity,
+            r.keyword == (keyword or "").lower(),
+            r.bucket_start >= start,
+            r.bucket_start <= end,
+        )
+    )
+    if source:
+        q = q.filter(r.source == source)
+    rows = q.group_by(*group).order_by(*group).all()
+    points = [
+        {
+            "bucket_start": row.bucket_start,
+            "source": row.source if by_source else None,
+            "count": row.count,
+            "mean_sentiment": row.sentiment_sum / row.sentiment_count if row.sentiment_count else None,
+        }
+        for row in rows
+    ]
+    return {"granularity": granularity, "keyword": keyword, "source": source, "start": start, "end": end, "points": points}
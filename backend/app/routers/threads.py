@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from typing import Optional
+from ..db import get_read_db
+from ..models import Mention
+from ..schemas import ThreadOut
+from ..threads import build_thread, root_of, thread_rows
+
+
+router = APIRouter()
+
+
+@router.get("/threads/{thread_id}", response_model=ThreadOut)
+def get_thread(thread_id: str, db: Session = Depends(get_read_db), source: Optional[str] = Query(default=None)):
+    rows = thread_rows(db, [thread_id], source)
+    if not rows:
+        raise HTTPException(status_code=404, detail="thread not found")
+    return build_thread(thread_id, rows)
+
+
+@router.get("/mentions/{mention_id}/thread", response_model=ThreadOut)
+def get_mention_thread(mention_id: int, db: Session = Depends(get_read_db)):
+    mention = db.get(Mention, mention_id)
+    if mention is None:
+        raise HTTPException(status_code=404, detail="mention not found")
+    # Seed with both the stored thread label and the topmost stored ancestor;
+    # they differ when the real root was never ingested
+    root = root_of(db, mention)
+    ids = [i for i in dict.fromkeys((mention.thread_external_id, root)) if i]
+    if not ids:
+        rows = db.execute(select(Mention.__table__).where(Mention.id == mention.id)).all()
+        return build_thread(str(mention.id), rows)
+    return build_thread(ids[0], thread_rows(db, ids, mention.source))
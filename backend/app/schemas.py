@@ -1,6 +1,7 @@
-from pydantic import BaseModel, HttpUrl
-from typing import Optional
+from pydantic import BaseModel, Field, HttpUrl, field_validator
+from typing import List, Literal, Optional
 from datetime import datetime
+import json
 
 
 class MentionOut(BaseModel):
@@ -13,15 +14,62 @@ class MentionOut(BaseModel):
     published_at: Optional[datetime] = None
     fetched_at: datetime
     sentiment: Optional[float] = None
+    cluster_id: Optional[int] = None  # set on near-duplicates: id of the first mention of the story
+    snippet: Optional[str] = None  # HTML: escaped text with matches in <mark>, only with ?highlight=true
 
     class Config:
         from_attributes = True
 
 
+class ThreadMentionOut(MentionOut):
+    external_id: Optional[str] = None
+    parent_external_id: Optional[str] = None
+    thread_external_id: Optional[str] = None
+    reply_depth: Optional[int] = None
+    parent_id: Optional[int] = None  # mentions.id of the parent, when stored
+    depth: int  # depth in the reconstructed tree (0 = root)
+
+
+class ThreadOut(BaseModel):
+    thread_id: str
+    sources: List[str]
+    mention_count: int
+    reply_count: int
+    max_depth: int
+    participant_count: int
+    participants: List[str]
+    mean_sentiment: Optional[float] = None
+    first_at: Optional[datetime] = None
+    last_at: Optional[datetime] = None
+    mentions: List[ThreadMentionOut]
+
+
+class TimeseriesPoint(BaseModel):
+    bucket_start: datetime
+    source: Optional[str] = None  # set when grouped by source
+    count: int
+    mean_sentiment: Optional[float] = None
+
+
+class TimeseriesOut(BaseModel):
+    granularity: str
+    keyword: Optional[str] = None
+    source: Optional[str] = None
+    start: datetime
+    end: datetime
+    points: List[TimeseriesPoint]
+
+
 class RSSIngestRequest(BaseModel):
     url: HttpUrl
 
 
+class RSSBatchRequest(BaseModel):
+    urls: List[HttpUrl] = []
+    all_sources: bool = False  # every enabled rss source, plus any urls given
+    interval_seconds: Optional[int] = Field(default=None, ge=60)  # also sweep these feeds on a schedule
+
+
 class HNSearchRequest(BaseModel):
     query: str
     hits_per_page: Optional[int] = 50
@@ -43,3 +91,143 @@ class RedditSearchRequest(BaseModel):
     query: str
     subreddit: Optional[str] = None
     limit: Optional[int] = 25
+
+
+class BulkImportError(BaseModel):
+    line: int
+    error: str
+
+
+class BulkImportResult(BaseModel):
+    lines: int
+    invalid: int
+    added: int
+    skipped: int
+    errors: List[BulkImportError]  # first few rejected lines
+
+
+JobKind = Literal["rss", "rss-batch", "hn-search", "masto-search", "twitter-tweet", "reddit-search"]
+
+
+def _load_json(value):
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+
+class JobQueued(BaseModel):
+    status: str = "queued"
+    job_id: int
+
+
+class RSSBatchQueued(JobQueued):
+    feeds: int  # feeds the job will pull (0 with all_sources: decided when it runs)
+    registered: int  # new rss sources created for them
+    source_id: Optional[int] = None  # the rss-batch source when scheduled
+
+
+class JobOut(BaseModel):
+    id: int
+    kind: str
+    status: str
+    params: dict
+    source_id: Optional[int] = None
+    attempts: int
+    max_attempts: int
+    run_after: datetime
+    progress: Optional[dict] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    @field_validator("params", mode="before")
+    @classmethod
+    def _params(cls, value):
+        # Credentials are kept out of the jobs table, but rows from older versions may hold them
+        return {k: v for k, v in (_load_json(value) or {}).items() if k != "bearer_token"}
+
+    @field_validator("progress", "result", mode="before")
+    @classmethod
+    def _json(cls, value):
+        return _load_json(value)
+
+    class Config:
+        from_attributes = True
+
+
+class SourceCreate(BaseModel):
+    name: str
+    type: JobKind
+    url: Optional[str] = None
+    params: Optional[dict] = None  # ingest arguments, e.g. {"query": "...", "subreddit": "..."}
+    interval_seconds: Optional[int] = Field(default=None, ge=60)
+    enabled: bool = True
+
+
+class SourceOut(BaseModel):
+    id: int
+    name: str
+    type: str
+    url: Optional[str] = None
+    params: Optional[dict] = None
+    interval_seconds: Optional[int] = None
+    enabled: bool
+    next_run_at: Optional[datetime] = None
+    last_run_at: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+
+    @field_validator("params", mode="before")
+    @classmethod
+    def _params(cls, value):
+        return _load_json(value)
+
+    class Config:
+        from_attributes = True
+
+
+class AlertRuleCreate(BaseModel):
+    name: str = Field(min_length=1, max_length=100)
+    terms: List[str] = Field(min_length=1, max_length=1000)  # keywords or phrases, matched case-insensitively on word boundaries
+    source: Optional[str] = None  # only mentions from this source
+    enabled: bool = True
+
+    @field_validator("terms")
+    @classmethod
+    def _terms(cls, value):
+        terms = [" ".join(t.split()) for t in value]
+        if not all(terms):
+            raise ValueError("terms must not be blank")
+        if any(len(t) > 200 for t in terms):
+            raise ValueError("terms must be at most 200 characters")
+        return terms
+
+
+class AlertRuleOut(BaseModel):
+    id: int
+    name: str
+    terms: List[str]
+    source: Optional[str] = None
+    enabled: bool
+    created_at: datetime
+    updated_at: datetime
+
+    @field_validator("terms", mode="before")
+    @classmethod
+    def _terms(cls, value):
+        return _load_json(value)
+
+    class Config:
+        from_attributes = True
+
+
+class AlertMatchOut(BaseModel):
+    id: int
+    rule_id: int
+    term: str
+    matched_at: datetime
+    mention: MentionOut
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,193 @@
+import html
+import re
+from sqlalchemy import column, func, literal_column, table
+from sqlalchemy.orm import Query, Session
+from .db import FTS_TABLE
+from .models import Mention
+
+SNIPPET_OPEN = "<mark>"
+SNIPPET_CLOSE = "</mark>"
+# FTS5 marks matches with these; the stored text is escaped before they become tags
+_MARK_OPEN = "\x02"
+_MARK_CLOSE = "\x03"
+
+_TOKEN_RE = re.compile(r'"[^"]*"?|\(|\)|[^\s()"]+')
+_OPERATORS = {"AND", "OR", "NOT"}
+
+mentions_fts = table(FTS_TABLE, column("rowid"))
+_fts_col = literal_column(FTS_TABLE)
+
+_fts_enabled: bool | None = None
+
+
+def fts_enabled(db: Session) -> bool:
+    global _fts_enabled
+    if _fts_enabled is None:
+        bind = db.get_bind()
+        if bind.dialect.name != "sqlite":
+            _fts_enabled = False
+        else:
+            row = db.connection().exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+            ).first()
+            _fts_enabled = row is not None
+    return _fts_enabled
+
+
+def fts_query(raw: str) -> str | None:
+    """Turn user search input into a safe FTS5 MATCH expression.
+
+    Supports "quoted phrases", prefix* terms, AND/OR/NOT and parentheses; any
+    other bare word is quoted so punctuation like ``body-shaming`` can't break
+    the FTS5 parser.
+    """
+    out: list[str] = []
+    depth = 0
+    for tok in _TOKEN_RE.findall(raw):
+        if tok.startswith('"'):
+            phrase = tok.strip('"').strip()
+            if phrase:
+                out.append(f'"{phrase}"')
+        elif tok in _OPERATORS:
+            # Binary operators need an operand on the left
+            if out and out[-1] not in _OPERATORS and out[-1] != "(":
+                out.append(tok)
+        elif tok == "(":
+            out.append(tok)
+            depth += 1
+        elif tok == ")":
+            if depth == 0:
+                continue
+            while out and (out[-1] in _OPERATORS):
+                out.pop()
+            if out and out[-1] == "(":
+                out.pop()
+            else:
+                out.append(tok)
+            depth -= 1
+        else:
+            prefix = tok.endswith("*")
+            word = tok.rstrip("*").replace('"', "")
+            if word:
+                out.append(f'"{word}"' + ("*" if prefix else ""))
+    while out and (out[-1] in _OPERATORS or out[-1] == "("):
+        if out.pop() == "(":
+            depth -= 1
+    out.extend(")" * depth)
+    return " ".join(out) or None
+
+
+def fts_filter(q, match: str):
+    """Restrict a Query or select over mentions to rows matching ``match``, unranked."""
+    return q.join(mentions_fts, mentions_fts.c.rowid == Mention.id).where(_fts_col.op("MATCH")(match))
+
+
+def apply_fts(q: Query, match: str, highlight: bool = False) -> Query:
+    """Restrict ``q`` to mentions matching ``match`` and rank by bm25."""
+    q = fts_filter(q, match)
+    if highlight:
+        # Column -1 lets FTS5 pick whichever of title/summary matched best
+        q = q.add_columns(func.snippet(_fts_col, -1, _MARK_OPEN, _MARK_CLOSE, "…", 16))
+    return q.order_by(func.bm25(_fts_col))
+
+
+def render_snippet(raw: str | None) -> str | None:
+    """The snippet as HTML: stored text escaped, matches in ``<mark>`` tags.
+
+    Titles and summaries can hold upstream markup, so nothing but the mark
+    tags may come through as HTML.
+    """
+    if raw is None:
+        return None
+    return html.escape(raw, quote=False).replace(_MARK_OPEN, SNIPPET_OPEN).replace(_MARK_CLOSE, SNIPPET_CLOSE)
+
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class TextMatch:
+    """Evaluates an ``fts_query`` expression against text in memory.
+
+    Follows FTS5 semantics for the subset ``fts_query`` produces: phrases,
+    prefix terms, implicit AND, AND/OR/NOT with NOT binding tightest, and
+    parentheses. Text is split into lowercase word tokens, roughly like the
+    ``unicode61`` tokenizer. Used where rows are filtered without the index.
+    """
+
+    def __init__(self, match: str):
+        self._toks = _TOKEN_RE.findall(match)
+        self._pos = 0
+        self._tree = self._or()
+
+    def _peek(self):
+        return self._toks[self._pos] if self._pos < len(self._toks) else None
+
+    def _next(self):
+        tok = self._peek()
+        self._pos += 1
+        return tok
+
+    def _or(self):
+        node = self._and()
+        while self._peek() == "OR":
+            self._next()
+            node = ("or", node, self._and())
+        return node
+
+    def _and(self):
+        node = self._not()
+        while self._peek() not in (None, "OR", ")"):
+            if self._peek() == "AND":
+                self._next()
+            node = ("and", node, self._not())
+        return node
+
+    def _not(self):
+        node = self._primary()
+        while self._peek() == "NOT":
+            self._next()
+            node = ("not", node, self._primary())
+        return node
+
+    def _primary(self):
+        tok = self._next()
+        if tok == "(":
+            node = self._or()
+            if self._peek() == ")":
+                self._next()
+            return node
+        prefix = self._peek() == "*"
+        if prefix:
+            self._next()
+        words = tuple(w.lower() for w in _WORD_RE.findall(tok or ""))
+        return ("phrase", words, prefix)
+
+    @staticmethod
+    def tokens(text: str) -> list[str]:
+        return _WORD_RE.findall(text.lower())
+
+    def __call__(self, tokens: list[str], token_set: frozenset | None = None) -> bool:
+        return self._eval(self._tree, tokens, token_set if token_set is not None else frozenset(tokens))
+
+    def _eval(self, node, tokens, token_set) -> bool:
+        kind = node[0]
+        if kind == "or":
+            return self._eval(node[1], tokens, token_set) or self._eval(node[2], tokens, token_set)
+        if kind == "and":
+            return self._eval(node[1], tokens, token_set) and self._eval(node[2], tokens, token_set)
+        if kind == "not":
+            return self._eval(node[1], tokens, token_set) and not self._eval(node[2], tokens, token_set)
+        words, prefix = node[1], node[2]
+        if not words:
+            return False
+        if len(words) == 1:
+            if prefix:
+                return any(t.startswith(words[0]) for t in token_set)
+            return words[0] in token_set
+        n = len(words)
+        for i in range(len(tokens) - n + 1):
+            if tuple(tokens[i:i + n - 1]) == words[:-1] and (
+                tokens[i + n - 1].startswith(words[-1]) if prefix else tokens[i + n - 1] == words[-1]
+            ):
+                return True
+        return False
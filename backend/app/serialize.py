@@ -0,0 +1,37 @@
+import json
+from datetime import datetime
+from .models import Mention
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder gives the same JSON, slower
+    orjson = None
+
+# MentionOut's fields in its order; every one but snippet is a Mention column
+MENTION_FIELDS = ("id", "title", "summary", "url", "source", "author", "published_at", "fetched_at", "sentiment", "cluster_id", "snippet")
+MENTION_COLUMNS = tuple(getattr(Mention, f) for f in MENTION_FIELDS[:-1])
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        # Same text as pydantic: ISO 8601, UTC as "Z"
+        text = value.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_UTC_Z)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default).encode()
+
+
+def mentions_json(rows) -> bytes:
+    """A MentionOut JSON list straight from rows selected as ``MENTION_COLUMNS``.
+
+    Rows may carry a trailing snippet column. Byte-for-byte what the
+    ``List[MentionOut]`` response model produces, without building a model
+    (or an ORM entity) per row.
+    """
+    width = len(MENTION_FIELDS)
+    return dumps([dict(zip(MENTION_FIELDS, row if len(row) == width else (*row, None))) for row in rows])
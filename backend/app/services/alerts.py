@@ -0,0 +1,175 @@
+import json
+import re
+import threading
+from datetime import datetime
+from sqlalchemy import func, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from ..models import AlertRule, Mention, MentionMatch
+from .matching import AhoCorasick
+from .sentiment import mention_text
+
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+def normalize_term(term: str) -> str:
+    return " ".join(term.split()).lower()
+
+
+def rule_terms(rule_terms_json: str | None) -> list[str]:
+    terms = json.loads(rule_terms_json) if rule_terms_json else []
+    return [t for t in dict.fromkeys(normalize_term(t) for t in terms) if t]
+
+
+def _insert_ignoring_duplicates(db: Session):
+    table = MentionMatch.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        return sqlite.insert(table).on_conflict_do_nothing(index_elements=["rule_id", "mention_id"])
+    if dialect == "postgresql":
+        return postgresql.insert(table).on_conflict_do_nothing(constraint="uq_mention_matches_rule_mention")
+    return insert(table).prefix_with("OR IGNORE")
+
+
+class AlertEngine:
+    """Every enabled alert rule compiled into one Aho-Corasick automaton.
+
+    A mention's text is scanned once however many rules exist; each pattern
+    maps back to the rules that contain it. Before matching, a one-row query
+    (rule count, newest ``updated_at``) tells whether any rule changed, in
+    this process or another. Only the rules that changed are applied: new
+    terms are added to the trie in place, and terms no rule uses any more are
+    just unmapped until they outnumber the live ones, when the automaton is
+    rebuilt from scratch.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._signature = None
+        self._rules: dict[int, tuple] = {}  # rule id -> (updated_at, terms, source)
+        self._term_rules: dict[str, set[int]] = {}
+        self._automaton = AhoCorasick()
+        self.rebuilds = 0
+        self.updates = 0
+
+    def _add_rule(self, rule_id: int, state: tuple) -> None:
+        self._rules[rule_id] = state
+        for term in state[1]:
+            self._term_rules.setdefault(term, set()).add(rule_id)
+            self._automaton.add(term)
+
+    def _drop_rule(self, rule_id: int) -> None:
+        _, terms, _ = self._rules.pop(rule_id)
+        for term in terms:
+            ids = self._term_rules.get(term)
+            if ids is not None:
+                ids.discard(rule_id)
+                if not ids:
+                    del self._term_rules[term]
+
+    def refresh(self, db: Session) -> None:
+        signature = tuple(db.query(func.count(AlertRule.id), func.max(AlertRule.updated_at)).one())
+        if signature == self._signature:
+            return
+        current = {
+            id_: (updated_at, rule_terms(terms), source)
+            for id_, updated_at, terms, source in db.query(
+                AlertRule.id, AlertRule.updated_at, AlertRule.terms, AlertRule.source
+            ).filter(AlertRule.enabled.is_(True))
+        }
+        for rule_id in [r for r in self._rules if r not in current or current[r][0] != self._rules[r][0]]:
+            self._drop_rule(rule_id)
+        for rule_id, state in current.items():
+            if rule_id not in self._rules:
+                self._add_rule(rule_id, state)
+        dead = len(self._automaton) - len(self._term_rules)
+        if dead > max(len(self._term_rules), 100):
+            self._automaton = AhoCorasick(self._term_rules)
+            self.rebuilds += 1
+        self._signature = signature
+        self.updates += 1
+
+    def match(self, text: str, source: str | None = None) -> dict[int, str]:
+        """Rule id -> first matching term, for the rules ``text`` fires."""
+        fired: dict[int, str] = {}
+        for _, term in self._automaton.finditer(text):
+            for rule_id in self._term_rules.get(term, ()):
+                if rule_id in fired:
+                    continue
+                rule_source = self._rules[rule_id][2]
+                if rule_source is None or rule_source == source:
+                    fired[rule_id] = term
+        return fired
+
+    def match_rows(self, db: Session, rows: list[dict]) -> list[dict]:
+        """``mention_matches`` values for mention rows that carry their ``id``."""
+        now = datetime.utcnow()
+        records = []
+        with self._lock:
+            self.refresh(db)
+            if not self._term_rules:
+                return records
+            for row in rows:
+                text = mention_text(row.get("title"), row.get("summary"))
+                if "<" in text:
+                    text = _TAG_RE.sub(" ", text)
+                for rule_id, term in self.match(text, row.get("source")).items():
+                    records.append({"mention_id": row["id"], "rule_id": rule_id, "term": term, "matched_at": now})
+        return records
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rules": len(self._rules),
+                "terms": len(self._term_rules),
+                "patterns": len(self._automaton),
+                "updates": self.updates,
+                "rebuilds": self.rebuilds,
+            }
+
+
+alert_engine = AlertEngine()
+
+
+def record_matches(db: Session, rows: list[dict]) -> None:
+    """AFTER_INSERT hook: store the alert matches of newly inserted mentions.
+
+    Runs inside the caller's transaction; the caller commits.
+    """
+    if not rows:
+        return
+    records = alert_engine.match_rows(db, rows)
+    if records:
+        db.execute(insert(MentionMatch.__table__), records)
+
+
+def backfill_matches(db: Session, rule_id: int | None = None, chunk: int = 5000, progress=None) -> dict:
+    """Match already stored mentions, in id order, one chunk per transaction.
+
+    ``matched`` counts every match found, including ones already recorded.
+    """
+    scanned = matched = 0
+    last_id = 0
+    stmt = _insert_ignoring_duplicates(db)
+    while True:
+        rows = [
+            {"id": id_, "title": title, "summary": summary, "source": source}
+            for id_, title, summary, source in db.query(Mention.id, Mention.title, Mention.summary, Mention.source)
+            .filter(Mention.id > last_id)
+            .order_by(Mention.id)
+            .limit(chunk)
+        ]
+        if not rows:
+            break
+        records = alert_engine.match_rows(db, rows)
+        if rule_id is not None:
+            records = [r for r in records if r["rule_id"] == rule_id]
+        if records:
+            db.execute(stmt, records)
+        db.commit()
+        scanned += len(rows)
+        matched += len(records)
+        last_id = rows[-1]["id"]
+        if progress is not None:
+            progress(scanned)
+    return {"scanned": scanned, "matched": matched}
@@ -0,0 +1,179 @@
+import json
+import os
+from datetime import datetime, timezone
+from sqlalchemy.orm import Session
+from .writer import MentionWriter
+
+# Rows per transaction for bulk loads; each flush is split into several INSERTs
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "20000"))
+MAX_LINE_BYTES = 1024 * 1024
+MAX_ERROR_SAMPLES = 20
+
+# Column -> max length, from models.Mention
+_STRINGS = {
+    "title": 500,
+    "summary": None,
+    "author": 200,
+    "external_id": 200,
+    "parent_external_id": 200,
+    "thread_external_id": 200,
+}
+
+
+def _datetime(value, field: str) -> datetime | None:
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"{field}: expected ISO 8601 string or epoch seconds")
+    if isinstance(value, (int, float)):
+        try:
+            dt = datetime.fromtimestamp(value, tz=timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            raise ValueError(f"{field}: epoch seconds out of range")
+    elif isinstance(value, str):
+        try:
+            dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            raise ValueError(f"{field}: invalid datetime {value!r}")
+    else:
+        raise ValueError(f"{field}: expected ISO 8601 string or epoch seconds")
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _string(value, field: str, max_len: int | None) -> str | None:
+    if value is None:
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = str(value)  # numeric platform ids, e.g. HN objectIDs
+    if not isinstance(value, str):
+        raise ValueError(f"{field}: expected string")
+    if max_len is not None and len(value) > max_len:
+        value = value[:max_len]
+    return value
+
+
+def normalize_record(obj, default_source: str | None = None) -> dict:
+    """Validate one decoded NDJSON record and map it onto mention columns.
+
+    Raises ValueError with a short reason for records that can't be stored.
+    Unknown keys are ignored; ``parent_id``/``thread_id`` are accepted as
+    aliases for the ``*_external_id`` fields.
+    """
+    if not isinstance(obj, dict):
+        raise ValueError("expected a JSON object")
+    url = obj.get("url")
+    if not isinstance(url, str) or not url.strip():
+        raise ValueError("url: required")
+    if len(url) > 1000:
+        raise ValueError("url: longer than 1000 characters")
+    source = _string(obj.get("source") or default_source, "source", 100)
+    if not source:
+        raise ValueError("source: required")
+    row = {"url": url.strip(), "source": source}
+    for field, max_len in _STRINGS.items():
+        value = obj.get(field)
+        if value is None and field in ("parent_external_id", "thread_external_id"):
+            value = obj.get(field.replace("_external_id", "_id"))
+        row[field] = _string(value, field, max_len)
+    row["published_at"] = _datetime(obj.get("published_at"), "published_at")
+    row["fetched_at"] = _datetime(obj.get("fetched_at"), "fetched_at")
+    sentiment = obj.get("sentiment")
+    if sentiment is not None:
+        if isinstance(sentiment, bool) or not isinstance(sentiment, (int, float)):
+            raise ValueError("sentiment: expected number")
+        sentiment = float(sentiment)
+    row["sentiment"] = sentiment
+    depth = obj.get("reply_depth")
+    if depth is not None:
+        if isinstance(depth, bool) or not isinstance(depth, int) or depth < 0:
+            raise ValueError("reply_depth: expected non-negative integer")
+    elif row["parent_external_id"] is None and row["external_id"] is not None:
+        depth = 0
+    row["reply_depth"] = depth
+    if row["thread_external_id"] is None and depth == 0:
+        row["thread_external_id"] = row["external_id"]
+    return row
+
+
+class BulkImport:
+    """Incremental NDJSON loader.
+
+    Feed it raw byte chunks in any size; complete lines are decoded and
+    validated as they arrive and valid rows wait in ``pending`` until
+    ``ready()``. ``write()`` then stores one batch in a single transaction.
+    Memory is bounded by the batch size plus one partial line.
+    """
+
+    def __init__(self, db: Session, default_source: str | None = None, batch_size: int = BULK_BATCH_SIZE):
+        # Historical dumps would flood the dedup index's Bloom filter and mostly
+        # hold rows no connector will fetch again; the unique constraint suffices.
+        # They would also push every live mention out of the stream's buffer.
+        self.writer = MentionWriter(db, batch_size=batch_size, dedup=False, publish=False, connector="bulk")
+        self.default_source = default_source
+        self.batch_size = batch_size
+        self.pending: list[dict] = []
+        self.lines = 0
+        self.invalid = 0
+        self.errors: list[dict] = []
+        self._partial = b""
+        self._skipping = False  # inside an oversized line, dropping bytes until its newline
+
+    def _error(self, reason: str) -> None:
+        self.invalid += 1
+        if len(self.errors) < MAX_ERROR_SAMPLES:
+            self.errors.append({"line": self.lines, "error": reason})
+
+    def _line(self, line: bytes) -> None:
+        line = line.strip()
+        if not line:
+            return
+        self.lines += 1
+        if len(line) > MAX_LINE_BYTES:
+            self._error(f"line longer than {MAX_LINE_BYTES} bytes")
+            return
+        try:
+            obj = json.loads(line)
+        except ValueError as exc:
+            self._error(f"invalid JSON: {exc}")
+            return
+        try:
+            self.pending.append(normalize_record(obj, self.default_source))
+        except ValueError as exc:
+            self._error(str(exc))
+
+    def feed(self, chunk: bytes) -> None:
+        lines = (self._partial + chunk).split(b"\n")
+        self._partial = lines.pop()
+        if self._skipping and lines:
+            lines.pop(0)
+            self._skipping = False
+        for line in lines:
+            self._line(line)
+        if len(self._partial) > MAX_LINE_BYTES:
+            if not self._skipping:
+                self.lines += 1
+                self._error(f"line longer than {MAX_LINE_BYTES} bytes")
+            self._skipping = True
+            self._partial = b""
+
+    def close(self) -> None:
+        # A last record without a trailing newline
+        partial, self._partial = self._partial, b""
+        if not self._skipping:
+            self._line(partial)
+
+    def ready(self) -> bool:
+        return len(self.pending) >= self.batch_size
+
+    def write(self) -> dict:
+        rows, self.pending = self.pending, []
+        self.writer.write(rows)
+        return self.stats()
+
+    def stats(self) -> dict:
+        return {"lines": self.lines, "invalid": self.invalid, **self.writer.stats()}
+
+    def result(self) -> dict:
+        return {**self.stats(), "errors": self.errors}
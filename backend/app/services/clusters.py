@@ -0,0 +1,255 @@
+import os
+import random
+import re
+import threading
+from array import array
+from collections import OrderedDict
+from sqlalchemy import bindparam, func, update
+from sqlalchemy.orm import Session
+from ..db import ReadSessionLocal
+from ..models import Mention
+from .text import strip_html
+
+# Signature = CLUSTER_BANDS * CLUSTER_ROWS MinHash values; the pair sets the LSH
+# threshold, roughly (1 / bands) ** (1 / rows): 16 x 4 -> ~0.5 Jaccard
+CLUSTER_BANDS = int(os.getenv("CLUSTER_BANDS", "16"))
+CLUSTER_ROWS = int(os.getenv("CLUSTER_ROWS", "4"))
+# Estimated Jaccard similarity a candidate must reach to join a cluster
+CLUSTER_THRESHOLD = float(os.getenv("CLUSTER_THRESHOLD", "0.5"))
+# Most recent mentions kept in the LSH index; older stories stop attracting duplicates
+CLUSTER_WINDOW = int(os.getenv("CLUSTER_WINDOW", "100000"))
+# Shorter texts ("thanks!", "+1") are never clustered
+CLUSTER_MIN_TOKENS = int(os.getenv("CLUSTER_MIN_TOKENS", "4"))
+# Only the start of long bodies is shingled
+MAX_TOKENS = 300
+
+_WORD_RE = re.compile(r"\w+")
+_MASK64 = (1 << 64) - 1
+
+
+def shingles(title: str | None, summary: str | None) -> set[str]:
+    """Word bigrams of the HTML-stripped, case-folded title and summary."""
+    text = f"{title or ''} {summary or ''}"
+    if "<" in text or "&" in text:
+        text = strip_html(text)
+    tokens = _WORD_RE.findall(text.lower())[:MAX_TOKENS]
+    if len(tokens) < CLUSTER_MIN_TOKENS:
+        return set()
+    return {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+
+
+class MinHasher:
+    """One-permutation MinHash with optimal densification.
+
+    Each shingle is hashed once and lands in one of ``k`` bins, keeping the
+    minimum per bin, so a signature costs O(shingles + k) rather than
+    O(shingles * k). Empty bins borrow from a fixed pseudo-random probe
+    sequence of other bins, which keeps the estimator unbiased for short texts.
+    """
+
+    def __init__(self, k: int, seed: int = 1):
+        self.k = k
+        rng = random.Random(seed)
+        self._probes = []
+        for i in range(k):
+            order = [j for j in range(k) if j != i]
+            rng.shuffle(order)
+            self._probes.append(order)
+
+    def signature(self, shingle_set: set[str]) -> array | None:
+        if not shingle_set:
+            return None
+        k = self.k
+        mins: dict[int, int] = {}
+        for s in shingle_set:
+            # str hashes are salted per process; signatures are never stored, so that's fine
+            h = hash(s) & _MASK64
+            b = h % k
+            v = h >> 32
+            cur = mins.get(b)
+            if cur is None or v < cur:
+                mins[b] = v
+        if len(mins) < k:
+            filled = mins.copy()  # borrow only from bins a shingle actually landed in
+            for i in range(k):
+                if i not in filled:
+                    mins[i] = filled[next(j for j in self._probes[i] if j in filled)]
+        return array("I", [mins[i] for i in range(k)])
+
+
+def similarity(a: array, b: array) -> float:
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+class ClusterIndex:
+    """LSH index over MinHash signatures of recent mentions.
+
+    The signature is cut into bands; mentions sharing any band land in the
+    same bucket and become candidates, so assigning a mention costs a fixed
+    number of dict lookups however many are indexed. Candidates are confirmed
+    by estimated Jaccard similarity before the mention joins their cluster.
+
+    A cluster is named after its first mention's id. Only the newest
+    ``window`` mentions are kept; each bucket remembers the latest member that
+    touched it, so a cluster that keeps getting new members stays findable.
+    """
+
+    def __init__(self, bands: int = CLUSTER_BANDS, rows: int = CLUSTER_ROWS, threshold: float = CLUSTER_THRESHOLD, window: int = CLUSTER_WINDOW):
+        self.bands = bands
+        self.rows = rows
+        self.threshold = threshold
+        self.window = window
+        self.hasher = MinHasher(bands * rows)
+        self._buckets: list[dict[bytes, tuple[int, int]]] = [{} for _ in range(bands)]  # band key -> (cluster id, mention id)
+        self._entries: OrderedDict[int, tuple[int, array]] = OrderedDict()  # mention id -> (cluster id, signature)
+        self._lock = threading.Lock()
+        self.assigned = 0
+        self.clustered = 0
+        self.warmed = False
+
+    def _band_keys(self, sig: array) -> list[bytes]:
+        raw = sig.tobytes()
+        width = self.rows * sig.itemsize
+        return [raw[i * width:(i + 1) * width] for i in range(self.bands)]
+
+    def _find(self, sig: array, keys: list[bytes]) -> int | None:
+        best, best_sim = None, self.threshold
+        tried = set()
+        for band, key in zip(self._buckets, keys):
+            hit = band.get(key)
+            if hit is None or hit[1] in tried:
+                continue
+            tried.add(hit[1])
+            entry = self._entries.get(hit[1])
+            if entry is None:
+                continue
+            sim = similarity(sig, entry[1])
+            if sim >= best_sim:
+                best, best_sim = hit[0], sim
+        return best
+
+    def _add(self, mention_id: int, cluster_id: int, sig: array, keys: list[bytes]) -> None:
+        for band, key in zip(self._buckets, keys):
+            band[key] = (cluster_id, mention_id)
+        self._entries[mention_id] = (cluster_id, sig)
+        while len(self._entries) > self.window:
+            old_id, (_, old_sig) = self._entries.popitem(last=False)
+            for band, key in zip(self._buckets, self._band_keys(old_sig)):
+                hit = band.get(key)
+                if hit is not None and hit[1] == old_id:
+                    del band[key]
+
+    def assign(self, mention_id: int, title: str | None, summary: str | None) -> int | None:
+        """Index a new mention; returns the cluster it joined, or None if it starts its own."""
+        sig = self.hasher.signature(shingles(title, summary))
+        if sig is None:
+            return None
+        keys = self._band_keys(sig)
+        with self._lock:
+            self.assigned += 1
+            cluster_id = self._find(sig, keys)
+            self._add(mention_id, cluster_id if cluster_id is not None else mention_id, sig, keys)
+            if cluster_id is not None:
+                self.clustered += 1
+        return cluster_id
+
+    def load(self, mention_id: int, cluster_id: int | None, title: str | None, summary: str | None) -> None:
+        """Index a stored mention under its stored cluster, without matching it."""
+        sig = self.hasher.signature(shingles(title, summary))
+        if sig is None:
+            return
+        with self._lock:
+            self._add(mention_id, cluster_id or mention_id, sig, self._band_keys(sig))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets = [{} for _ in range(self.bands)]
+            self._entries.clear()
+
+    def warm(self, db: Session, chunk: int = 5000) -> None:
+        # The newest `window` mentions, oldest first so eviction order holds
+        start = db.query(func.max(Mention.id)).scalar() or 0
+        q = (
+            db.query(Mention.id, Mention.cluster_id, Mention.title, Mention.summary)
+            .filter(Mention.id > start - self.window)
+            .order_by(Mention.id)
+            .execution_options(yield_per=chunk)
+        )
+        for id_, cluster_id, title, summary in q:
+            self.load(id_, cluster_id, title, summary)
+        self.warmed = True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "warmed": self.warmed,
+                "indexed": len(self._entries),
+                "window": self.window,
+                "bands": self.bands,
+                "rows": self.rows,
+                "threshold": self.threshold,
+                "assigned": self.assigned,
+                "clustered": self.clustered,
+            }
+
+
+index = ClusterIndex()
+
+
+def warm_clusters() -> None:
+    with ReadSessionLocal() as db:
+        index.warm(db)
+
+
+def _set_clusters(db: Session, updates: list[dict]) -> None:
+    stmt = update(Mention.__table__).where(Mention.__table__.c.id == bindparam("_id")).values(cluster_id=bindparam("_cluster"))
+    db.execute(stmt, updates)
+
+
+def assign_clusters(db: Session, rows: list[dict]) -> None:
+    """AFTER_INSERT hook: put newly inserted mentions into story clusters.
+
+    Only mentions that join an existing cluster are updated; a mention that
+    starts a cluster keeps ``cluster_id`` NULL and its own id names it.
+    Runs inside the caller's transaction; the caller commits.
+    """
+    updates = []
+    for row in rows:
+        cluster_id = index.assign(row["id"], row.get("title"), row.get("summary"))
+        row["cluster_id"] = cluster_id
+        if cluster_id is not None:
+            updates.append({"_id": row["id"], "_cluster": cluster_id})
+    if updates:
+        _set_clusters(db, updates)
+
+
+def rebuild_clusters(db: Session, chunk: int = 5000, progress=None) -> dict:
+    """Recluster every mention from scratch, in id order."""
+    index.clear()
+    db.query(Mention).filter(Mention.cluster_id.isnot(None)).update({"cluster_id": None}, synchronize_session=False)
+    done = 0
+    last_id = 0
+    while True:
+        rows = (
+            db.query(Mention.id, Mention.title, Mention.summary)
+            .filter(Mention.id > last_id)
+            .order_by(Mention.id)
+            .limit(chunk)
+            .all()
+        )
+        if not rows:
+            break
+        updates = []
+        for id_, title, summary in rows:
+            cluster_id = index.assign(id_, title, summary)
+            if cluster_id is not None:
+                updates.append({"_id": id_, "_cluster": cluster_id})
+        if updates:
+            _set_clusters(db, updates)
+        db.commit()
+        done += len(rows)
+        last_id = rows[-1].id
+        if progress is not None:
+            progress(done)
+    db.commit()
+    return {"mentions": done, **index.stats()}
@@ -0,0 +1,139 @@
+import math
+import os
+import threading
+from collections import OrderedDict
+from hashlib import blake2b
+from sqlalchemy.orm import Session
+from ..db import ReadSessionLocal
+from ..models import Mention
+
+# Expected number of distinct keys and target false-positive rate for the Bloom filter
+DEDUP_CAPACITY = int(os.getenv("DEDUP_CAPACITY", "5000000"))
+DEDUP_FP_RATE = float(os.getenv("DEDUP_FP_RATE", "0.001"))
+# Exact keys kept in the LRU; each costs ~100 bytes (16-byte digest + dict slot)
+DEDUP_LRU_SIZE = int(os.getenv("DEDUP_LRU_SIZE", "200000"))
+
+
+def row_keys(row: dict) -> list[bytes]:
+    # Exactly the stored URL, the column uq_mentions_url is on: a looser key (a
+    # normalized URL, an external id shared across Mastodon instances) would drop
+    # rows the database accepts as distinct
+    return [blake2b(b"u:" + row["url"].encode(), digest_size=16).digest()]
+
+
+class DedupIndex:
+    """Pre-insert duplicate check on the URL, mirroring the unique constraint.
+
+    A Bloom filter remembers every key compactly; an LRU holds the most recent
+    exact keys. A row is only dropped when the Bloom filter *and* the LRU agree
+    it is known, so false positives never lose data: uncertain rows still go to
+    the database, where ON CONFLICT settles them.
+    """
+
+    def __init__(self, capacity: int = DEDUP_CAPACITY, fp_rate: float = DEDUP_FP_RATE, lru_size: int = DEDUP_LRU_SIZE):
+        self.capacity = max(capacity, 1)
+        self.fp_rate = fp_rate
+        self.lru_size = lru_size
+        self.bits = max(int(-self.capacity * math.log(fp_rate) / (math.log(2) ** 2)), 64)
+        self.hashes = max(int(round(self.bits / self.capacity * math.log(2))), 1)
+        self._bloom = bytearray((self.bits + 7) // 8)
+        self._lru: OrderedDict[bytes, None] = OrderedDict()
+        self._lock = threading.Lock()
+        self.items = 0
+        self.checks = 0
+        self.dropped = 0
+        self.bloom_hits = 0
+        self.warmed = False
+
+    def _positions(self, key: bytes) -> list[int]:
+        # Double hashing over the two halves of the 128-bit digest
+        h1 = int.from_bytes(key[:8], "little")
+        h2 = int.from_bytes(key[8:], "little") | 1
+        bits = self.bits
+        return [(h1 + i * h2) % bits for i in range(self.hashes)]
+
+    def _bloom_has(self, key: bytes) -> bool:
+        bloom = self._bloom
+        return all(bloom[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def _add_key(self, key: bytes) -> None:
+        bloom = self._bloom
+        positions = self._positions(key)
+        if not all(bloom[p >> 3] & (1 << (p & 7)) for p in positions):
+            for p in positions:
+                bloom[p >> 3] |= 1 << (p & 7)
+            self.items += 1
+        if self.lru_size:
+            self._lru[key] = None
+            self._lru.move_to_end(key)
+            if len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def seen(self, row: dict) -> bool:
+        """True only when the row is known for certain to be stored already."""
+        return self.seen_keys(row_keys(row))
+
+    def seen_keys(self, keys: list[bytes]) -> bool:
+        with self._lock:
+            self.checks += 1
+            for key in keys:
+                if self._bloom_has(key):
+                    self.bloom_hits += 1
+                    if key in self._lru:
+                        self._lru.move_to_end(key)
+                        self.dropped += 1
+                        return True
+        return False
+
+    def remember(self, rows) -> None:
+        self.remember_keys(key for row in rows for key in row_keys(row))
+
+    def remember_keys(self, keys) -> None:
+        with self._lock:
+            for key in keys:
+                self._add_key(key)
+
+    def warm(self, db: Session, chunk: int = 10000) -> None:
+        # Oldest first so the newest keys end up resident in the LRU
+        q = (
+            db.query(Mention.url)
+            .order_by(Mention.id)
+            .execution_options(yield_per=chunk)
+        )
+        batch = []
+        for (url,) in q:
+            batch.append({"url": url})
+            if len(batch) >= chunk:
+                self.remember(batch)
+                batch = []
+        self.remember(batch)
+        self.warmed = True
+
+    def estimated_fp_rate(self) -> float:
+        return (1 - math.exp(-self.hashes * self.items / self.bits)) ** self.hashes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "warmed": self.warmed,
+                "capacity": self.capacity,
+                "items": self.items,
+                "target_fp_rate": self.fp_rate,
+                "estimated_fp_rate": self.estimated_fp_rate(),
+                "bloom_bits": self.bits,
+                "bloom_hashes": self.hashes,
+                "bloom_bytes": len(self._bloom),
+                "lru_size": len(self._lru),
+                "lru_max": self.lru_size,
+                "checks": self.checks,
+                "bloom_hits": self.bloom_hits,
+                "dropped": self.dropped,
+            }
+
+
+index = DedupIndex()
+
+
+def warm_index() -> None:
+    with ReadSessionLocal() as db:
+        index.warm(db)
@@ -0,0 +1,74 @@
+"""Feed parsing and entry normalization, run in worker processes.
+
+Kept free of database, metrics and HTTP imports so a spawned worker only has
+to load feedparser. Inputs and outputs are plain picklable values.
+"""
+from datetime import datetime
+from hashlib import md5
+import feedparser
+from .text import strip_html
+
+
+def entry_url(entry) -> str:
+    url = getattr(entry, "link", None) or getattr(entry, "id", None)
+    if not url:
+        # fallback unique-ish URL
+        key = (getattr(entry, "title", "") + str(getattr(entry, "published", ""))).encode("utf-8")
+        url = f"urn:rss:{md5(key).hexdigest()}"
+    return url
+
+
+def entry_key(entry) -> str:
+    return getattr(entry, "id", None) or entry_url(entry)
+
+
+def entry_published(entry) -> datetime | None:
+    if getattr(entry, "published_parsed", None):
+        try:
+            return datetime(*entry.published_parsed[:6])
+        except Exception:
+            return None
+    return None
+
+
+def entry_row(entry, source_name: str) -> dict:
+    title = getattr(entry, "title", None)
+    summary = getattr(entry, "summary", None) or getattr(entry, "description", None)
+    # Feeds carry HTML fragments; mentions are plain text, as for Mastodon posts
+    return {
+        "title": strip_html(title) or None,
+        "summary": strip_html(summary) or None,
+        "url": entry_url(entry),
+        "source": source_name,
+        "author": getattr(entry, "author", None),
+        "published_at": entry_published(entry),
+    }
+
+
+def parse_feed(content: bytes, seen: set[str], high_water: datetime | None, source_name: str) -> dict:
+    """Rows for entries not seen before, plus the fetch state that covers them.
+
+    Entries are filtered on id and the published high-water mark before any
+    row is built. Returns ``rows``, ``skipped`` (dropped as already seen),
+    ``seen`` (every entry key, newest feed order) and ``high_water_at``;
+    ``error`` is set when the document isn't a feed at all.
+    """
+    feed = feedparser.parse(content)
+    entries = getattr(feed, "entries", []) or []
+    if not entries and getattr(feed, "bozo", False):
+        return {"error": f"unparseable feed: {feed.get('bozo_exception')}"}
+    rows = []
+    skipped = 0
+    keys = []
+    newest = high_water
+    for entry in entries:
+        key = entry_key(entry)
+        keys.append(key)
+        published = entry_published(entry)
+        if published and (newest is None or published > newest):
+            newest = published
+        if key in seen or (published and high_water and published < high_water):
+            skipped += 1
+            continue
+        rows.append(entry_row(entry, source_name))
+    return {"rows": rows, "skipped": skipped, "seen": keys, "high_water_at": newest}
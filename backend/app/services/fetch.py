@@ -0,0 +1,329 @@
+import asyncio
+import importlib.util
+import logging
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable
+import httpx
+from ..metrics import INGEST_FAILED, INGEST_STAGE_SECONDS, INGEST_THROTTLED, UPSTREAM_LATENCY, UPSTREAM_REQUESTS, current_connector
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "social-listening/0.1"
+DEFAULT_TIMEOUT = 15.0
+
+# Concurrent in-flight requests allowed per upstream host
+DEFAULT_HOST_CONCURRENCY = 8
+HOST_CONCURRENCY = {
+    "www.reddit.com": 4,
+    "hn.algolia.com": 4,
+    "api.x.com": 2,
+}
+
+# Sustained requests/second and burst size per upstream host, from each API's
+# published unauthenticated limits. Rate-limit response headers can only slow
+# a host down from here, never speed it up.
+DEFAULT_HOST_RATE = (2.0, 10)
+HOST_RATES = {
+    "www.reddit.com": (0.15, 5),  # ~10 req/min without OAuth
+    "hn.algolia.com": (2.5, 10),  # 10k req/hour per IP
+    "api.x.com": (0.5, 3),  # endpoint windows are per 15 min; headers refine this
+}
+
+# Retries for 429/502/503/504 and transport errors, with jittered exponential backoff
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+# A Retry-After longer than this is not slept through; the caller gets RateLimited
+MAX_RETRY_AFTER = 120.0
+RETRY_STATUSES = {429, 502, 503, 504}
+# Floor for the adaptive rate after repeated 429s
+MIN_RATE = 0.01
+
+HTTP2 = importlib.util.find_spec("h2") is not None
+
+
+class RateLimited(Exception):
+    """An upstream kept answering 429 after retries (or asked us to wait too long)."""
+
+    def __init__(self, host: str, retry_after: float | None = None):
+        self.host = host
+        self.retry_after = retry_after
+        wait = f", retry after {retry_after:.0f}s" if retry_after else ""
+        super().__init__(f"rate limited by {host}{wait}")
+
+
+def _header_float(headers: httpx.Headers, *names: str) -> float | None:
+    for name in names:
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return float(value)
+        except ValueError:
+            try:
+                # Mastodon sends an ISO 8601 reset time
+                return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+            except ValueError:
+                pass
+    return None
+
+
+def retry_after_seconds(resp: httpx.Response) -> float | None:
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _reset_in(reset: float) -> float:
+    # Reddit sends seconds until reset, X and Mastodon an absolute time
+    if reset > 1e9:
+        return max(reset - time.time(), 0.0)
+    return reset
+
+
+class TokenBucket:
+    """Paces requests to one host.
+
+    ``rate`` tokens/second refill up to ``capacity``. Callers reserve a token
+    and sleep off any deficit, so concurrent waiters queue in arrival order.
+    Responses feed back in through ``observe``: rate-limit headers slow the
+    bucket to what the remaining quota allows, a 429 halves the rate and
+    blocks the host, and successes creep back up to the configured rate.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.remaining: float | None = None
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Take a token; returns how long to wait before using it."""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self.blocked_until - now)
+
+    def block(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def observe(self, resp: httpx.Response) -> None:
+        h = resp.headers
+        remaining = _header_float(h, "X-RateLimit-Remaining", "X-Rate-Limit-Remaining")
+        reset = _header_float(h, "X-RateLimit-Reset", "X-Rate-Limit-Reset")
+        self.remaining = remaining
+        if resp.status_code == 429:
+            self.rate = max(self.rate / 2, MIN_RATE)
+            self.block(retry_after_seconds(resp) or (_reset_in(reset) if reset is not None else BACKOFF_BASE))
+            return
+        if remaining is not None and reset is not None:
+            reset_in = _reset_in(reset)
+            if remaining < 1:
+                self.block(reset_in)
+            # Spread what's left of the window over the time until it resets
+            self.rate = min(self.max_rate, max(remaining / max(reset_in, 1.0), MIN_RATE))
+        elif self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.1)
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for retry number ``attempt`` (1-based)."""
+    return random.uniform(0, min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX))
+
+
+class HostPool:
+    """One long-lived ``httpx.AsyncClient`` per upstream host.
+
+    Keeps connections alive (and uses HTTP/2 when ``h2`` is installed) across
+    ingest runs, and caps fan-out per host with a semaphore so concurrent
+    connectors can't flood a single upstream. Each host also gets a
+    ``TokenBucket`` and requests are retried on throttling and transient errors.
+    """
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT, host_concurrency: dict | None = None, host_rates: dict | None = None):
+        self.timeout = timeout
+        self.host_concurrency = {**HOST_CONCURRENCY, **(host_concurrency or {})}
+        self.host_rates = {**HOST_RATES, **(host_rates or {})}
+        # event loop -> (clients by host, semaphores by host, task closing them at loop shutdown)
+        self._loops: dict[asyncio.AbstractEventLoop, tuple[dict, dict, asyncio.Task]] = {}
+        # Buckets outlive event loops: what we learned about a host's quota still holds
+        self._buckets: dict[str, TokenBucket] = {}
+        self._metrics: dict[str, dict] = defaultdict(lambda: {
+            "requests": 0, "throttled": 0, "retried": 0, "rate_limited": 0, "delayed": 0, "wait_seconds": 0.0,
+        })
+        # (host, limits) -> transport used instead of the network; the offline benchmark sets this
+        self.transport_factory: Callable[[str, httpx.Limits], httpx.AsyncBaseTransport] | None = None
+
+    def bucket(self, host: str) -> TokenBucket:
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = TokenBucket(*self.host_rates.get(host, DEFAULT_HOST_RATE))
+        return bucket
+
+    def default_rate(self, host: str, rate: float, burst: int) -> None:
+        """Rate for a host discovered at runtime (e.g. a Mastodon instance), unless configured."""
+        self.host_rates.setdefault(host, (rate, burst))
+
+    def _bound(self) -> tuple[dict, dict]:
+        # Clients and semaphores belong to the event loop they were made on
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            for old in [old for old in self._loops if old.is_closed()]:
+                # Closed without cancelling its tasks, so its closer never ran; too late to close them now
+                del self._loops[old]
+            state = self._loops[loop] = ({}, {}, loop.create_task(self._close_at_shutdown(loop)))
+        return state[0], state[1]
+
+    async def _close_at_shutdown(self, loop: asyncio.AbstractEventLoop) -> None:
+        # asyncio.run (as used by uvicorn and the CLIs) cancels leftover tasks and lets them
+        # finish before closing the loop: the last point its connections can still be closed
+        try:
+            await loop.create_future()
+        finally:
+            state = self._loops.get(loop)
+            # After aclose() the loop may already hold newer clients with their own closer
+            if state is not None and state[2] is asyncio.current_task():
+                del self._loops[loop]
+                await _close_clients(state[0].values())
+
+    def client(self, host: str) -> tuple[httpx.AsyncClient, asyncio.Semaphore]:
+        """This loop's client for ``host`` and the semaphore capping its concurrency."""
+        clients, semaphores = self._bound()
+        client = clients.get(host)
+        if client is None:
+            limit = self.host_concurrency.get(host, DEFAULT_HOST_CONCURRENCY)
+            limits = httpx.Limits(max_connections=limit, max_keepalive_connections=limit)
+            client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,
+                http2=HTTP2,
+                headers={"User-Agent": USER_AGENT},
+                limits=limits,
+                transport=self.transport_factory(host, limits) if self.transport_factory else None,
+            )
+            clients[host] = client
+            semaphores[host] = asyncio.Semaphore(limit)
+        return client, semaphores[host]
+
+    async def _send(self, host: str, method: str, url: str, **kwargs) -> httpx.Response:
+        bucket = self.bucket(host)
+        wait = bucket.reserve()
+        if wait > 0:
+            m = self._metrics[host]
+            m["delayed"] += 1
+            m["wait_seconds"] += wait
+            await asyncio.sleep(wait)
+        client, limit = self.client(host)
+        async with limit:
+            self._metrics[host]["requests"] += 1
+            started = time.perf_counter()
+            try:
+                resp = await client.request(method, url, **kwargs)
+            except httpx.TransportError:
+                UPSTREAM_REQUESTS.labels(host, "error").inc()
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                UPSTREAM_LATENCY.labels(host).observe(elapsed)
+                INGEST_STAGE_SECONDS.labels(current_connector.get(), "fetch").observe(elapsed)
+        UPSTREAM_REQUESTS.labels(host, str(resp.status_code)).inc()
+        bucket.observe(resp)
+        return resp
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Rate-limited request with retries.
+
+        429, 502, 503 and 504 responses and transport errors are retried up to
+        ``MAX_RETRIES`` times, honouring ``Retry-After``. Raises ``RateLimited``
+        when a host is still throttling us after that; other final responses
+        are returned as-is.
+        """
+        host = httpx.URL(url).host
+        m = self._metrics[host]
+        attempt = 0
+        while True:
+            try:
+                resp = await self._send(host, method, url, **kwargs)
+            except httpx.TransportError:
+                if attempt >= MAX_RETRIES:
+                    INGEST_FAILED.labels(current_connector.get(), "upstream").inc()
+                    raise
+                attempt += 1
+                m["retried"] += 1
+                await asyncio.sleep(backoff_delay(attempt))
+                continue
+            if resp.status_code not in RETRY_STATUSES:
+                if resp.status_code >= 400:
+                    INGEST_FAILED.labels(current_connector.get(), "upstream").inc()
+                return resp
+            retry_after = retry_after_seconds(resp)
+            if resp.status_code == 429:
+                m["throttled"] += 1
+                INGEST_THROTTLED.labels(current_connector.get()).inc()
+            if attempt >= MAX_RETRIES or (retry_after or 0) > MAX_RETRY_AFTER:
+                if resp.status_code == 429:
+                    m["rate_limited"] += 1
+                    raise RateLimited(host, retry_after)
+                INGEST_FAILED.labels(current_connector.get(), "upstream").inc()
+                return resp
+            attempt += 1
+            m["retried"] += 1
+            logger.info("retrying %s %s after HTTP %s (attempt %d)", method, url, resp.status_code, attempt)
+            # A 429 already blocked the bucket for Retry-After; back off on top
+            await asyncio.sleep(retry_after if retry_after is not None else backoff_delay(attempt))
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    def stats(self) -> dict:
+        out = {}
+        for host, m in self._metrics.items():
+            bucket = self._buckets.get(host)
+            out[host] = {
+                **m,
+                "wait_seconds": round(m["wait_seconds"], 3),
+                "rate": round(bucket.rate, 4) if bucket else None,
+                "max_rate": bucket.max_rate if bucket else None,
+                "remaining": bucket.remaining if bucket else None,
+            }
+        return out
+
+    async def aclose(self) -> None:
+        """Close the running loop's clients; the next request opens new ones."""
+        state = self._loops.pop(asyncio.get_running_loop(), None)
+        if state is not None:
+            clients, _, closer = state
+            closer.cancel()
+            await _close_clients(clients.values())
+
+
+async def _close_clients(clients) -> None:
+    for client in clients:
+        try:
+            await client.aclose()
+        except Exception:
+            pass
+
+
+pool = HostPool()
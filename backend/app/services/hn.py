@@ -1,39 +1,165 @@
 from sqlalchemy.orm import Session
-from ..models import Mention
-from datetime import datetime
-import httpx
-
-ALGOLIA_API = "https://hn.algolia.com/api/v1/search"
-
-
-def search_hn_and_store(db: Session, query: str, hits_per_page: int = 50) -> int:
-    params = {"query": query, "tags": "(story,comment)", "hitsPerPage": hits_per_page}
-    added = 0
-    with httpx.Client(timeout=10.0, follow_redirects=True, headers={"User-Agent": "social-listening/0.1"}) as client:
-        resp = client.get(ALGOLIA_API, params=params)
-        resp.raise_for_status()
-        data = resp.json()
-        for hit in data.get("hits", []):
-            url = hit.get("url") or (f"https://news.ycombinator.com/item?id={hit.get('objectID')}")
-            title = hit.get("title") or hit.get("story_title") or None
-            summary = hit.get("comment_text") or hit.get("story_text") or hit.get("_highlightResult", {}).get("comment_text", {}).get("value") or None
-            author = hit.get("author")
-            created_i = hit.get("created_at_i")
-            published = datetime.utcfromtimestamp(created_i) if created_i else None
-            try:
-                mention = Mention(
-                    title=title,
-                    summary=summary,
-                    url=url,
-                    source="hackernews",
-                    author=author,
-                    published_at=published,
-                )
-                db.add(mention)
-                db.commit()
-                db.refresh(mention)
-                added += 1
-            except Exception:
-                db.rollback()
-                continue
-    return added
+from datetime import datetime, timedelta
+import asyncio
+import json
+import os
+from ..metrics import instrumented, stage
+from ..models import Source
+from .fetch import pool
+from .writer import MentionWriter
+
+ALGOLIA_API = "https://hn.algolia.com/api/v1/search_by_date"
+MAX_PAGE_SIZE = 1000
+# Algolia serves at most this many hits for one query, however it's paged
+PAGINATION_LIMIT = 1000
+# Re-scan this far behind the watermark: Algolia indexes new items with some lag
+WATERMARK_OVERLAP = int(os.getenv("HN_WATERMARK_OVERLAP_SECONDS", "300"))
+# How far back the first run of a new query goes
+INITIAL_LOOKBACK = timedelta(days=int(os.getenv("HN_INITIAL_LOOKBACK_DAYS", "30")))
+MAX_HITS_PER_RUN = int(os.getenv("HN_MAX_HITS_PER_RUN", "50000"))
+
+
+def _hit_row(hit: dict) -> dict:
+    object_id = str(hit.get("objectID"))
+    url = hit.get("url") or (f"https://news.ycombinator.com/item?id={object_id}")
+    title = hit.get("title") or hit.get("story_title") or None
+    summary = hit.get("comment_text") or hit.get("story_text") or hit.get("_highlightResult", {}).get("comment_text", {}).get("value") or None
+    created_i = hit.get("created_at_i")
+    story_id = hit.get("story_id")
+    parent_id = hit.get("parent_id")
+    is_story = story_id is None or str(story_id) == object_id
+    return {
+        "title": title,
+        "summary": summary,
+        "url": url,
+        "source": "hackernews",
+        "author": hit.get("author"),
+        "published_at": datetime.utcfromtimestamp(created_i) if created_i else None,
+        "external_id": object_id,
+        "thread_external_id": object_id if is_story else str(story_id),
+        "parent_external_id": None if is_story or parent_id is None else str(parent_id),
+        # Algolia only tells us the parent; top-level comments are the one depth we know
+        "reply_depth": 0 if is_story else (1 if parent_id == story_id else None),
+    }
+
+
+def query_source(db: Session, query: str) -> Source:
+    """The Source row holding the watermark for ``query``, created on first use."""
+    for src in db.query(Source).filter(Source.type == "hn-search").order_by(Source.id):
+        if src.params and json.loads(src.params).get("query") == query:
+            return src
+    src = Source(name=f"hn: {query}", type="hn-search", params=json.dumps({"query": query}))
+    db.add(src)
+    db.commit()
+    db.refresh(src)
+    return src
+
+
+def _load_watermark(db: Session, query: str) -> tuple[int, datetime | None, list[int] | None]:
+    src = query_source(db, query)
+    params = json.loads(src.params) if src.params else {}
+    state = src.id, src.high_water_at, params.get("backfill")
+    # Release the write connection before the crawl
+    db.commit()
+    return state
+
+
+def _store(db: Session, source_id: int, rows: list[dict], high_water_at: datetime | None, backfill: list[int] | None) -> dict:
+    stats = MentionWriter(db).write(rows)
+    # Advance only once the hits below it are written
+    src = db.get(Source, source_id)
+    if high_water_at is not None:
+        src.high_water_at = high_water_at
+    params = json.loads(src.params) if src.params else {}
+    if params.get("backfill") != backfill:
+        if backfill:
+            params["backfill"] = backfill
+        else:
+            params.pop("backfill", None)
+        src.params = json.dumps(params)
+    db.commit()
+    return stats
+
+
+async def _page(query: str, lower: int, upper: int, page: int, size: int) -> dict:
+    params = {
+        "query": query,
+        "tags": "(story,comment)",
+        "numericFilters": f"created_at_i>{lower},created_at_i<={upper}",
+        "hitsPerPage": size,
+        "page": page,
+    }
+    resp = await pool.get(ALGOLIA_API, params=params, timeout=10.0)
+    resp.raise_for_status()
+    with stage("parse"):
+        return resp.json()
+
+
+async def crawl_hits(query: str, lower: int, upper: int, page_size: int, max_hits: int = MAX_HITS_PER_RUN) -> tuple[list[dict], int, int | None]:
+    """Every hit with ``lower < created_at_i <= upper``, newest first.
+
+    The upper bound is pinned for the whole crawl, so hits arriving meanwhile
+    can't shift pages: after the first page gives ``nbPages`` the rest are
+    fetched concurrently. Past Algolia's pagination limit the window slides
+    down to the oldest hit seen and repeats.
+
+    Returns (hits, requests, resume). ``resume`` is set when ``max_hits``
+    stopped the crawl before it reached ``lower``: the hits in
+    ``lower < created_at_i <= resume`` are still to be fetched.
+    """
+    hits: dict[str, dict] = {}
+    requests = 0
+    while True:
+        if len(hits) >= max_hits:
+            return list(hits.values()), requests, upper
+        first = await _page(query, lower, upper, 0, page_size)
+        pages = max(min(first.get("nbPages", 1), PAGINATION_LIMIT // page_size), 1)
+        rest = await asyncio.gather(*(_page(query, lower, upper, p, page_size) for p in range(1, pages)))
+        requests += pages
+        window = [h for page in (first, *rest) for h in page.get("hits", [])]
+        for h in window:
+            hits.setdefault(str(h.get("objectID")), h)
+        if not window or first.get("nbHits", 0) <= pages * page_size:
+            break
+        oldest = min(h.get("created_at_i") or upper for h in window)
+        if oldest >= upper:
+            break  # a single second holds more hits than one window; nothing more to reach
+        upper = oldest  # inclusive, so same-second hits at the edge aren't lost
+    return list(hits.values()), requests, None
+
+
+@instrumented("hn")
+async def search_hn_and_store(db: Session, query: str, hits_per_page: int = 50) -> dict:
+    """Store every hit for ``query`` since its stored watermark.
+
+    A crawl cut short by MAX_HITS_PER_RUN leaves the older part of its window
+    as a ``backfill`` range on the query's Source; later runs work through it
+    with whatever budget the new hits leave, so no hit is skipped for good.
+    """
+    source_id, high_water_at, backfill = await asyncio.to_thread(_load_watermark, db, query)
+    now = datetime.utcnow()
+    since = high_water_at - timedelta(seconds=WATERMARK_OVERLAP) if high_water_at else now - INITIAL_LOOKBACK
+    lower = int((since - datetime(1970, 1, 1)).total_seconds())
+    upper = int((now - datetime(1970, 1, 1)).total_seconds())
+    page_size = max(1, min(hits_per_page, MAX_PAGE_SIZE))
+    hits, requests, resume = await crawl_hits(query, lower, upper, page_size)
+    pending = [lower, resume] if resume is not None else None
+    if backfill and len(hits) < MAX_HITS_PER_RUN:
+        older, more, left = await crawl_hits(query, backfill[0], backfill[1], page_size, MAX_HITS_PER_RUN - len(hits))
+        hits += older
+        requests += more
+        backfill = [backfill[0], left] if left is not None else None
+    if backfill:
+        # Still unreached; one range from the oldest gap up to the newest one
+        pending = [backfill[0], pending[1] if pending else backfill[1]]
+    with stage("normalize"):
+        rows = [_hit_row(hit) for hit in hits]
+    newest = max((r["published_at"] for r in rows if r["published_at"]), default=None)
+    if high_water_at is not None and (newest is None or newest < high_water_at):
+        newest = None  # never move the watermark backwards
+    stats = await asyncio.to_thread(_store, db, source_id, rows, newest, pending)
+    stats["requests"] = requests
+    if pending:
+        # Left for the next runs to backfill
+        stats["truncated"] = True
+    return stats
@@ -1,15 +1,74 @@
 from sqlalchemy.orm import Session
-from ..models import Mention
-from datetime import datetime
-import httpx
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta
+import asyncio
+import os
 import re
-from html import unescape
+import threading
+import time
+import httpx
+from ..db import ReadSessionLocal
+from ..metrics import instrumented, stage
+from ..models import Mention
+from .fetch import RateLimited, pool
+from .matching import AhoCorasick
+from .text import strip_html as _strip_html
+from .writer import MentionWriter
+
+# Mastodon's default limit is 300 requests / 5 min per IP
+MASTODON_RATE = (1.0, 10)
+
+# How long a fetched conversation counts as fresh, and how many to keep
+CONTEXT_TTL = float(os.getenv("MASTO_CONTEXT_TTL", "900"))
+CONTEXT_CACHE_SIZE = int(os.getenv("MASTO_CONTEXT_CACHE_SIZE", "10000"))
+
+
+class TTLCache:
+    """Small LRU map whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "max": self.maxsize, "ttl": self.ttl, "hits": self.hits, "misses": self.misses}
+
+
+# (instance, root status id) -> (root status or None, descendants)
+contexts = TTLCache(CONTEXT_TTL, CONTEXT_CACHE_SIZE)
+# (instance, status id) -> root status id of its conversation
+thread_roots = TTLCache(CONTEXT_TTL, CONTEXT_CACHE_SIZE * 20)
 
 
 def _masto_base(instance: str) -> str:
     instance = instance.strip().rstrip('/')
     if not instance.startswith('http'):
         instance = 'https://' + instance
+    pool.default_rate(httpx.URL(instance).host, *MASTODON_RATE)
     return instance
 
 
@@ -23,136 +82,268 @@ def _parse_datetime(dt_str: str | None):
         return None
 
 
-def _strip_html(html: str | None) -> str:
-    if not html:
-        return ''
-    # Remove tags and unescape entities
-    text = re.sub(r'<[^>]+>', ' ', html)
-    text = unescape(text)
-    return re.sub(r'\s+', ' ', text).strip()
+def _status_url(base: str, status: dict) -> str:
+    return status.get("url") or f"{base}/@{status.get('account',{}).get('acct','')}/{status.get('id')}"
 
 
-def _store_status(db: Session, base: str, status: dict, thread_root_id: str | None, depth: int) -> int:
+def _status_row(base: str, status: dict, thread_root_id: str | None, depth: int) -> dict:
     sid = status.get("id")
-    url = status.get("url") or f"{base}/@{status.get('account',{}).get('acct','')}/{sid}"
-    content = status.get("content")
-    author = status.get("account", {}).get("acct")
-    published = _parse_datetime(status.get("created_at"))
+    url = _status_url(base, status)
+    return {
+        "title": None,
+        "summary": status.get("content"),
+        "url": url,
+        "source": "mastodon",
+        "author": status.get("account", {}).get("acct"),
+        "published_at": _parse_datetime(status.get("created_at")),
+        "external_id": sid,
+        "parent_external_id": status.get("in_reply_to_id"),
+        "thread_external_id": thread_root_id or (status.get("in_reply_to_id") or sid),
+        "reply_depth": depth,
+    }
+
+
+async def _fetch_context(base: str, status_id: str) -> dict | None:
     try:
-        mention = Mention(
-            title=None,
-            summary=content,
-            url=url,
-            source="mastodon",
-            author=author,
-            published_at=published,
-            external_id=sid,
-            parent_external_id=status.get("in_reply_to_id"),
-            thread_external_id=thread_root_id or (status.get("in_reply_to_id") or sid),
-            reply_depth=depth,
-        )
-        db.add(mention)
-        db.commit()
-        db.refresh(mention)
-        return 1
+        resp = await pool.get(f"{base}/api/v1/statuses/{status_id}/context")
+        resp.raise_for_status()
+        with stage("parse"):
+            return resp.json()
+    except RateLimited:
+        # Fail the job (and retry it later) rather than store a partial result as "0 added"
+        raise
     except Exception:
-        db.rollback()
-        return 0
+        return None
 
 
-def _fetch_context(client: httpx.Client, base: str, status_id: str) -> dict:
+async def _fetch_status(base: str, status_id: str) -> dict | None:
     try:
-        return client.get(f"{base}/api/v1/statuses/{status_id}/context").json()
+        resp = await pool.get(f"{base}/api/v1/statuses/{status_id}")
+        resp.raise_for_status()
+        with stage("parse"):
+            return resp.json()
+    except RateLimited:
+        raise
     except Exception:
-        return {"ancestors": [], "descendants": []}
+        return None
 
 
-def _fetch_hashtag(client: httpx.Client, base: str, tag: str, limit: int = 40) -> list[dict]:
+async def _fetch_hashtag(base: str, tag: str, limit: int = 40) -> list[dict]:
     tag = tag.lstrip('#')
     try:
-        resp = client.get(f"{base}/api/v1/timelines/tag/{tag}", params={"limit": limit})
+        resp = await pool.get(f"{base}/api/v1/timelines/tag/{tag}", params={"limit": limit})
         resp.raise_for_status()
-        return resp.json() or []
+        with stage("parse"):
+            return resp.json() or []
+    except RateLimited:
+        raise
     except Exception:
         return []
 
 
-def _fetch_public(client: httpx.Client, base: str, limit: int = 40, local: bool | None = None) -> list[dict]:
+async def _fetch_public(base: str, limit: int = 40, local: bool | None = None) -> list[dict]:
     params = {"limit": limit}
     if local is not None:
         params["local"] = str(local).lower()
     try:
-        resp = client.get(f"{base}/api/v1/timelines/public", params=params)
+        resp = await pool.get(f"{base}/api/v1/timelines/public", params=params)
         resp.raise_for_status()
-        return resp.json() or []
+        with stage("parse"):
+            return resp.json() or []
+    except RateLimited:
+        raise
     except Exception:
         return []
 
 
-def _match_any(text: str, tokens: list[str]) -> bool:
-    lt = text.lower()
-    return any(tok.lower() in lt for tok in tokens if tok)
+def _token_matcher(tokens: list[str]) -> AhoCorasick:
+    # Substring semantics, like Mastodon's own search; one pass per status however many tokens
+    return AhoCorasick(tokens, whole_words=False)
+
+
+def _fresh_urls(urls: list[str]) -> set[str]:
+    """Status URLs stored within the last CONTEXT_TTL seconds."""
+    if not urls:
+        return set()
+    since = datetime.utcnow() - timedelta(seconds=CONTEXT_TTL)
+    with ReadSessionLocal() as db:
+        rows = db.query(Mention.url).filter(Mention.url.in_(urls), Mention.fetched_at >= since).all()
+    return {url for url, in rows}
 
 
-def search_and_store_threads(db: Session, instance: str, query: str, limit: int = 40) -> int:
+def _stored_roots(base: str, ids: list[str]) -> set[str]:
+    """Which of these status ids on ``base`` are already stored as mentions.
+
+    Status ids are only unique per instance, so a row counts when its URL is
+    the status's own page on ``base`` (``{base}/@acct/{id}``). A root that
+    lives on another server doesn't match and is fetched again, which costs a
+    request but never skips a thread.
+    """
+    if not ids:
+        return set()
+    with ReadSessionLocal() as db:
+        rows = (
+            db.query(Mention.external_id, Mention.url)
+            .filter(Mention.source == "mastodon", Mention.external_id.in_(ids), Mention.url.startswith(f"{base}/", autoescape=True))
+            .all()
+        )
+    return {sid for sid, url in rows if url.endswith(f"/{sid}")}
+
+
+def _remember_thread(base: str, root: str, ctx: dict) -> None:
+    thread_roots.put((base, root), root)
+    for key in ("ancestors", "descendants"):
+        for st in ctx.get(key) or []:
+            if st.get("id"):
+                thread_roots.put((base, st["id"]), root)
+
+
+def _resolve_root(base: str, status: dict, local: dict) -> tuple[str | None, str]:
+    """(root id if known, topmost ancestor id reached) via this run's matches and the cache."""
+    st = status
+    for _ in range(len(local) + 1):
+        sid, parent = st["id"], st.get("in_reply_to_id")
+        if not parent:
+            return sid, sid
+        root = thread_roots.get((base, sid))
+        if root is not None:
+            return root, sid
+        if parent not in local:
+            return thread_roots.get((base, parent)), parent
+        st = local[parent]
+    return None, st["id"]  # reply cycle in bad data
+
+
+async def _conversation(base: str, root: str, root_status: dict | None, root_stored: bool, stats: dict) -> tuple[dict | None, list[dict]]:
+    cached = contexts.get((base, root))
+    if cached is not None:
+        head, descendants = cached[0] or root_status, cached[1]
+    else:
+        stats["context_fetches"] += 1
+        ctx = await _fetch_context(base, root)
+        if ctx is None:
+            return root_status, []
+        _remember_thread(base, root, ctx)
+        head, descendants = root_status, ctx.get("descendants") or []
+    if head is None and not root_stored:
+        # Root known only by id (thread_roots): a context response never includes the
+        # status it was asked for, and without the root the replies hang off nothing
+        stats["status_fetches"] += 1
+        head = await _fetch_status(base, root)
+        if head is not None and head.get("in_reply_to_id"):
+            head = None  # not a root after all
+    if cached is None or head is not cached[0]:
+        contexts.put((base, root), (head, descendants))
+    return head, descendants
+
+
+async def _thread_rows(base: str, statuses: list[dict], stats: dict) -> list[dict]:
+    """Rows for matched statuses plus their whole conversations.
+
+    Matches are grouped by conversation root so each conversation costs one
+    context fetch per run (cached for CONTEXT_TTL across runs); a reply whose
+    root isn't known yet costs one extra fetch to find it. Matches already
+    stored within the TTL skip the fetch entirely.
+    """
+    statuses = [st for st in statuses if st.get("id")]
+    fresh = await asyncio.to_thread(_fresh_urls, [_status_url(base, st) for st in statuses])
+    local = {st["id"]: st for st in statuses}
+    by_root: dict[str, list[dict]] = defaultdict(list)
+    root_status: dict[str, dict] = {}
+    orphans: dict[str, list[dict]] = defaultdict(list)  # by topmost ancestor we know of, root unknown
+    for st in statuses:
+        root, top = _resolve_root(base, st, local)
+        if root is not None:
+            by_root[root].append(st)
+            if root in local:
+                root_status[root] = local[root]
+        else:
+            orphans[top].append(st)
+
+    # Matches hanging off the same unfetched ancestor share a root: one lookup finds it
+    tops = [t for t, group in orphans.items() if not all(_status_url(base, st) in fresh for st in group)]
+    stats["context_fetches"] += len(tops)
+    for top, ctx in zip(tops, await asyncio.gather(*(_fetch_context(base, orphans[t][0]["id"]) for t in tops))):
+        ancestors = (ctx or {}).get("ancestors") or []
+        root = ancestors[0]["id"] if ancestors else top
+        if ancestors:
+            root_status.setdefault(root, ancestors[0])
+        by_root[root].extend(orphans.pop(top))
+        if ctx is not None:
+            _remember_thread(base, root, ctx)
+    for top, group in orphans.items():
+        # Fresh replies from unknown threads: store them as-is, no fetch
+        by_root[top].extend(group)
+
+    roots = [r for r, group in by_root.items() if not all(_status_url(base, st) in fresh for st in group)]
+    stored = await asyncio.to_thread(_stored_roots, base, [r for r in roots if r not in root_status])
+    conversations = await asyncio.gather(*(_conversation(base, r, root_status.get(r), r in stored, stats) for r in roots))
+    threads = dict(zip(roots, conversations))
+
+    rows = []
+    with stage("normalize"):
+        for root, group in by_root.items():
+            head, descendants = threads.get(root, (root_status.get(root), []))
+            depth = {root: 0}
+            if head is not None:
+                rows.append(_status_row(base, head, thread_root_id=root, depth=0))
+            # Descendants come back in tree order, so parents precede their replies
+            for st in descendants:
+                depth[st["id"]] = depth.get(st.get("in_reply_to_id"), 0) + 1
+                rows.append(_status_row(base, st, thread_root_id=root, depth=depth[st["id"]]))
+            for st in group:
+                if st["id"] != root and st["id"] not in depth:
+                    rows.append(_status_row(base, st, thread_root_id=root, depth=depth.get(st.get("in_reply_to_id"), 0) + 1))
+    return rows
+
+
+@instrumented("masto")
+async def search_and_store_threads(db: Session, instance: str, query: str, limit: int = 40) -> dict:
     base = _masto_base(instance)
-    added = 0
-    headers = {"User-Agent": "social-listening/0.1"}
     # Prepare tokens and hashtags from query
     raw_tokens = [t for t in re.split(r"\s+OR\s+|\s+", query) if t]
     hashtags = [t for t in raw_tokens if t.startswith('#')]
     tokens = [t.lstrip('#').strip('"') for t in raw_tokens if t and t not in hashtags]
+    matcher = _token_matcher(tokens)
+    writer = MentionWriter(db)
+    stats = {"context_fetches": 0, "status_fetches": 0}
 
-    with httpx.Client(timeout=15.0, headers=headers, follow_redirects=True) as client:
-        # 1) Try full-text search (may return empty without auth)
-        try:
-            resp = client.get(f"{base}/api/v2/search", params={"q": query, "type": "statuses", "limit": limit})
-            resp.raise_for_status()
+    # 1) Try full-text search (may return empty without auth)
+    try:
+        resp = await pool.get(f"{base}/api/v2/search", params={"q": query, "type": "statuses", "limit": limit})
+        resp.raise_for_status()
+        with stage("parse"):
             statuses = resp.json().get("statuses", [])
-        except Exception:
-            statuses = []
-
-        for s in statuses:
-            status_id = s.get("id")
-            added += _store_status(db, base, s, thread_root_id=None, depth=0)
-            # Fetch and store thread context
-            ctx = _fetch_context(client, base, status_id)
-            for depth_group, key in enumerate(["ancestors", "descendants"], start=1):
-                for r in ctx.get(key, []) or []:
-                    added += _store_status(db, base, r, thread_root_id=status_id, depth=depth_group)
-
-        # 2) Fallback: hashtag timelines
-        if added == 0 and hashtags:
-            for h in hashtags:
-                tag_statuses = _fetch_hashtag(client, base, h, limit)
-                for st in tag_statuses:
-                    text = _strip_html(st.get("content"))
-                    if tokens and not _match_any(text, tokens):
-                        continue
-                    sid = st.get("id")
-                    added += _store_status(db, base, st, thread_root_id=None, depth=0)
-                    ctx = _fetch_context(client, base, sid)
-                    for depth_group, key in enumerate(["ancestors", "descendants"], start=1):
-                        for r in ctx.get(key, []) or []:
-                            added += _store_status(db, base, r, thread_root_id=sid, depth=depth_group)
-
-        # 3) Fallback: public timeline + filter by tokens (if any tokens provided)
-        if added == 0 and (tokens or hashtags):
-            for local_flag in (True, False):
-                pub = _fetch_public(client, base, limit, local=local_flag)
-                for st in pub:
-                    text = _strip_html(st.get("content"))
-                    if hashtags:
-                        # If hashtags given, require at least one hashtag match in content
-                        if not any(f"#{h.lstrip('#').lower()}" in text.lower() for h in hashtags):
-                            continue
-                    if tokens and not _match_any(text, tokens):
+    except RateLimited:
+        raise
+    except Exception:
+        statuses = []
+    await asyncio.to_thread(writer.write, await _thread_rows(base, statuses, stats))
+
+    # 2) Fallback: hashtag timelines
+    if writer.added == 0 and hashtags:
+        matched = []
+        for tag_statuses in await asyncio.gather(*(_fetch_hashtag(base, h, limit) for h in hashtags)):
+            for st in tag_statuses:
+                text = _strip_html(st.get("content"))
+                if tokens and not matcher.search_any(text):
+                    continue
+                matched.append(st)
+        await asyncio.to_thread(writer.write, await _thread_rows(base, matched, stats))
+
+    # 3) Fallback: public timeline + filter by tokens (if any tokens provided)
+    if writer.added == 0 and (tokens or hashtags):
+        matched = []
+        for pub in await asyncio.gather(*(_fetch_public(base, limit, local=flag) for flag in (True, False))):
+            for st in pub:
+                text = _strip_html(st.get("content"))
+                if hashtags:
+                    # If hashtags given, require at least one hashtag match in content
+                    if not any(f"#{h.lstrip('#').lower()}" in text.lower() for h in hashtags):
                         continue
-                    sid = st.get("id")
-                    added += _store_status(db, base, st, thread_root_id=None, depth=0)
-                    ctx = _fetch_context(client, base, sid)
-                    for depth_group, key in enumerate(["ancestors", "descendants"], start=1):
-                        for r in ctx.get(key, []) or []:
-                            added += _store_status(db, base, r, thread_root_id=sid, depth=depth_group)
-
-    return added
+                if tokens and not matcher.search_any(text):
+                    continue
+                matched.append(st)
+        await asyncio.to_thread(writer.write, await _thread_rows(base, matched, stats))
+
+    return {**writer.stats(), **stats}
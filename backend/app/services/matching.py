@@ -0,0 +1,99 @@
+from collections import deque
+
+
+def _is_word(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class AhoCorasick:
+    """Multi-pattern matcher: one pass over the text finds every pattern in it.
+
+    Patterns are matched case-insensitively. Adding a pattern extends the trie
+    in place; failure links are recomputed lazily (one BFS over the trie) on
+    the next search, so a batch of rule edits costs a single relink. With
+    ``whole_words`` a match must not be glued to letters or digits on either
+    side of it, so "ai" doesn't fire inside "said".
+    """
+
+    def __init__(self, patterns=(), whole_words: bool = True):
+        self.whole_words = whole_words
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._terminal: list[str | None] = [None]  # pattern ending exactly at this node
+        self._out: list[tuple[str, ...]] = [()]
+        self._linked = True
+        self.patterns: set[str] = set()
+        for p in patterns:
+            self.add(p)
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def add(self, pattern: str) -> None:
+        pattern = pattern.strip().lower()
+        if not pattern or pattern in self.patterns:
+            return
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._terminal.append(None)
+                self._out.append(())
+                self._goto[node][ch] = nxt
+            node = nxt
+        self._terminal[node] = pattern
+        self.patterns.add(pattern)
+        self._linked = False
+
+    def _link(self) -> None:
+        goto, fail, out, terminal = self._goto, self._fail, self._out, self._terminal
+        queue = deque()
+        for child in goto[0].values():
+            fail[child] = 0
+            out[child] = (terminal[child],) if terminal[child] else ()
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for ch, child in goto[node].items():
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[child] = goto[f].get(ch, 0)
+                own = (terminal[child],) if terminal[child] else ()
+                out[child] = own + out[fail[child]]
+                queue.append(child)
+        self._linked = True
+
+    def finditer(self, text: str):
+        """Yield ``(start, pattern)`` for every occurrence, overlapping ones included.
+
+        ``start`` indexes the lowercased text, which for a few characters
+        differs in length from the original.
+        """
+        if not self._linked:
+            self._link()
+        goto, fail, out = self._goto, self._fail, self._out
+        lowered = text.lower()
+        n = len(lowered)
+        node = 0
+        for i, ch in enumerate(lowered):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for pattern in out[node]:
+                start = i - len(pattern) + 1
+                if self.whole_words and (
+                    (start > 0 and _is_word(pattern[0]) and _is_word(lowered[start - 1]))
+                    or (i + 1 < n and _is_word(pattern[-1]) and _is_word(lowered[i + 1]))
+                ):
+                    continue
+                yield start, pattern
+
+    def matches(self, text: str) -> set[str]:
+        return {pattern for _, pattern in self.finditer(text)}
+
+    def search_any(self, text: str) -> bool:
+        return next(self.finditer(text), None) is not None
@@ -1,107 +1,208 @@
 from sqlalchemy.orm import Session
-from ..models import Mention
 from datetime import datetime
-import httpx
+import asyncio
+import os
+from ..metrics import instrumented, stage
+from .fetch import RateLimited, pool
+from .writer import MentionWriter
 
-UA = {"User-Agent": "social-listening/0.1"}
 BASE = "https://www.reddit.com"
 
+MORECHILDREN_BATCH = 100  # ids per /api/morechildren call, the API's maximum
+MORE_CONCURRENCY = 2  # in-flight expansion calls per thread
+# Expansion calls allowed per thread, so a huge thread has a bounded cost
+MAX_MORE_CALLS = int(os.getenv("REDDIT_MAX_MORE_CALLS", "20"))
 
-def _store_post(db: Session, post: dict) -> int:
+
+def _post_row(post: dict) -> dict:
     data = post.get("data", {})
-    url = BASE + data.get("permalink", "")
-    title = data.get("title")
-    author = data.get("author")
     created = data.get("created_utc")
-    published = datetime.utcfromtimestamp(created) if created else None
-    try:
-        m = Mention(
-            title=title,
-            summary=data.get("selftext"),
-            url=url,
-            source="reddit",
-            author=author,
-            published_at=published,
-            external_id=data.get("id"),
-            thread_external_id=data.get("id"),
-            parent_external_id=None,
-            reply_depth=0,
-        )
-        db.add(m)
-        db.commit()
-        db.refresh(m)
-        return 1
-    except Exception:
-        db.rollback()
-        return 0
+    return {
+        "title": data.get("title"),
+        "summary": data.get("selftext"),
+        "url": BASE + data.get("permalink", ""),
+        "source": "reddit",
+        "author": data.get("author"),
+        "published_at": datetime.utcfromtimestamp(created) if created else None,
+        "external_id": data.get("id"),
+        "thread_external_id": data.get("id"),
+        "parent_external_id": None,
+        "reply_depth": 0,
+    }
 
 
-def _store_comment(db: Session, c: dict, thread_id: str, depth: int) -> int:
+def _comment_row(c: dict, thread_id: str, depth: int) -> dict | None:
     data = c.get("data", {})
     body = data.get("body")
     if not body:
-        return 0
+        return None
     url = BASE + data.get("permalink", "") if data.get("permalink") else f"https://reddit.com/comments/{thread_id}"
-    author = data.get("author")
     created = data.get("created_utc")
-    published = datetime.utcfromtimestamp(created) if created else None
-    try:
-        m = Mention(
-            title=None,
-            summary=body,
-            url=url,
-            source="reddit",
-            author=author,
-            published_at=published,
-            external_id=data.get("id"),
-            thread_external_id=thread_id,
-            parent_external_id=data.get("parent_id"),
-            reply_depth=depth,
-        )
-        db.add(m)
-        db.commit()
-        db.refresh(m)
-        return 1
-    except Exception:
-        db.rollback()
-        return 0
+    return {
+        "title": None,
+        "summary": body,
+        "url": url,
+        "source": "reddit",
+        "author": data.get("author"),
+        "published_at": datetime.utcfromtimestamp(created) if created else None,
+        "external_id": data.get("id"),
+        "thread_external_id": thread_id,
+        "parent_external_id": data.get("parent_id"),
+        "reply_depth": depth,
+    }
+
+
+def _walk_comments(crawl: "_CommentCrawl", nodes: list, depth: int, upstream_depth: bool = True) -> None:
+    """Depth-first over listing nodes with an explicit stack (no recursion limit).
+
+    Comments become rows; ``more`` stubs are queued on ``crawl`` for expansion.
+    With ``upstream_depth`` False, depths count only from ``depth`` and the
+    nodes' own ``depth`` is ignored.
+    """
+    stack = [(node, depth) for node in reversed(nodes)]
+    while stack:
+        node, d = stack.pop()
+        kind = node.get("kind")
+        data = node.get("data") or {}
+        if kind == "more":
+            if not upstream_depth:
+                data = {**data, "depth": d - 1}  # relative like its siblings; see _continued_depth
+            crawl.more.append(data)
+            continue
+        if kind != "t1":
+            continue
+        if upstream_depth and isinstance(data.get("depth"), int):
+            d = data["depth"] + 1  # reddit's depth is 0 for top-level comments
+        if data.get("id") not in crawl.seen:
+            crawl.seen.add(data.get("id"))
+            row = _comment_row(node, crawl.thread_id, d)
+            if row:
+                crawl.rows.append(row)
+        replies = data.get("replies")
+        if isinstance(replies, dict):
+            children = replies.get("data", {}).get("children", [])
+            stack.extend((ch, d + 1) for ch in reversed(children))
+
+
+class _CommentCrawl:
+    def __init__(self, thread_id: str):
+        self.thread_id = thread_id
+        self.rows: list[dict] = []
+        self.seen: set[str] = set()
+        self.more: list[dict] = []
+        self.calls = 0
+        self.truncated = False
+
+
+async def _morechildren(thread_id: str, ids: list[str]) -> list[dict]:
+    r = await pool.get(BASE + "/api/morechildren.json", params={
+        "api_type": "json",
+        "link_id": f"t3_{thread_id}",
+        "children": ",".join(ids),
+        "limit_children": "false",
+        "raw_json": 1,
+    })
+    r.raise_for_status()
+    with stage("parse"):
+        return r.json().get("json", {}).get("data", {}).get("things", []) or []
 
 
-def _walk_comments(db: Session, node: dict, thread_id: str, depth: int) -> int:
-    added = 0
-    if node.get("kind") == "t1":
-        added += _store_comment(db, node, thread_id, depth)
-    data = node.get("data", {})
-    replies = data.get("replies")
-    if isinstance(replies, dict):
-        children = replies.get("data", {}).get("children", [])
-        for ch in children:
-            added += _walk_comments(db, ch, thread_id, depth + 1)
-    return added
+async def _continue_thread(thread_id: str, comment_id: str) -> list[dict]:
+    # "Continue this thread" stubs carry no ids; the subtree comes from the comment's permalink.
+    # Its depths count from the focused comment, not the post.
+    r = await pool.get(BASE + f"/comments/{thread_id}.json", params={"comment": comment_id, "limit": 500})
+    r.raise_for_status()
+    with stage("parse"):
+        tree = r.json()
+    if isinstance(tree, list) and len(tree) > 1:
+        return tree[1].get("data", {}).get("children", [])
+    return []
+
+
+def _continued_depth(crawl: _CommentCrawl, stub: dict) -> int | None:
+    """Stored depth of the comment a "continue this thread" stub hangs under."""
+    # The stub sits among that comment's replies: its 0-based depth is the comment's 1-based one
+    if isinstance(stub.get("depth"), int):
+        return stub["depth"]
+    parent = stub["parent_id"][3:]
+    return next((row["reply_depth"] for row in crawl.rows if row["external_id"] == parent), None)
+
+
+async def _expand_more(crawl: _CommentCrawl) -> None:
+    """Resolve ``more`` stubs in rounds until none are left or the call budget is spent.
+
+    Ids are sent MORECHILDREN_BATCH at a time and at most MORE_CONCURRENCY
+    calls per thread are in flight; new stubs found in a round feed the next.
+    """
+    sem = asyncio.Semaphore(MORE_CONCURRENCY)
+
+    async def call(fn, *args):
+        async with sem:
+            return await fn(*args)
+
+    while crawl.more:
+        ids, continues = [], []
+        for stub in crawl.more:
+            if stub.get("children"):
+                ids.extend(c for c in stub["children"] if c not in crawl.seen)
+            elif stub.get("parent_id", "").startswith("t1_"):
+                continues.append((stub["parent_id"][3:], _continued_depth(crawl, stub)))
+        crawl.more = []
+        # (call, argument, depth of the first returned level; None = trust the upstream depths)
+        jobs = [(_morechildren, ids[i:i + MORECHILDREN_BATCH], None) for i in range(0, len(ids), MORECHILDREN_BATCH)]
+        jobs += [(_continue_thread, c, d) for c, d in continues]
+        budget = MAX_MORE_CALLS - crawl.calls
+        if len(jobs) > budget:
+            crawl.truncated = True
+            jobs = jobs[:budget]
+        if not jobs:
+            break
+        crawl.calls += len(jobs)
+        expanded = await asyncio.gather(*(call(fn, crawl.thread_id, arg) for fn, arg, _ in jobs))
+        with stage("normalize"):
+            for (_, _, depth), nodes in zip(jobs, expanded):
+                if depth is None:
+                    _walk_comments(crawl, nodes, 1)
+                else:
+                    _walk_comments(crawl, nodes, depth, upstream_depth=False)
+
+
+async def _fetch_comment_rows(thread_id: str) -> _CommentCrawl:
+    crawl = _CommentCrawl(thread_id)
+    try:
+        cr = await pool.get(BASE + f"/comments/{thread_id}.json", params={"limit": 500})
+        cr.raise_for_status()
+        with stage("parse"):
+            tree = cr.json()
+        if isinstance(tree, list) and len(tree) > 1:
+            with stage("normalize"):
+                _walk_comments(crawl, tree[1].get("data", {}).get("children", []), 1)
+        await _expand_more(crawl)
+    except RateLimited:
+        raise
+    except Exception:
+        # Keep whatever was collected before the failure
+        pass
+    return crawl
 
 
-def ingest_reddit_search(db: Session, query: str, subreddit: str | None, limit: int = 25) -> int:
-    added = 0
+@instrumented("reddit")
+async def ingest_reddit_search(db: Session, query: str, subreddit: str | None, limit: int = 25) -> dict:
     params = {"q": query, "limit": str(limit), "sort": "new", "restrict_sr": "on" if subreddit else "off"}
     path = f"/r/{subreddit}/search.json" if subreddit else "/search.json"
-    with httpx.Client(timeout=15.0, headers=UA, follow_redirects=True) as client:
-        r = client.get(BASE + path, params=params)
-        r.raise_for_status()
+    r = await pool.get(BASE + path, params=params)
+    r.raise_for_status()
+    with stage("parse"):
         listing = r.json()
-        for child in listing.get("data", {}).get("children", []):
-            if child.get("kind") != "t3":
-                continue
-            added += _store_post(db, child)
-            thread_id = child.get("data", {}).get("id")
-            # Fetch full comment tree
-            try:
-                cr = client.get(BASE + f"/comments/{thread_id}.json", params={"limit": 500})
-                cr.raise_for_status()
-                tree = cr.json()
-                if isinstance(tree, list) and len(tree) > 1:
-                    comments_listing = tree[1]
-                    for c in comments_listing.get("data", {}).get("children", []):
-                        added += _walk_comments(db, c, thread_id, 1)
-            except Exception:
-                pass
-    return added
+    posts = [child for child in listing.get("data", {}).get("children", []) if child.get("kind") == "t3"]
+    with stage("normalize"):
+        rows = [_post_row(child) for child in posts]
+    # Fetch full comment trees concurrently (bounded by the per-host limit)
+    crawls = await asyncio.gather(*(_fetch_comment_rows(child.get("data", {}).get("id")) for child in posts))
+    for crawl in crawls:
+        rows.extend(crawl.rows)
+    # One batched write once every tree is complete
+    stats = await asyncio.to_thread(MentionWriter(db).write, rows)
+    stats["more_calls"] = sum(c.calls for c in crawls)
+    stats["truncated_threads"] = sum(c.truncated for c in crawls)
+    return stats
@@ -0,0 +1,142 @@
+import os
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from ..models import Mention, MentionRollup
+
+GRANULARITIES = ("minute", "hour", "day")
+# Range /stats/timeseries covers when the caller gives no start
+DEFAULT_WINDOW = {"minute": timedelta(hours=6), "hour": timedelta(days=7), "day": timedelta(days=365)}
+
+# Keywords that get their own rollup series next to the all-mentions one ('')
+ROLLUP_KEYWORDS = [k.strip().lower() for k in os.getenv("ROLLUP_KEYWORDS", "").split(",") if k.strip()]
+
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    if granularity == "minute":
+        return ts.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _keyword_re(keywords: list[str]):
+    if not keywords:
+        return None
+    alternation = "|".join(re.escape(k) for k in sorted(keywords, key=len, reverse=True))
+    return re.compile(rf"\b(?:{alternation})\b", re.IGNORECASE)
+
+
+_KEYWORD_RE = _keyword_re(ROLLUP_KEYWORDS)
+
+
+def _keywords_in(row: dict) -> set[str]:
+    if _KEYWORD_RE is None:
+        return set()
+    text = f"{row.get('title') or ''} {row.get('summary') or ''}"
+    return {m.group(0).lower() for m in _KEYWORD_RE.finditer(text)}
+
+
+def _upsert(db: Session):
+    dialect = db.get_bind().dialect.name
+    insert = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}.get(dialect)
+    if insert is None:
+        return None
+    stmt = insert(MentionRollup)
+    return stmt.on_conflict_do_update(
+        index_elements=["granularity", "keyword", "source", "bucket_start"],
+        set_={
+            "count": MentionRollup.count + stmt.excluded.count,
+            "sentiment_sum": MentionRollup.sentiment_sum + stmt.excluded.sentiment_sum,
+            "sentiment_count": MentionRollup.sentiment_count + stmt.excluded.sentiment_count,
+        },
+    )
+
+
+def _bucket_keys(row: dict):
+    ts = row.get("published_at") or row.get("fetched_at")
+    if ts is None:
+        return
+    for keyword in ("", *_keywords_in(row)):
+        for granularity in GRANULARITIES:
+            yield granularity, keyword, row["source"], bucket_start(ts, granularity)
+
+
+def _add(db: Session, agg: dict[tuple, list]) -> None:
+    if not agg:
+        return
+    stmt = _upsert(db)
+    if stmt is None:
+        return
+    db.execute(stmt, [
+        {
+            "granularity": g,
+            "keyword": k,
+            "source": s,
+            "bucket_start": b,
+            "count": a[0],
+            "sentiment_sum": a[1],
+            "sentiment_count": a[2],
+        }
+        for (g, k, s, b), a in agg.items()
+    ])
+
+
+def update_rollups(db: Session, rows: list[dict]) -> None:
+    """Fold newly inserted mention rows into the bucket tables.
+
+    Rows are aggregated in memory first, so a batch costs one upsert statement
+    however many mentions land in the same buckets. Runs inside the caller's
+    transaction; the caller commits.
+    """
+    agg: dict[tuple, list] = defaultdict(lambda: [0, 0.0, 0])
+    for row in rows:
+        sentiment = row.get("sentiment")
+        for key in _bucket_keys(row):
+            a = agg[key]
+            a[0] += 1
+            if sentiment is not None:
+                a[1] += sentiment
+                a[2] += 1
+    _add(db, agg)
+
+
+def rescore_rollups(db: Session, rows: list[dict], old_sentiments: list[float | None]) -> None:
+    """Move rescored mentions' sentiment within their buckets; counts stay as they are.
+
+    ``rows`` carry the new ``sentiment``; ``old_sentiments`` is what was
+    stored before, in the same order. Runs inside the caller's transaction.
+    """
+    agg: dict[tuple, list] = defaultdict(lambda: [0, 0.0, 0])
+    for row, old in zip(rows, old_sentiments):
+        new = row.get("sentiment")
+        if new == old:
+            continue
+        for key in _bucket_keys(row):
+            a = agg[key]
+            a[1] += (new or 0.0) - (old or 0.0)
+            a[2] += (new is not None) - (old is not None)
+    _add(db, agg)
+
+
+def rebuild_rollups(db: Session, chunk: int = 10000, progress=None) -> int:
+    """Recompute every bucket from the raw mentions table."""
+    db.query(MentionRollup).delete()
+    cols = (Mention.id, Mention.title, Mention.summary, Mention.source, Mention.published_at, Mention.fetched_at, Mention.sentiment)
+    done = 0
+    last_id = 0
+    while True:
+        rows = db.query(*cols).filter(Mention.id > last_id).order_by(Mention.id).limit(chunk).all()
+        if not rows:
+            break
+        update_rollups(db, [dict(r._mapping) for r in rows])
+        done += len(rows)
+        last_id = rows[-1].id
+        if progress is not None:
+            progress(done)
+    db.commit()
+    return done
@@ -1,72 +1,240 @@
-import feedparser
 from sqlalchemy.orm import Session
-from datetime import datetime
-from ..models import Mention
-from hashlib import md5
-import httpx
-
-
-def _heuristic_sentiment(text: str) -> float:
-    if not text:
-        return 0.0
-    text_l = text.lower()
-    score = 0
-    for w in ["good", "great", "excellent", "love", "positive", "up"]:
-        if w in text_l:
-            score += 1
-    for w in ["bad", "terrible", "hate", "negative", "down"]:
-        if w in text_l:
-            score -= 1
-    return max(min(score / 3.0, 1.0), -1.0)
-
-
-def ingest_rss(db: Session, feed_url: str, source_name: str = "rss") -> int:
-    feed_url = str(feed_url)
-    feed = None
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from xml.etree import ElementTree
+import asyncio
+import json
+import multiprocessing
+import os
+from ..metrics import INGEST_FAILED, instrumented, record_writes, stage
+from ..models import Source
+from .feedparse import parse_feed
+from .fetch import RateLimited, pool
+from .writer import MentionWriter
+
+FEED_HEADERS = {
+    "User-Agent": "social-listening/0.1 (+https://localhost)",
+    "Accept": "application/rss+xml, application/atom+xml, application/xml;q=0.9, */*;q=0.8",
+}
+
+# Entry ids remembered per feed; feeds rarely carry more than a few hundred items
+MAX_SEEN_IDS = 1000
+
+# Processes parsing feeds (feedparser, HTML stripping, normalization); 0 parses in a thread instead
+RSS_PARSE_WORKERS = int(os.getenv("RSS_PARSE_WORKERS", str(os.cpu_count() or 1)))
+# Feed downloads in flight per run; hosts are still paced by the fetch pool
+RSS_MAX_CONCURRENT_FETCHES = int(os.getenv("RSS_MAX_CONCURRENT_FETCHES", "64"))
+
+_URL_CHUNK = 500  # bound on IN (...) parameters per query
+
+_parse_pool: ProcessPoolExecutor | None = None
+
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    global _parse_pool
+    if _parse_pool is None:
+        # spawn: a forked child would inherit the engine's open connections and the loop's threads
+        _parse_pool = ProcessPoolExecutor(RSS_PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _parse_pool
+
+
+def shutdown_parse_pool() -> None:
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown(cancel_futures=True)
+        _parse_pool = None
+
+
+async def _parse(content: bytes, state: dict, source_name: str) -> dict:
+    args = (content, state["seen"], state["high_water_at"], source_name)
+    if RSS_PARSE_WORKERS <= 0:
+        return await asyncio.to_thread(parse_feed, *args)
     try:
-        headers = {
-            "User-Agent": "social-listening/0.1 (+https://localhost)",
-            "Accept": "application/rss+xml, application/atom+xml, application/xml;q=0.9, */*;q=0.8",
+        return await asyncio.get_running_loop().run_in_executor(_get_parse_pool(), parse_feed, *args)
+    except BrokenProcessPool:
+        # A worker died (OOM, killed); start a fresh pool for the next feed
+        shutdown_parse_pool()
+        raise
+
+
+def _feed_sources(db: Session, feed_urls: list[str], titles: dict | None = None) -> tuple[dict[str, Source], int]:
+    """The rss Source of every url, oldest first when there are several; missing ones are added (not committed)."""
+    found: dict[str, Source] = {}
+    for i in range(0, len(feed_urls), _URL_CHUNK):
+        chunk = feed_urls[i:i + _URL_CHUNK]
+        for src in db.query(Source).filter(Source.type == "rss", Source.url.in_(chunk)).order_by(Source.id.desc()):
+            found[src.url] = src
+    created = 0
+    for url in feed_urls:
+        if url not in found:
+            name = (titles or {}).get(url) or url
+            found[url] = Source(name=name[:100], type="rss", url=url)
+            db.add(found[url])
+            created += 1
+    return found, created
+
+
+def _load_states(db: Session, feed_urls: list[str]) -> list[dict]:
+    sources, created = _feed_sources(db, feed_urls)
+    if created:
+        db.flush()  # assigns ids to the new sources
+    states = [
+        {
+            "source_id": src.id,
+            "etag": src.etag,
+            "last_modified": src.last_modified,
+            "high_water_at": src.high_water_at,
+            "seen": set(json.loads(src.seen_entry_ids)) if src.seen_entry_ids else set(),
         }
-        with httpx.Client(timeout=10.0, follow_redirects=True, headers=headers) as client:
-            resp = client.get(feed_url)
-            resp.raise_for_status()
-            feed = feedparser.parse(resp.content)
+        for src in (sources[url] for url in feed_urls)
+    ]
+    # Also ends the read transaction, so the write connection isn't held across the fetches
+    db.commit()
+    return states
+
+
+def register_feeds(db: Session, feeds: list[tuple[str, str | None]]) -> tuple[list[str], int]:
+    """Make sure every ``(url, title)`` feed has an rss Source; returns the urls and how many were new."""
+    titles = {}
+    for url, title in feeds:
+        titles.setdefault(url, title)
+    urls = list(titles)
+    _, created = _feed_sources(db, urls, titles)
+    db.commit()
+    return urls, created
+
+
+def parse_opml(data: bytes) -> list[tuple[str, str | None]]:
+    """``(xmlUrl, title)`` of every feed outline in an OPML document, nested ones included.
+
+    Raises ValueError when the document isn't XML.
+    """
+    try:
+        root = ElementTree.fromstring(data)
+    except ElementTree.ParseError as exc:
+        raise ValueError(f"invalid OPML: {exc}")
+    feeds = {}
+    for outline in root.iter("outline"):
+        url = (outline.get("xmlUrl") or outline.get("xmlurl") or "").strip()
+        if url.startswith(("http://", "https://")) and url not in feeds:
+            feeds[url] = outline.get("title") or outline.get("text")
+    return list(feeds.items())
+
+
+def _save_state(db: Session, state: dict) -> None:
+    # Part of the caller's transaction: it commits along with the rows it covers
+    db.query(Source).filter(Source.id == state["source_id"]).update({
+        "etag": state["etag"],
+        "last_modified": state["last_modified"],
+        "high_water_at": state["high_water_at"],
+        "seen_entry_ids": json.dumps(state["seen"][:MAX_SEEN_IDS]),
+    })
+
+
+async def _fetch_feed(feed_url: str, state: dict) -> bytes | None:
+    """Conditionally fetch a feed; returns None when it hasn't changed."""
+    headers = dict(FEED_HEADERS)
+    if state.get("etag"):
+        headers["If-None-Match"] = state["etag"]
+    if state.get("last_modified"):
+        headers["If-Modified-Since"] = state["last_modified"]
+    resp = await pool.get(feed_url, headers=headers, timeout=10.0)
+    if resp.status_code == 304:
+        return None
+    resp.raise_for_status()
+    state["etag"] = resp.headers.get("ETag") or state.get("etag")
+    state["last_modified"] = resp.headers.get("Last-Modified") or state.get("last_modified")
+    return resp.content
+
+
+def _store_feed(writer: MentionWriter, state: dict, parsed: dict) -> tuple[int, int]:
+    """Write one feed's rows and advance its fetch state in the same commit; returns (added, skipped)."""
+    db = writer.db
+    added, skipped = writer.added, writer.skipped
+    try:
+        writer.extend(parsed["rows"])
+        state["seen"] = parsed["seen"]
+        state["high_water_at"] = parsed["high_water_at"]
+        _save_state(db, state)
+        if not writer.flush():
+            db.commit()  # nothing new to insert, only the state
     except Exception:
-        # Fallback to feedparser fetching by URL
-        feed = feedparser.parse(feed_url)
-    added = 0
-    for entry in getattr(feed, "entries", []) or []:
-        url = getattr(entry, "link", None) or getattr(entry, "id", None)
-        if not url:
-            # fallback unique-ish URL
-            key = (getattr(entry, "title", "") + str(getattr(entry, "published", ""))).encode("utf-8")
-            url = f"urn:rss:{md5(key).hexdigest()}"
-        title = getattr(entry, "title", None)
-        summary = getattr(entry, "summary", None) or getattr(entry, "description", None)
-        author = getattr(entry, "author", None)
-        published = None
-        if getattr(entry, "published_parsed", None):
-            try:
-                published = datetime(*entry.published_parsed[:6])
-            except Exception:
-                published = None
-        mention = Mention(
-            title=title,
-            summary=summary,
-            url=url,
-            source=source_name,
-            author=author,
-            published_at=published,
-            sentiment=_heuristic_sentiment(f"{title or ''} {summary or ''}")
-        )
-        try:
-            db.add(mention)
-            db.commit()
-            db.refresh(mention)
-            added += 1
-        except Exception:
-            db.rollback()
-            # likely a unique conflict on URL
-            continue
-    return added
+        db.rollback()
+        raise
+    if parsed["skipped"]:
+        record_writes(writer.connector, parsed["skipped"], 0, parsed["skipped"])
+    return writer.added - added, writer.skipped - skipped + parsed["skipped"]
+
+
+async def _pull_feed(url: str, state: dict, source_name: str, writer: MentionWriter, fetches: asyncio.Semaphore, write_lock: asyncio.Lock) -> dict:
+    result = {"url": url, "status": "ok", "entries": 0, "added": 0, "skipped": 0, "error": None}
+    try:
+        async with fetches:
+            content = await _fetch_feed(url, state)
+        if content is None:
+            result["status"] = "not_modified"
+            return result
+        with stage("parse"):
+            parsed = await _parse(content, state, source_name)
+        if parsed.get("error"):
+            raise ValueError(parsed["error"])
+        result["entries"] = len(parsed["seen"])
+        # One writer and one write connection; feeds are stored as they finish parsing
+        async with write_lock:
+            result["added"], result["skipped"] = await asyncio.to_thread(_store_feed, writer, state, parsed)
+    except RateLimited as exc:
+        # Throttled feeds keep their old state and are picked up next run
+        result.update(status="rate_limited", error=str(exc), exception=exc)
+    except Exception as exc:
+        INGEST_FAILED.labels(writer.connector, "feed").inc()
+        result.update(status="error", error=f"{type(exc).__name__}: {exc}", exception=exc)
+    return result
+
+
+@instrumented("rss")
+async def ingest_rss_feeds(db: Session, feed_urls: list[str], source_name: str = "rss") -> dict:
+    """Pull several feeds concurrently, parse them in worker processes and store each as it's ready.
+
+    Reports every feed under ``feeds``. A feed that fails doesn't stop the
+    others; the run only raises when no feed could be read at all.
+    """
+    feed_urls = list(dict.fromkeys(str(url) for url in feed_urls))
+    states = await asyncio.to_thread(_load_states, db, feed_urls)
+    writer = MentionWriter(db)
+    fetches = asyncio.Semaphore(max(RSS_MAX_CONCURRENT_FETCHES, 1))
+    write_lock = asyncio.Lock()
+    results = await asyncio.gather(
+        *(_pull_feed(url, state, source_name, writer, fetches, write_lock) for url, state in zip(feed_urls, states))
+    )
+    errors = [r.pop("exception") for r in results if "exception" in r]
+    if results and len(errors) == len(results):
+        # Nothing got through: fail the run so the job is retried, after the throttle if that's all it was
+        failed = [exc for exc in errors if not isinstance(exc, RateLimited)]
+        raise (failed or errors)[0]
+    statuses = [r["status"] for r in results]
+    return {
+        "added": sum(r["added"] for r in results),
+        "skipped": sum(r["skipped"] for r in results),
+        "not_modified": statuses.count("not_modified"),
+        "rate_limited": statuses.count("rate_limited"),
+        "failed": statuses.count("error"),
+        "feeds": results,
+    }
+
+
+async def ingest_rss(db: Session, feed_url: str, source_name: str = "rss") -> dict:
+    return await ingest_rss_feeds(db, [feed_url], source_name)
+
+
+def _enabled_feed_urls(db: Session) -> list[str]:
+    rows = db.query(Source.url).filter(Source.type == "rss", Source.enabled.is_(True), Source.url.isnot(None)).order_by(Source.id)
+    urls = list(dict.fromkeys(url for (url,) in rows))
+    db.commit()
+    return urls
+
+
+async def ingest_rss_sweep(db: Session, feed_urls: list[str] | None = None) -> dict:
+    """Ingest ``feed_urls``, or every enabled rss Source when None."""
+    if feed_urls is None:
+        feed_urls = await asyncio.to_thread(_enabled_feed_urls, db)
+    return await ingest_rss_feeds(db, feed_urls)
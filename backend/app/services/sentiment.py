@@ -0,0 +1,125 @@
+import importlib
+import math
+import os
+import re
+from typing import Protocol
+
+POSITIVE = (
+    "good", "great", "excellent", "love", "loved", "loves", "positive", "awesome", "amazing",
+    "best", "better", "happy", "glad", "nice", "wonderful", "fantastic", "brilliant",
+    "liked", "enjoy", "enjoyed", "impressive", "helpful", "recommend", "beautiful", "win",
+    "winning", "success", "successful", "support", "thanks", "thank", "perfect", "fun",
+    "cool", "solid", "fast", "reliable", "easy", "improved", "favorite", "up",
+)
+NEGATIVE = (
+    "bad", "terrible", "awful", "hate", "hated", "hates", "negative", "worst", "worse", "poor",
+    "sad", "angry", "horrible", "disappointing", "disappointed", "broken", "bug", "buggy",
+    "fail", "failed", "failure", "slow", "scam", "useless", "annoying", "ugly", "wrong",
+    "problem", "problems", "issue", "issues", "crash", "crashes", "expensive", "toxic",
+    "shame", "shaming", "abuse", "down", "lost", "lose", "difficult", "sucks",
+)
+NEGATIONS = (
+    "not", "no", "never", "none", "nobody", "nothing", "neither", "nor", "without", "hardly",
+    "isn't", "aren't", "wasn't", "weren't", "don't", "doesn't", "didn't", "can't", "cannot",
+    "won't", "wouldn't", "shouldn't", "couldn't", "ain't",
+)
+
+# Larger values flatten the curve; 15 is what VADER uses for its compound score
+NORMALIZATION_ALPHA = 15.0
+
+_TAG_RE = re.compile(r"<[^>]+>")
+
+_NEGATE = 0
+
+# Compiled lexicon: token -> +1 / -1, or _NEGATE for negators
+LEXICON: dict[str, int] = {
+    **{w: 1 for w in POSITIVE},
+    **{w: -1 for w in NEGATIVE},
+    **{w: _NEGATE for w in NEGATIONS},
+}
+
+# One pass splits text into word tokens and clause breaks
+_TOKEN_RE = re.compile(r"[\w']+|[.!?;:,\n]")
+_CLAUSE_BREAKS = frozenset(".!?;:,\n")
+
+
+class SentimentBackend(Protocol):
+    name: str
+
+    def score_batch(self, texts: list[str]) -> list[float | None]:
+        ...
+
+
+class LexiconSentiment:
+    """Token-level lexicon scorer with clause-scoped negation.
+
+    A negator flips the polarity of the sentiment words that follow it until the
+    next clause break. The raw sum is squashed into [-1, 1].
+    """
+
+    name = "lexicon"
+
+    def score(self, text: str | None) -> float:
+        if not text:
+            return 0.0
+        total = 0
+        negated = False
+        lexicon = LEXICON
+        for tok in _TOKEN_RE.findall(_TAG_RE.sub(" ", text).lower().replace("\u2019", "'")):
+            polarity = lexicon.get(tok)
+            if polarity is None:
+                if tok in _CLAUSE_BREAKS:
+                    negated = False
+            elif polarity == _NEGATE:
+                negated = True
+            else:
+                total += -polarity if negated else polarity
+        if total == 0:
+            return 0.0
+        return total / math.sqrt(total * total + NORMALIZATION_ALPHA)
+
+    def score_batch(self, texts: list[str]) -> list[float | None]:
+        return [self.score(t) for t in texts]
+
+
+class NullSentiment:
+    name = "none"
+
+    def score_batch(self, texts: list[str]) -> list[float | None]:
+        return [None] * len(texts)
+
+
+def load_backend(spec: str) -> SentimentBackend:
+    """``lexicon``, ``none``, or ``package.module:ClassName`` for a custom backend."""
+    if spec == "lexicon":
+        return LexiconSentiment()
+    if spec == "none":
+        return NullSentiment()
+    module, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module), attr)()
+
+
+_backend: SentimentBackend = load_backend(os.getenv("SENTIMENT_BACKEND", "lexicon"))
+
+
+def get_backend() -> SentimentBackend:
+    return _backend
+
+
+def set_backend(backend: SentimentBackend) -> None:
+    global _backend
+    _backend = backend
+
+
+def mention_text(title: str | None, summary: str | None) -> str:
+    return f"{title or ''} {summary or ''}"
+
+
+def score_rows(rows: list[dict]) -> None:
+    """Fill in ``sentiment`` for rows that don't carry one, in a single batch call."""
+    todo = [r for r in rows if r.get("sentiment") is None]
+    if not todo:
+        return
+    scores = _backend.score_batch([mention_text(r.get("title"), r.get("summary")) for r in todo])
+    for row, score in zip(todo, scores):
+        row["sentiment"] = score
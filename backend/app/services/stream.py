@@ -0,0 +1,133 @@
+import asyncio
+import os
+import threading
+import uuid
+from datetime import datetime, timezone
+from ..search import TextMatch
+from ..serialize import MENTION_FIELDS, dumps
+
+# Newest mentions kept for live subscribers and Last-Event-ID replay
+STREAM_BUFFER_SIZE = int(os.getenv("STREAM_BUFFER_SIZE", "10000"))
+
+# Same fields as MentionOut, minus the search-only snippet
+FIELDS = MENTION_FIELDS[:-1]
+
+
+def _stored(value):
+    # As the row reads back from the database: datetimes are stored as naive UTC,
+    # so a connector's tz-aware value would otherwise serialize differently from /mentions
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class StreamEvent:
+    __slots__ = ("seq", "source", "data", "_text", "_tokens", "_token_set")
+
+    def __init__(self, seq: int, row: dict):
+        self.seq = seq
+        self.source = row.get("source")
+        # Serialized once, shared by every subscriber, with the same encoder as /mentions
+        self.data = dumps({f: _stored(row.get(f)) for f in FIELDS}).decode()
+        self._text = f"{row.get('title') or ''} {row.get('summary') or ''}"
+        self._tokens = None
+        self._token_set = None
+
+    def matches(self, match: TextMatch) -> bool:
+        if self._tokens is None:
+            # Tokenized on first use by a subscriber with a query, then shared
+            self._tokens = TextMatch.tokens(self._text)
+            self._token_set = frozenset(self._tokens)
+        return match(self._tokens, self._token_set)
+
+
+class MentionStream:
+    """Bounded ring buffer of newly stored mentions, fanned out to SSE clients.
+
+    The writer publishes each committed batch from whatever thread it runs
+    on; every event gets the next sequence number. Subscribers keep nothing
+    but their own cursor (the next sequence they want) and read straight out
+    of the shared buffer, so a thousand clients cost a thousand integers, not
+    a thousand queues. A cursor that falls further behind than the buffer
+    holds has missed events; the caller is told so and can resync.
+
+    Event ids are ``<epoch>-<seq>``; the epoch changes on every process
+    start, so a Last-Event-ID from before a restart is recognized as stale.
+    """
+
+    def __init__(self, size: int = STREAM_BUFFER_SIZE):
+        self.size = size
+        self.epoch = uuid.uuid4().hex[:8]
+        self.head = 0  # sequence number of the next event
+        self._buf: list[StreamEvent | None] = [None] * size
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._waiters: set[asyncio.Future] = set()
+        self.subscribers = 0
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.epoch}-{seq}"
+
+    def resume_cursor(self, last_event_id: str | None) -> tuple[int, bool]:
+        """(cursor, stale) for a client reconnecting with ``last_event_id``."""
+        if last_event_id:
+            epoch, _, seq = last_event_id.partition("-")
+            if epoch == self.epoch and seq.isdigit() and int(seq) < self.head:
+                return int(seq) + 1, False
+            return self.head, True
+        return self.head, False
+
+    def publish(self, rows: list[dict]) -> None:
+        if not rows:
+            return
+        with self._lock:
+            for row in rows:
+                self._buf[self.head % self.size] = StreamEvent(self.head, row)
+                self.head += 1
+        # Unconditionally: a waiter may be registering on the loop right now
+        loop = self._loop
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(self._notify)
+            except RuntimeError:
+                pass  # loop closed during shutdown
+
+    def _notify(self) -> None:
+        waiters, self._waiters = self._waiters, set()
+        for fut in waiters:
+            if not fut.done():
+                fut.set_result(None)
+
+    def read(self, cursor: int, limit: int = 500) -> tuple[list[StreamEvent], int, bool]:
+        """Events from ``cursor`` on, the cursor after them, and whether some were lost."""
+        with self._lock:
+            oldest = max(0, self.head - self.size)
+            missed = cursor < oldest
+            start = max(cursor, oldest)
+            end = min(self.head, start + limit)
+            return [self._buf[s % self.size] for s in range(start, end)], end, missed
+
+    async def wait(self, cursor: int, timeout: float) -> None:
+        """Return once an event at or past ``cursor`` exists, or after ``timeout``."""
+        self._loop = asyncio.get_running_loop()
+        if cursor < self.head:
+            return
+        fut = self._loop.create_future()
+        self._waiters.add(fut)
+        try:
+            await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._waiters.discard(fut)
+
+    def stats(self) -> dict:
+        return {
+            "published": self.head,
+            "buffered": min(self.head, self.size),
+            "size": self.size,
+            "subscribers": self.subscribers,
+        }
+
+
+stream = MentionStream()
@@ -0,0 +1,14 @@
+import re
+from html import unescape
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def strip_html(html: str | None) -> str:
+    if not html:
+        return ""
+    # Remove tags and unescape entities
+    text = _TAG_RE.sub(" ", html)
+    text = unescape(text)
+    return _SPACE_RE.sub(" ", text).strip()
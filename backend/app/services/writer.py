@@ -0,0 +1,176 @@
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Callable
+from ..cache import generations
+from ..metrics import current_connector, record_writes, stage
+from ..models import Mention
+from .alerts import record_matches
+from .clusters import assign_clusters
+from .dedup import index as dedup_index, row_keys
+from .rollups import update_rollups
+from .sentiment import score_rows
+from .stream import stream
+
+BATCH_SIZE = 500
+
+# Called with running added/skipped totals after every flush; background jobs
+# set it to record progress. asyncio.to_thread copies the context, so it
+# follows writes that connectors push onto worker threads.
+ingest_progress: ContextVar[Callable[[dict], None] | None] = ContextVar("ingest_progress", default=None)
+
+# Called with (db, inserted_rows) inside the insert transaction, before commit;
+# inserted rows carry their new "id". Derived tables stay consistent with mentions.
+AFTER_INSERT: list[Callable[[Session, list[dict]], None]] = [update_rollups, record_matches, assign_clusters]
+
+# Called with the inserted rows once they are committed, for live consumers
+AFTER_COMMIT: list[Callable[[list[dict]], None]] = [stream.publish]
+
+# Every row is padded to the same key set so a batch compiles to one multi-VALUES INSERT
+COLUMNS = (
+    "title",
+    "summary",
+    "url",
+    "source",
+    "author",
+    "published_at",
+    "fetched_at",
+    "sentiment",
+    "external_id",
+    "parent_external_id",
+    "thread_external_id",
+    "reply_depth",
+)
+
+
+def _insert_ignoring_duplicates(db: Session):
+    # Core table rather than the ORM entity: skips the ORM bulk-insert bookkeeping
+    table = Mention.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        return sqlite.insert(table).on_conflict_do_nothing(index_elements=["url"])
+    if dialect == "postgresql":
+        return postgresql.insert(table).on_conflict_do_nothing(constraint="uq_mentions_url")
+    return insert(table).prefix_with("OR IGNORE")
+
+
+class MentionWriter:
+    """Collects normalized mention rows and writes them in batches.
+
+    Each flush is one batched ``INSERT ... ON CONFLICT(url) DO NOTHING`` plus one
+    commit; ``RETURNING`` tells us exactly which rows were new, so ``added`` and
+    ``skipped`` stay accurate without relying on per-row IntegrityErrors.
+    """
+
+    def __init__(self, db: Session, batch_size: int = BATCH_SIZE, dedup: bool = True, publish: bool = True, connector: str | None = None):
+        self.db = db
+        self.connector = connector or current_connector.get()  # metrics label
+        self.batch_size = batch_size
+        self.dedup = dedup  # False leaves every duplicate to ON CONFLICT and the index untouched
+        self.publish = publish  # False keeps the batches out of AFTER_COMMIT (the live stream)
+        self.added = 0
+        self.skipped = 0
+        self._pending: list[dict] = []
+        self._keys: list[bytes] = []  # dedup keys of pending rows, hashed once
+        self._recorded = (0, 0)  # added/skipped already counted in metrics
+
+    def add(self, row: dict | None) -> None:
+        if not row or not row.get("url"):
+            return
+        if self.dedup:
+            keys = row_keys(row)
+            if dedup_index.seen_keys(keys):
+                # Known for certain; don't spend an INSERT on it
+                self.skipped += 1
+                return
+            self._keys.extend(keys)
+        self._pending.append(row)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def extend(self, rows) -> None:
+        for row in rows:
+            self.add(row)
+
+    def _record(self) -> None:
+        added, skipped = self.added - self._recorded[0], self.skipped - self._recorded[1]
+        if added or skipped:
+            record_writes(self.connector, added + skipped, added, skipped)
+            self._recorded = (self.added, self.skipped)
+
+    def flush(self) -> list[dict]:
+        if not self._pending:
+            self._record()  # rows the dedup index dropped
+            return []
+        with stage("write", self.connector):
+            return self._flush()
+
+    def _flush(self) -> list[dict]:
+        batch, self._pending = self._pending, []
+        keys, self._keys = self._keys, []
+        # Sentiment is scored here, once per batch, for every connector
+        score_rows(batch)
+        now = datetime.utcnow()
+        values = []
+        for row in batch:
+            v = {c: row.get(c) for c in COLUMNS}
+            if v["fetched_at"] is None:
+                v["fetched_at"] = now
+            values.append(v)
+        # executemany: SQLAlchemy's insertmanyvalues batches the rows into
+        # multi-row INSERTs from one cached compilation, within the parameter limit
+        stmt = _insert_ignoring_duplicates(self.db).returning(Mention.id, Mention.url)
+        try:
+            ids = {url: id_ for id_, url in self.db.execute(stmt, values)}
+            inserted = []
+            for v in values:
+                id_ = ids.pop(v["url"], None)
+                if id_ is not None:
+                    inserted.append({"id": id_, **v})
+            for hook in AFTER_INSERT:
+                hook(self.db, inserted)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        # Inserted or conflicting, every row in the batch is now stored
+        if keys:
+            dedup_index.remember_keys(keys)
+        if inserted:
+            # Cached /mentions responses over these sources are now out of date
+            generations.bump({row["source"] for row in inserted})
+        if self.publish and inserted:
+            for hook in AFTER_COMMIT:
+                hook(inserted)
+        self.added += len(inserted)
+        self.skipped += len(values) - len(inserted)
+        self._record()
+        report = ingest_progress.get()
+        if report is not None:
+            report(self.stats())
+        return inserted
+
+    def write(self, rows) -> dict:
+        # extend + flush in one call, so async connectors can hand it to asyncio.to_thread
+        self.extend(rows)
+        self.flush()
+        return self.stats()
+
+    def stats(self) -> dict:
+        return {"added": self.added, "skipped": self.skipped}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        else:
+            # Keep what was collected before the failure, like the old commit-as-you-go loops
+            try:
+                self.flush()
+            except Exception:
+                pass
+        return False
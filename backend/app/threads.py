@@ -0,0 +1,123 @@
+from sqlalchemy import and_, case, func, literal, or_, select
+from sqlalchemy.orm import Session
+from .models import Mention
+
+m = Mention.__table__
+
+# Reddit stores parents as fullnames ("t1_abc" comment, "t3_abc" post) but
+# external ids bare; other platforms use the bare id for both.
+_PARENT_PREFIXES = ("t1_", "t3_")
+
+
+def _is_child(child, parent):
+    # Looking down: ``child`` columns stay bare, so ix_mentions_parent finds the replies
+    return and_(
+        child.c.source == parent.c.source,
+        child.c.parent_external_id.in_(
+            [parent.c.external_id] + [literal(p) + parent.c.external_id for p in _PARENT_PREFIXES]
+        ),
+    )
+
+
+def _is_parent(parent, child):
+    # Looking up: the prefix is stripped on the child's side, so ix_mentions_source_external finds the parent
+    ref = child.c.parent_external_id
+    bare = case((func.substr(ref, 1, 3).in_(_PARENT_PREFIXES), func.substr(ref, 4)), else_=ref)
+    return and_(parent.c.source == child.c.source, parent.c.external_id == bare)
+
+
+def _strip_prefix(ext_id: str | None) -> str | None:
+    if ext_id and ext_id[:3] in _PARENT_PREFIXES:
+        return ext_id[3:]
+    return ext_id
+
+
+def thread_rows(db: Session, thread_ids: list[str], source: str | None = None) -> list:
+    """Every stored mention in a thread, in one recursive query.
+
+    Seeds with the root and rows already labelled with the thread id (an
+    indexed range scan), then follows parent -> child links so replies stored
+    under another thread label are still found.
+    """
+    by_thread, by_id = m.c.thread_external_id.in_(thread_ids), m.c.external_id.in_(thread_ids)
+    if source:
+        # Inside each branch, so both are (source, ...) index lookups rather than a scan of the source
+        by_thread, by_id = and_(m.c.source == source, by_thread), and_(m.c.source == source, by_id)
+    seed = select(m).where(or_(by_thread, by_id))
+    tree = seed.cte("tree", recursive=True)
+    child = m.alias("child")
+    tree = tree.union(select(child).join(tree, _is_child(child, tree)))
+    return db.execute(select(tree)).all()
+
+
+def root_of(db: Session, mention: Mention) -> str | None:
+    """External id of the topmost stored ancestor of ``mention``."""
+    if not mention.external_id:
+        return None
+    up = (
+        select(m.c.source, m.c.external_id, m.c.parent_external_id, literal(0).label("hops"))
+        .where(m.c.id == mention.id)
+        .cte("up", recursive=True)
+    )
+    parent = m.alias("parent")
+    up = up.union_all(
+        select(parent.c.source, parent.c.external_id, parent.c.parent_external_id, (up.c.hops + 1).label("hops"))
+        .join(up, _is_parent(parent, up))
+        .where(up.c.hops < 1000)
+    )
+    top = db.execute(select(up.c.external_id).order_by(up.c.hops.desc()).limit(1)).scalar()
+    return top or mention.external_id
+
+
+def build_thread(thread_id: str, rows: list) -> dict:
+    """Order rows depth-first and compute thread aggregates."""
+    by_ext: dict[str, list] = {}
+    for r in rows:
+        if r.external_id:
+            by_ext.setdefault(r.external_id, []).append(r)
+    children: dict[int, list] = {}
+    roots = []
+    parent_of: dict[int, int] = {}
+    for r in rows:
+        parents = by_ext.get(_strip_prefix(r.parent_external_id) or "", [])
+        parent = next((p for p in parents if p.source == r.source and p.id != r.id), None)
+        if parent is None:
+            roots.append(r)
+        else:
+            parent_of[r.id] = parent.id
+            children.setdefault(parent.id, []).append(r)
+
+    def sort_key(r):
+        return (r.published_at is None, r.published_at or r.fetched_at, r.id)
+
+    ordered = []
+    visited = set()
+    stack = [(r, 0) for r in sorted(roots, key=sort_key, reverse=True)]
+    while stack:
+        r, depth = stack.pop()
+        if r.id in visited:
+            continue
+        visited.add(r.id)
+        out = dict(r._mapping)
+        out["parent_id"] = parent_of.get(r.id)
+        out["depth"] = depth
+        ordered.append(out)
+        for ch in sorted(children.get(r.id, []), key=sort_key, reverse=True):
+            stack.append((ch, depth + 1))
+
+    authors = sorted({r.author for r in rows if r.author})
+    sentiments = [r.sentiment for r in rows if r.sentiment is not None]
+    times = [r.published_at for r in rows if r.published_at is not None]
+    return {
+        "thread_id": thread_id,
+        "sources": sorted({r.source for r in rows}),
+        "mention_count": len(ordered),
+        "reply_count": sum(1 for o in ordered if o["depth"] > 0),
+        "max_depth": max((o["depth"] for o in ordered), default=0),
+        "participant_count": len(authors),
+        "participants": authors,
+        "mean_sentiment": sum(sentiments) / len(sentiments) if sentiments else None,
+        "first_at": min(times) if times else None,
+        "last_at": max(times) if times else None,
+        "mentions": ordered,
+    }
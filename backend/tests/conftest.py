@@ -0,0 +1,26 @@
+import os
+import sys
+import tempfile
+
+# app.db binds its engines at import time, so point it at a scratch database first
+_tmp = tempfile.mkdtemp(prefix="social-listening-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+from app.db import SessionLocal, init_db  # noqa: E402
+from app.models import Mention  # noqa: E402
+
+init_db()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.query(Mention).delete()
+        session.commit()
+        session.close()
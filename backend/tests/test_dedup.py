@@ -0,0 +1,34 @@
+import pytest
+from app.services import writer as writer_module
+from app.services.dedup import DedupIndex
+from app.services.writer import MentionWriter
+
+
+@pytest.fixture
+def index(monkeypatch):
+    fresh = DedupIndex(capacity=1000, lru_size=1000)
+    monkeypatch.setattr(writer_module, "dedup_index", fresh)
+    return fresh
+
+
+def _write(db, rows):
+    return MentionWriter(db, publish=False).write(rows)
+
+
+def test_url_fragment_is_a_distinct_mention(db, index):
+    _write(db, [{"url": "https://feed.example/post#part-2", "source": "rss", "title": "part 2"}])
+    stats = _write(db, [{"url": "https://feed.example/post#part-3", "source": "rss", "title": "part 3"}])
+    assert stats == {"added": 1, "skipped": 0}
+
+
+def test_same_status_id_on_another_instance_is_kept(db, index):
+    _write(db, [{"url": "https://a.social/@x/1", "source": "mastodon", "external_id": "1"}])
+    stats = _write(db, [{"url": "https://c.social/@z/1", "source": "mastodon", "external_id": "1"}])
+    assert stats == {"added": 1, "skipped": 0}
+
+
+def test_known_url_is_dropped_before_insert(db, index):
+    row = {"url": "https://feed.example/post", "source": "rss"}
+    _write(db, [row])
+    assert _write(db, [dict(row)]) == {"added": 0, "skipped": 1}
+    assert index.dropped == 1
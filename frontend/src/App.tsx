@@ -1,5 +1,5 @@
 import React, { useEffect, useMemo, useState } from 'react'
-import { fetchMentions, ingestRss, ingestHNSearch, ingestMastoSearch, ingestRedditSearch, Mention } from './api'
+import { fetchMentions, ingestRss, ingestHNSearch, ingestMastoSearch, ingestRedditSearch, streamMentions, Mention } from './api'
 
 export default function App() {
   const [feedUrl, setFeedUrl] = useState('https://news.ycombinator.com/rss')
@@ -11,6 +11,7 @@ export default function App() {
   const [query, setQuery] = useState('')
   const [loading, setLoading] = useState(false)
   const [mentions, setMentions] = useState<Mention[]>([])
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
   const [error, setError] = useState<string | null>(null)
 
   const filteredMentions = useMemo(() => mentions, [mentions])
@@ -19,8 +20,24 @@ export default function App() {
     setLoading(true)
     setError(null)
     try {
-      const data = await fetchMentions(query || undefined, undefined, 50, 0)
-      setMentions(data)
+      const page = await fetchMentions(query || undefined, undefined, 50)
+      setMentions(page.items)
+      setNextCursor(page.nextCursor)
+    } catch (e: any) {
+      setError(e?.message || 'Failed to load mentions')
+    } finally {
+      setLoading(false)
+    }
+  }
+
+  async function loadMore() {
+    if (!nextCursor) return
+    setLoading(true)
+    setError(null)
+    try {
+      const page = await fetchMentions(query || undefined, undefined, 50, nextCursor)
+      setMentions((prev) => [...prev, ...page.items])
+      setNextCursor(page.nextCursor)
     } catch (e: any) {
       setError(e?.message || 'Failed to load mentions')
     } finally {
@@ -89,6 +106,17 @@ export default function App() {
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [])
 
+  // New mentions arrive over the stream instead of re-running the feed query
+  useEffect(() => {
+    return streamMentions(
+      query || undefined,
+      undefined,
+      (m) => setMentions((prev) => (prev.some((p) => p.id === m.id) ? prev : [m, ...prev])),
+      () => refresh(),
+    )
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [query])
+
   return (
     <div style={{ fontFamily: 'ui-sans-serif, system-ui, -apple-system', padding: 24, maxWidth: 960, margin: '0 auto' }}>
       <h1 style={{ marginBottom: 8 }}>Social Listening</h1>
@@ -200,6 +228,10 @@ export default function App() {
           </li>
         ))}
       </ul>
+
+      {nextCursor && !loading && (
+        <button onClick={loadMore} style={{ padding: '8px 12px', borderRadius: 6, border: '1px solid #ccc' }}>Load more</button>
+      )}
     </div>
   )
 }
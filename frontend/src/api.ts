@@ -16,29 +16,71 @@ export type Mention = {
   sentiment?: number | null
 }
 
-export function fetchMentions(query?: string, source?: string, limit = 20, offset = 0) {
+export type MentionPage = {
+  items: Mention[]
+  nextCursor: string | null
+}
+
+export async function fetchMentions(query?: string, source?: string, limit = 20, cursor?: string | null): Promise<MentionPage> {
   const params = new URLSearchParams()
   if (query && query.trim() !== '') params.set('query', query)
   if (source && source.trim() !== '') params.set('source', source)
   params.set('limit', String(limit))
-  params.set('offset', String(offset))
-  return api
-    .get('mentions', { searchParams: params })
-    .json<Mention[]>()
+  if (cursor) params.set('cursor', cursor)
+  const res = await api.get('mentions', { searchParams: params })
+  const items = await res.json<Mention[]>()
+  return { items, nextCursor: res.headers.get('X-Next-Cursor') }
+}
+
+// Live feed over SSE; EventSource reconnects on its own and resumes from the last event id.
+// onReset means mentions were missed: reload the page of results.
+export function streamMentions(query: string | undefined, source: string | undefined, onMention: (m: Mention) => void, onReset: () => void): () => void {
+  const params = new URLSearchParams()
+  if (query && query.trim() !== '') params.set('query', query)
+  if (source && source.trim() !== '') params.set('source', source)
+  const es = new EventSource(`${API_URL}/mentions/stream?${params}`)
+  es.addEventListener('mention', (e) => onMention(JSON.parse((e as MessageEvent).data)))
+  es.addEventListener('reset', () => onReset())
+  return () => es.close()
 }
 
+export type Job = {
+  id: number
+  kind: string
+  status: 'queued' | 'running' | 'succeeded' | 'failed'
+  progress?: { added: number; skipped: number } | null
+  result?: { added: number; skipped: number } | null
+  error?: string | null
+}
+
+export function fetchJob(id: number) {
+  return api.get(`jobs/${id}`).json<Job>()
+}
+
+// Ingest endpoints queue a background job and answer 202; wait for it so callers can refresh afterwards
+export async function waitForJob(id: number, intervalMs = 1000): Promise<Job> {
+  for (;;) {
+    const job = await fetchJob(id)
+    if (job.status === 'succeeded') return job
+    if (job.status === 'failed') throw new Error(job.error || 'Ingest job failed')
+    await new Promise((resolve) => setTimeout(resolve, intervalMs))
+  }
+}
+
+type Queued = { status: string; job_id: number }
+
 export function ingestRss(url: string) {
-  return api.post('ingest/rss', { json: { url } }).json<{ status: string; added: number }>()
+  return api.post('ingest/rss', { json: { url } }).json<Queued>().then((q) => waitForJob(q.job_id))
 }
 
 export function ingestHNSearch(query: string, hitsPerPage = 50) {
-  return api.post('ingest/hn-search', { json: { query, hits_per_page: hitsPerPage } }).json<{ status: string; added: number }>()
+  return api.post('ingest/hn-search', { json: { query, hits_per_page: hitsPerPage } }).json<Queued>().then((q) => waitForJob(q.job_id))
 }
 
 export function ingestMastoSearch(instance: string, query: string, limit = 40) {
-  return api.post('ingest/masto-search', { json: { instance, query, limit } }).json<{ status: string; added: number }>()
+  return api.post('ingest/masto-search', { json: { instance, query, limit } }).json<Queued>().then((q) => waitForJob(q.job_id))
 }
 
 export function ingestRedditSearch(query: string, subreddit?: string | null, limit = 25) {
-  return api.post('ingest/reddit/search', { json: { query, subreddit: subreddit ?? null, limit } }).json<{ status: string; added: number }>()
+  return api.post('ingest/reddit/search', { json: { query, subreddit: subreddit ?? null, limit } }).json<Queued>().then((q) => waitForJob(q.job_id))
 }